@@ -130,35 +130,38 @@
 #         pass
 
 # src/ais_stream_runner.py
-# This script runs the AIS data collector and periodically (every hour) cleans up old vessel positions.
+# This script runs the AIS data collector and periodically applies vessel_position retention.
+# Stale latest_positions rows are expired by a TTL index (see create_indexes.py), not by a task here.
 
 import asyncio
 from datetime import datetime, timezone
 from src.modules.ais_collector import run_continuous_ais_stream #for listening to AIS data
-from src.database.cleanup import cleanup_old_vessel_positions #for deleting old vessel positions
+from src.database.history_retention import RETENTION_INTERVAL_MINUTES, apply_retention #tiered vessel_position history
+from src.database.mongo_connection import get_mongo_connection
 
-async def periodic_cleanup_task(interval_minutes=60, hours=24):
+async def periodic_retention_task(interval_minutes=RETENTION_INTERVAL_MINUTES):
     """
-    Periodically delete stale entries from the latest_positions collection.
+    Periodically archive, downsample and expire vessel_position history.
+    Runs in a worker thread (batched deletes with pauses) so the stream keeps flowing.
     """
+    db = get_mongo_connection()
     while True:
-        await asyncio.sleep(interval_minutes * 60)
-        print(f"[{datetime.now(timezone.utc)}] Running cleanup task to remove old entries...")
         try:
-            cleanup_old_vessel_positions(hours=hours)
+            await asyncio.to_thread(apply_retention, db)
         except Exception as e:
-            print(f"[{datetime.now(timezone.utc)}] Cleanup error: {e}")
+            print(f"[{datetime.now(timezone.utc)}] Retention error: {e}")
+        await asyncio.sleep(interval_minutes * 60)
 
 async def main():
-    # Launch the cleanup task in the background
-    asyncio.create_task(periodic_cleanup_task(interval_minutes=60, hours=6))
+    # Launch the history retention task in the background
+    asyncio.create_task(periodic_retention_task())
 
     # Start AIS stream collector (runs forever)
     await run_continuous_ais_stream()
 
 if __name__ == "__main__":
     try:
-        print(f"[{datetime.now(timezone.utc)}] Starting AIS stream runner with cleanup...")
+        print(f"[{datetime.now(timezone.utc)}] Starting AIS stream runner with retention...")
         asyncio.run(main())
     except KeyboardInterrupt:
         print("\nCollector interrupted by user. Exiting cleanly.")
@@ -19,7 +19,7 @@ export default function TrajectoryPage() {
     if (!mmsi) return;
     const fetch = async () => {
       setLoading(true);
-      const p = { limit: 500 };
+      const p = { limit: 500, simplify: 'dp' };
       if (startTimeParam) p.start_time = startTimeParam;
       if (endTimeParam)   p.end_time   = endTimeParam;
       try {
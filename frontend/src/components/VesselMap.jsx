@@ -46,7 +46,7 @@ mapboxgl.accessToken = process.env.REACT_APP_MAPBOX_TOKEN;
   const fetchTrajectoryFor = async (mmsi) => {
     setLoadingTrajectory(true);
     setTrajectory([]);
-    const params = { limit: 500 };
+    const params = { limit: 500, simplify: 'dp' };
     if (startTime) params.start_time = new Date(startTime).toISOString();
     if (endTime)   params.end_time   = new Date(endTime).toISOString();
     try {
@@ -1,46 +1,57 @@
 # src/api/endpoints/ai_insights.py
 
-import os
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict
 
 from fastapi import APIRouter, Query
-from dotenv import load_dotenv
-from openai import OpenAI
 
-from src.database.mongo_connection import db
+from src.database.mongo_connection import async_db
+from src.utils.llm_client import achat_complete
+from src.utils.llm_summary_cache import cached_summary
 from src.utils.traffic_stats import (
     compute_scoped_traffic_stats,
     compute_scoped_top_ports,
 )
 
-# ----------------------------------
-# Setup
-# ----------------------------------
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 router = APIRouter(prefix="/ai-insights", tags=["ai-insights"])
 
+INSIGHT_MODEL = "gpt-5-mini"
+
 # ----------------------------------
 # Minimal OpenAI helper (Chat Completions, no tools, no temperature)
 # ----------------------------------
-def call_openai_simple(system_prompt: str, user_prompt: str, max_completion_tokens: int = 450) -> str:
+async def call_openai_raw(system_prompt: str, user_prompt: str, max_completion_tokens: int = 450) -> str:
     """
-    Simple wrapper around chat.completions (gpt-5-mini).
+    Simple wrapper around chat.completions (gpt-5-mini), non-blocking.
     - No tools, no web search, no temperature (uses model default).
-    - Returns assistant message content or a short fallback string.
+    - Bounded by LLM_TIMEOUT_SECONDS; raises on timeout/API errors (so failures are never cached as insights).
     """
+    return await achat_complete(
+        INSIGHT_MODEL,
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        max_completion_tokens=max_completion_tokens,
+    )
+
+
+async def call_openai_simple(system_prompt: str, user_prompt: str, max_completion_tokens: int = 450) -> str:
+    """Same as call_openai_raw, but returns a short fallback string instead of raising."""
     try:
-        resp = client.chat.completions.create(
-            model="gpt-5-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            max_completion_tokens=max_completion_tokens,
+        return await call_openai_raw(system_prompt, user_prompt, max_completion_tokens)
+    except Exception as e:
+        return f"Insight unavailable (error: {e})."
+
+
+async def cached_insight(scope: str, system_prompt: str, user_prompt: str, data: Dict,
+                         max_completion_tokens: int = 450) -> str:
+    """Memoised call_openai_simple keyed on the prompts + figures (see llm_summary_cache)."""
+    try:
+        return await cached_summary(
+            scope, INSIGHT_MODEL, f"{system_prompt}\n\n{user_prompt}", data,
+            lambda: call_openai_raw(system_prompt, user_prompt, max_completion_tokens),
         )
-        return (resp.choices[0].message.content or "").strip()
     except Exception as e:
         return f"Insight unavailable (error: {e})."
 
@@ -60,8 +71,8 @@ async def summary_insight(
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=days)
 
-    stats = compute_scoped_traffic_stats(
-        db, start_date, end_date, scope=scope, port_regex=port_regex
+    stats = await compute_scoped_traffic_stats(
+        async_db, start_date, end_date, scope=scope, port_regex=port_regex
     )
     if stats["total_arrivals"] == 0:
         return {"insight": "No traffic data available for the selected period."}
@@ -90,7 +101,9 @@ Spikes & Context
 - Mention notable spike dates ({", ".join(stats['spike_dates']) if stats['spike_dates'] else "None"}) and give one plausible operational explanation using generic reasoning (e.g., scheduling waves, liner calls, weather windows). Avoid external news.
 """.strip()
 
-    insight = call_openai_simple(system_prompt, user_prompt, max_completion_tokens=450)
+    insight = await cached_insight(
+        f"ai-insights:summary:{scope}:{days}:{port_regex or ''}", system_prompt, user_prompt, stats
+    )
     return {"insight": insight}
 
 
@@ -108,8 +121,8 @@ async def top_ports_insight(
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=days)
 
-    top5 = compute_scoped_top_ports(
-        db, start_date, end_date, scope=scope, port_regex=port_regex, top_n=5
+    top5 = await compute_scoped_top_ports(
+        async_db, start_date, end_date, scope=scope, port_regex=port_regex, top_n=5
     )
     if not top5:
         return {"insight": "No port traffic found for the selected period."}
@@ -167,5 +180,8 @@ Actionable Takeaway
 - Provide one practical takeaway for UK port stakeholders in a single sentence.
 """.strip()
 
-    insight = call_openai_simple(system_prompt, user_prompt, max_completion_tokens=450)
+    insight = await cached_insight(
+        f"ai-insights:top-ports:{scope}:{days}:{port_regex or ''}:{int(include_liverpool_learnings)}",
+        system_prompt, user_prompt, {"top_ports": top5},
+    )
     return {"insight": insight}
@@ -1,16 +1,30 @@
 # src/api/endpoints/flags.py
 
-from fastapi import APIRouter
-from src.utils.flag_utils import get_flag_iso_from_mmsi
+from typing import List
+
+from fastapi import APIRouter, Body
+
+from src.database.mongo_connection import async_db
+from src.utils.flag_utils import flag_table
 
 router = APIRouter()
 
+FLAG_URL = "https://flagcdn.com/48x36/{iso}.png"
+
+
 @router.get("/api/flag/{mmsi}")
-def get_flag_for_mmsi(mmsi: int):
-    iso = get_flag_iso_from_mmsi(mmsi)
+async def get_flag_for_mmsi(mmsi: int):
+    iso = (await flag_table.aensure(async_db)).iso_for(mmsi)
     if not iso:
         return {"iso": None, "url": None}
     return {
         "iso": iso,
-        "url": f"https://flagcdn.com/48x36/{iso}.png"
+        "url": FLAG_URL.format(iso=iso)
     }
+
+
+@router.post("/api/flags", summary="Resolve flags for many MMSIs in one call")
+async def get_flags_for_mmsis(mmsis: List[int] = Body(...)):
+    """Returns {mmsi: iso | null} using the in-process MID table (no per-vessel queries)."""
+    isos = (await flag_table.aensure(async_db)).resolve(mmsis)
+    return {str(m): iso for m, iso in zip(mmsis, isos)}
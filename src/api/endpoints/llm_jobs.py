@@ -0,0 +1,61 @@
+# src/api/endpoints/llm_jobs.py
+import asyncio
+import json
+from typing import Any, Dict
+
+from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from src.utils.llm_jobs import SUMMARY_JOB_HANDLERS, get_job, submit_summary_job
+
+router = APIRouter()
+
+SSE_POLL_SECONDS = 1.0
+SSE_MAX_SECONDS = 300
+
+
+class SummaryJobRequest(BaseModel):
+    kind: str = Field(..., description="e.g. 'traffic-insights:uk' or 'traffic-insights:liverpool'")
+    params: Dict[str, Any] = Field(default_factory=dict, description="e.g. {\"days\": 7}")
+
+
+@router.post("/", summary="Queue an LLM summary job",
+             response_description="Job state; poll GET /{job_id} or follow GET /{job_id}/events")
+async def submit_job(req: SummaryJobRequest):
+    if req.kind not in SUMMARY_JOB_HANDLERS:
+        raise HTTPException(status_code=400, detail=f"Unknown kind. Expected one of {sorted(SUMMARY_JOB_HANDLERS)}")
+    return await submit_summary_job(req.kind, req.params)
+
+
+@router.get("/{job_id}", summary="Get the state/result of an LLM summary job")
+async def read_job(job_id: str):
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/{job_id}/events", summary="Server-sent events for an LLM summary job until it finishes")
+async def job_events(job_id: str):
+    if await get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        last_status = None
+        waited = 0.0
+        while waited <= SSE_MAX_SECONDS:
+            job = await get_job(job_id)
+            if job is None:
+                break
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield f"event: {last_status}\ndata: {json.dumps(jsonable_encoder(job))}\n\n"
+            if last_status in ("done", "error"):
+                break
+            await asyncio.sleep(SSE_POLL_SECONDS)
+            waited += SSE_POLL_SECONDS
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
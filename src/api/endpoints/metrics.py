@@ -0,0 +1,50 @@
+# src/api/endpoints/metrics.py
+import time
+
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+
+from src.database.query_profiler import (
+    HTTP_REQUEST_DB_SECONDS,
+    HTTP_REQUEST_SECONDS,
+    HTTP_RESPONSE_BYTES,
+    render_metrics,
+    track_db_time,
+)
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint: Mongo command and per-route request histograms."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+async def record_request_metrics(request: Request, call_next):
+    """
+    HTTP middleware: per-route latency, response bytes and Mongo time.
+    Measured until the last body chunk, so streamed responses (SSE, exports) count in full.
+    """
+    start = time.perf_counter()
+    db_time = track_db_time(request.url.path)
+    response = await call_next(request)
+
+    # label with the route template (/api/vessel_history/{mmsi}), not the raw path
+    route = getattr(request.scope.get("route"), "path", "<unmatched>")
+    method, status = request.method, str(response.status_code)
+    body = response.body_iterator
+
+    async def counted_body():
+        size = 0
+        try:
+            async for chunk in body:
+                size += len(chunk)
+                yield chunk
+        finally:
+            HTTP_REQUEST_SECONDS.observe((method, route, status), time.perf_counter() - start)
+            HTTP_REQUEST_DB_SECONDS.observe((method, route), db_time.seconds)
+            HTTP_RESPONSE_BYTES.observe((method, route), size)
+
+    response.body_iterator = counted_body()
+    return response
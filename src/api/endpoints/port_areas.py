@@ -1,22 +1,122 @@
 # # # src/api/endpoints/port_areas.py
-from fastapi import APIRouter
-from src.database.mongo_connection import db
-from shapely.geometry import shape
+from collections import OrderedDict
+from time import monotonic
+
+from bson import Binary
+from fastapi import APIRouter, HTTPException, Response
+from starlette.concurrency import run_in_threadpool
+from src.database.mongo_connection import async_db
+from src.database import settings
+from src.database.precompute_port_area_geometry import TILES_VERSION_ID
+from src.database.time_utils import now_utc
+from src.utils.vector_tiles import (
+    band_for_zoom,
+    centroid_of,
+    encode_tile,
+    is_valid_tile,
+    tile_bounds_lonlat,
+)
 
 router = APIRouter()
 
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+TILE_MEMORY_CACHE_SIZE = 2048     # tiles kept in-process (most are a few KB)
+VERSION_CHECK_SECONDS = 30        # how often to re-read the tiles version doc
+GEO_QUERY_MIN_ZOOM = 4            # below this a tile spans too much of the globe for $geoIntersects
+
+_tile_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+_version_state = {"version": None, "checked_at": 0.0}
+
+
 @router.get("/", summary="Get all port area polygons",
             response_description="GeoJSON FeatureCollection of port, terminal, dock, and facility polygons")
-def get_all_port_areas():
-    raw = list(db["port_areas"].find({}, {"_id":0}))
-    enriched = []
+async def get_all_port_areas():
+    # Centroids are precomputed by precompute_port_area_geometry.py; fall back for stale docs
+    raw = await async_db["port_areas"].find({}, {"_id": 0, "simplified": 0}).to_list(length=None)
     for feat in raw:
-        try:
-            geom = shape(feat["geometry"])
-            cent = geom.centroid
-            feat.setdefault("properties", {})["centroid"] = [cent.x, cent.y]
-        except Exception:
-            feat.setdefault("properties", {})["centroid"] = [0,0]
-        enriched.append(feat)
-
-    return {"type":"FeatureCollection", "features": enriched}
+        props = feat.setdefault("properties", {})
+        if "centroid" not in props:
+            props["centroid"] = centroid_of(feat.get("geometry"))
+
+    return {"type": "FeatureCollection", "features": raw}
+
+
+async def _current_tiles_version() -> str:
+    """Geometry version written by the precompute job (re-read at most every 30s)."""
+    if monotonic() - _version_state["checked_at"] > VERSION_CHECK_SECONDS:
+        meta = await async_db[settings.COLL_PORT_AREA_TILES].find_one({"_id": TILES_VERSION_ID}, {"version": 1})
+        _version_state["version"] = (meta or {}).get("version", "unversioned")
+        _version_state["checked_at"] = monotonic()
+    return _version_state["version"]
+
+
+async def _build_tile(z: int, x: int, y: int) -> bytes:
+    """Encode one tile from the simplified geometry band stored on each port_areas doc."""
+    band = band_for_zoom(z)
+    geom_field = f"simplified.z{band}" if band is not None else "geometry"
+
+    query = {}
+    if z >= GEO_QUERY_MIN_ZOOM:
+        min_lon, min_lat, max_lon, max_lat = tile_bounds_lonlat(z, x, y)
+        query["geometry"] = {"$geoIntersects": {"$geometry": {
+            "type": "Polygon",
+            "coordinates": [[[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat],
+                             [min_lon, max_lat], [min_lon, min_lat]]],
+        }}}
+
+    features, missing = [], {}
+    async for doc in async_db["port_areas"].find(query, {"_id": 1, "properties": 1, geom_field: 1}):
+        if band is not None:
+            geometry = (doc.get("simplified") or {}).get(f"z{band}")
+        else:
+            geometry = doc.get("geometry")
+        if geometry:
+            features.append({"geometry": geometry, "properties": doc.get("properties") or {}})
+        elif band is not None:
+            missing[doc["_id"]] = doc.get("properties") or {}
+
+    # full-resolution polygons only for docs without this band (not yet precomputed)
+    if missing:
+        async for doc in async_db["port_areas"].find({"_id": {"$in": list(missing)}}, {"geometry": 1}):
+            if doc.get("geometry"):
+                features.append({"geometry": doc["geometry"], "properties": missing[doc["_id"]]})
+
+    # Clipping/encoding is CPU-bound; keep it off the event loop
+    return await run_in_threadpool(encode_tile, features, z, x, y)
+
+
+@router.get("/tiles/{z}/{x}/{y}", summary="Port area polygons as Mapbox Vector Tiles",
+            response_description="MVT tile (layer 'port_areas') with zoom-appropriate simplified polygons")
+async def get_port_area_tile(z: int, x: int, y: int):
+    """
+    Serves one MVT tile. Tiles are built once per geometry version and cached in memory
+    and in `port_area_tiles`; re-running precompute_port_area_geometry.py invalidates them.
+    """
+    if not is_valid_tile(z, x, y):
+        raise HTTPException(status_code=400, detail=f"Invalid tile {z}/{x}/{y}")
+
+    version = await _current_tiles_version()
+    key = (version, z, x, y)
+    data = _tile_cache.get(key)
+
+    if data is None:
+        tiles = async_db[settings.COLL_PORT_AREA_TILES]
+        tile_id = f"{z}/{x}/{y}"
+        cached = await tiles.find_one({"_id": tile_id, "version": version}, {"data": 1})
+        if cached:
+            data = bytes(cached["data"])
+        else:
+            data = await _build_tile(z, x, y)
+            await tiles.replace_one(
+                {"_id": tile_id},
+                {"_id": tile_id, "version": version, "data": Binary(data), "created_at": now_utc()},
+                upsert=True,
+            )
+        _tile_cache[key] = data
+        if len(_tile_cache) > TILE_MEMORY_CACHE_SIZE:
+            _tile_cache.popitem(last=False)
+    else:
+        _tile_cache.move_to_end(key)
+
+    return Response(content=data, media_type=MVT_MEDIA_TYPE,
+                    headers={"Cache-Control": "public, max-age=3600", "ETag": f'"{version}-{z}-{x}-{y}"'})
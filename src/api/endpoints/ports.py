@@ -1,13 +1,13 @@
 # src/api/endpoints/ports.py
 # this file defines the API endpoint for retrieving port data
 from fastapi import APIRouter
-from src.database.mongo_connection import db
+from src.database.mongo_connection import async_db
 
 router = APIRouter()
 
 @router.get("/", summary="Get all ports", response_description="List of ports")
-def get_all_ports():
-    ports = list(db["ports"].find({}, {"_id": 0}))  # Exclude _id for frontend
+async def get_all_ports():
+    ports = await async_db["ports"].find({}, {"_id": 0}).to_list(length=None)  # Exclude _id for frontend
     # Optionally format as GeoJSON FeatureCollection for Mapbox
     features = [{
         "type": "Feature",
@@ -103,208 +103,107 @@
 #     )
 
 #     return JSONResponse({"summary": summary})
-from fastapi.responses import JSONResponse
 from fastapi import APIRouter, Query
-from fastapi.responses import JSONResponse
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Any
-from collections import Counter
-from src.utils.llm_summariser import generate_uk_traffic_summary_llm
-from src.database.mongo_connection import db
-from src.utils.constants import SHIP_TYPE_MAP, VESSEL_TYPE_GROUPS
-from src.utils.llm_summariser import generate_liverpool_traffic_summary_llm
+from typing import Dict, Any, Optional
+from src.utils.llm_summariser import (
+    SUMMARY_MODEL,
+    agenerate_summary_from_prompt,
+    format_liverpool_prompt,
+    format_uk_prompt,
+)
+from src.utils.llm_jobs import register_summary_job
+from src.utils.llm_summary_cache import cached_summary, refresh_summary
+from src.database import settings
+from src.database.mongo_connection import async_db
+from src.database.place_registry import LIVERPOOL_PORT_IDS
+from src.utils.response_cache import cached_route
+from src.utils.traffic_stats import compute_traffic_stats
 
 router = APIRouter(prefix="/traffic-insights", tags=["traffic-insights"])
 
-@router.get("/uk", summary="Generate a UK-wide vessel traffic summary (LLM-ready)")
-def generate_uk_traffic_summary(days: int = Query(7, ge=1, le=90)):
+async def _insight_data(days: int, liverpool: bool = False) -> Optional[Dict[str, Any]]:
     """
-    Returns structured UK traffic summary data and a placeholder for LLM-written natural language summary.
+    Structured figures behind a traffic summary (None when there is no traffic):
+    busiest days, peak 6-hour slot, busiest port and most common vessel type group.
+    `liverpool` restricts every figure to the "liverpool" registry group (otherwise UK-wide).
+    All of it comes from one read of the rollup cube (see compute_traffic_stats).
     """
-    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-
-    # --- 1. Bucketed traffic analysis ---
-    match_stage = {"window_start": {"$gte": cutoff}}
-    pipeline = [
-        {"$match": match_stage},
-        {"$group": {
-            "_id": {"window_start": "$window_start", "port_name": "$port_name"},
-            "arrivals": {"$sum": "$arrivals"}
-        }},
-        {"$sort": {"_id.window_start": 1}}
-    ]
-    buckets = list(db["port_traffic"].aggregate(pipeline, allowDiskUse=True))
-    if not buckets:
-        return JSONResponse({"summary": "No traffic data available for this time window."})
-
-    time_slot_counts = Counter()
-    day_counts = Counter()
-    port_counts = Counter()
+    now = datetime.now(timezone.utc)
+    stats = await compute_traffic_stats(
+        async_db, now - timedelta(days=days), now,
+        place_ids=sorted(LIVERPOOL_PORT_IDS) if liverpool else None, top_n=1,
+    )
+    if not stats["total_arrivals"]:
+        return None
+
+    return {
+        "days": days,
+        "busiest_day": stats["busiest_date"],
+        "also_busy_days": stats["also_busy_days"],
+        "least_busy_day": stats["least_busy_date"],
+        "peak_time_slot_utc": stats["busiest_slot_label"],
+        "top_port": stats["top_ports"][0]["name"] if stats["top_ports"] else "N/A",
+        "most_common_vessel_group": stats["most_common_group"]
+    }
 
-    for b in buckets:
-        ts = b["_id"]["window_start"]
-        slot_hour = ts.hour
-        slot_label = f"{str(slot_hour).zfill(2)}–{str((slot_hour + 6) % 24).zfill(2)}"
-        day_str = ts.date().isoformat()
-        port = b["_id"]["port_name"]
 
-        time_slot_counts[slot_label] += b["arrivals"]
-        day_counts[day_str] += b["arrivals"]
-        port_counts[port] += b["arrivals"]
+def _summary_spec(region: str, days: int, insight_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Arguments for cached_summary / refresh_summary for one region's panel."""
+    prompt = (format_uk_prompt if region == "uk" else format_liverpool_prompt)(insight_data)
+    return {
+        "scope": f"traffic-insights:{region}:{days}",
+        "model": SUMMARY_MODEL,
+        "prompt": prompt,
+        "data": insight_data,
+        "generate": lambda: agenerate_summary_from_prompt(prompt),
+    }
 
-    busiest_slot = time_slot_counts.most_common(1)[0][0]
-    sorted_days = day_counts.most_common()
-    busiest_day = sorted_days[0][0]
-    next_busy_days = [d for d, _ in sorted_days[1:3]]
-    least_busy_day = min(day_counts.items(), key=lambda x: x[1])[0]
-    busiest_port = port_counts.most_common(1)[0]
 
-    # --- 2. Vessel type group analysis ---
-    type_pipeline = [
-        {"$match": {"entry_ts": {"$gte": cutoff}}},
-        {"$lookup": {
-            "from": "vessel_details",
-            "localField": "mmsi",
-            "foreignField": "mmsi",
-            "as": "vd"
-        }},
-        {"$unwind": {"path": "$vd", "preserveNullAndEmptyArrays": True}},
-        {"$project": {"type_code": "$vd.Type"}}
-    ]
-    subtype_counts = {}
-    for doc in db["port_calls"].aggregate(type_pipeline, allowDiskUse=True):
-        code = doc.get("type_code")
-        label = SHIP_TYPE_MAP.get(code, f"Type {code}" if code else "Unknown")
-        subtype_counts[label] = subtype_counts.get(label, 0) + 1
+@register_summary_job("traffic-insights:uk")
+@register_summary_job("traffic-insights:liverpool")
+async def pregenerate_traffic_summary(kind: str, params: Dict[str, Any]) -> str:
+    """Job handler: store the summary for the current figures (see src/utils/llm_jobs.py)."""
+    region = kind.rsplit(":", 1)[1]
+    days = min(max(int(params.get("days", 7)), 1), 90)
+    insight_data = await _insight_data(days, liverpool=(region == "liverpool"))
+    if insight_data is None:
+        return "No traffic data available for this time window."
+    return await refresh_summary(**_summary_spec(region, days, insight_data))
 
-    group_counts = {}
-    for label, count in subtype_counts.items():
-        group = "Other / Unknown"
-        for g, subtypes in VESSEL_TYPE_GROUPS.items():
-            if label in subtypes:
-                group = g
-                break
-        group_counts[group] = group_counts.get(group, 0) + count
 
-    most_common_group = max(group_counts.items(), key=lambda x: x[1])[0]
+@router.get("/uk", summary="Generate a UK-wide vessel traffic summary (LLM-ready)")
+@cached_route("insights_uk", ttl=300, depends_on=("port_traffic", settings.COLL_LLM_SUMMARIES))
+async def generate_uk_traffic_summary(days: int = Query(7, ge=1, le=90)):
+    """
+    Returns structured UK traffic summary data and a placeholder for LLM-written natural language summary.
+    """
+    insight_data = await _insight_data(days)
+    if insight_data is None:
+        return {"summary": "No traffic data available for this time window."}
 
-    # --- 3. Structured insight data ---
-    insight_data = {
-        "days": days,
-        "busiest_day": busiest_day,
-        "also_busy_days": next_busy_days,
-        "least_busy_day": least_busy_day,
-        "peak_time_slot_utc": busiest_slot,
-        "top_port": busiest_port[0],
-        "most_common_vessel_group": most_common_group
-    }
-    summary_llm = generate_uk_traffic_summary_llm(insight_data)
+    # Memoised on the insight data + prompt; a stale summary is served while a new one is generated
+    summary_llm = await cached_summary(**_summary_spec("uk", days, insight_data))
 
-    # --- 4. Placeholder for LLM summary (will be filled in later) ---
-    return JSONResponse({
+    return {
         "summary_llm": summary_llm,  # Will be filled by OpenAI call later
         "insight_data": insight_data
-    })
+    }
 
 @router.get("/liverpool", summary="Generate a Liverpool vessel traffic summary (LLM-ready)")
-def generate_liverpool_traffic_summary(days: int = Query(7, ge=1, le=90)):
+@cached_route("insights_liverpool", ttl=300, depends_on=("port_traffic", settings.COLL_LLM_SUMMARIES))
+async def generate_liverpool_traffic_summary(days: int = Query(7, ge=1, le=90)):
     """
     Returns structured Liverpool traffic summary data and a placeholder for LLM-written summary.
     Includes busiest days, peak 6-hour slot, busiest sub-port, and most common vessel type group.
     """
-    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    insight_data = await _insight_data(days, liverpool=True)
+    if insight_data is None:
+        return {"summary": "No Liverpool traffic data available for this time window."}
 
-    # ---- Liverpool ports (canonical + alias) ----
-    LIV_PORT_NAMES_CANON = ["Birkenhead Dock Estate", "Port of Liverpool", "Port of Garston"]
-    LIV_PORT_NAMES_ALIASES = ["Port of Gartson"]
-    LIV_PORT_NAMES_ALL = LIV_PORT_NAMES_CANON + LIV_PORT_NAMES_ALIASES
+    summary_llm = await cached_summary(**_summary_spec("liverpool", days, insight_data))
 
-    # --- 1. Bucketed traffic analysis ---
-    match_stage = {
-        "window_start": {"$gte": cutoff},
-        "port_name": {"$in": LIV_PORT_NAMES_ALL}
-    }
-    pipeline = [
-        {"$match": match_stage},
-        {"$group": {
-            "_id": {"window_start": "$window_start", "port_name": "$port_name"},
-            "arrivals": {"$sum": "$arrivals"}
-        }},
-        {"$sort": {"_id.window_start": 1}}
-    ]
-    buckets = list(db["port_traffic"].aggregate(pipeline, allowDiskUse=True))
-    if not buckets:
-        return JSONResponse({"summary": "No Liverpool traffic data available for this time window."})
-
-    time_slot_counts = Counter()
-    day_counts = Counter()
-    port_counts = Counter()
-
-    for b in buckets:
-        ts = b["_id"]["window_start"]
-        slot_hour = ts.hour
-        slot_label = f"{str(slot_hour).zfill(2)}–{str((slot_hour + 6) % 24).zfill(2)}"
-        day_str = ts.date().isoformat()
-        port = b["_id"]["port_name"]
-
-        time_slot_counts[slot_label] += b["arrivals"]
-        day_counts[day_str] += b["arrivals"]
-        port_counts[port] += b["arrivals"]
-
-    busiest_slot = time_slot_counts.most_common(1)[0][0]
-    sorted_days = day_counts.most_common()
-    busiest_day = sorted_days[0][0]
-    next_busy_days = [d for d, _ in sorted_days[1:3]]
-    least_busy_day = min(day_counts.items(), key=lambda x: x[1])[0]
-    busiest_port = port_counts.most_common(1)[0]
-
-    # --- 2. Vessel type group analysis (Liverpool only) ---
-    type_pipeline = [
-        {"$match": {
-            "entry_ts": {"$gte": cutoff},
-            "port_name": {"$in": LIV_PORT_NAMES_ALL}
-        }},
-        {"$lookup": {
-            "from": "vessel_details",
-            "localField": "mmsi",
-            "foreignField": "mmsi",
-            "as": "vd"
-        }},
-        {"$unwind": {"path": "$vd", "preserveNullAndEmptyArrays": True}},
-        {"$project": {"type_code": "$vd.Type"}}
-    ]
-
-    subtype_counts = {}
-    for doc in db["port_calls"].aggregate(type_pipeline, allowDiskUse=True):
-        code = doc.get("type_code")
-        label = SHIP_TYPE_MAP.get(code, f"Type {code}" if code else "Unknown")
-        subtype_counts[label] = subtype_counts.get(label, 0) + 1
-
-    group_counts = {}
-    for label, count in subtype_counts.items():
-        group = "Other / Unknown"
-        for g, subtypes in VESSEL_TYPE_GROUPS.items():
-            if label in subtypes:
-                group = g
-                break
-        group_counts[group] = group_counts.get(group, 0) + count
-
-    most_common_group = max(group_counts.items(), key=lambda x: x[1])[0]
-
-    # --- 3. Structured insight data ---
-    insight_data = {
-        "days": days,
-        "busiest_day": busiest_day,
-        "also_busy_days": next_busy_days,
-        "least_busy_day": least_busy_day,
-        "peak_time_slot_utc": busiest_slot,
-        "top_port": busiest_port[0],
-        "most_common_vessel_group": most_common_group
-    }
-    summary_llm = generate_liverpool_traffic_summary_llm(insight_data)
-
-
-    return JSONResponse({
+    return {
         "summary_llm": summary_llm,  # Will be filled later by OpenAI call
         "insight_data": insight_data
-    })
+    }
@@ -9,18 +9,30 @@ This module defines a FastAPI endpoint that retrieves historical AIS data (posit
 for a vessel given its MMSI (Maritime Mobile Service Identity). It supports filtering by 
 time range and limiting the number of returned records.
 
-Endpoint:
-GET /vessel_history/{mmsi}
+Endpoints:
+GET  /vessel_history/{mmsi}
+POST /vessel_history/batch   (many vessels in one request, see get_batch_trajectories)
 
 Query Parameters:
-- limit (int, optional): Maximum number of records to return (default: 500)
+- limit (int, optional): Maximum number of records to read (default: 500). With bucketing this
+  counts buckets; simplification runs afterwards and can only reduce the count.
 - start_time (datetime, optional): ISO 8601 start time filter
 - end_time (datetime, optional): ISO 8601 end time filter
+- fields (str, optional): Comma-separated projection, e.g. "sog,cog". timestamp_utc and
+  coordinates are always returned.
+- bucket_seconds (int, optional): Keep one position per time bucket (done inside Mongo)
+- simplify ("dp" | "vw", optional): Douglas–Peucker or Visvalingam–Whyatt line simplification
+- tolerance (float, optional): Simplification tolerance in degrees (default: 0.0001 ≈ 10 m)
+- format ("points" | "linestring" | "ndjson"): "linestring" returns one GeoJSON LineString with
+  parallel `timestamps` and `sog` arrays instead of a list of documents; "ndjson" streams one
+  document per line straight from the Mongo cursor (no simplification, constant API memory)
+- cursor (str, optional): Opaque `next_cursor` token from a previous page (keyset pagination
+  on (timestamp_utc, _id), so deep pages cost the same as the first one)
 
 MongoDB Collection:
 - vessel_position: Stores historical AIS position reports with fields like mmsi, timestamp_utc, coordinates, sog, cog, etc.
 
-Response Format:
+Response Format (format=points, default):
 {
     "mmsi": 123456789,
     "trajectory": [
@@ -32,41 +44,310 @@ Response Format:
             ...
         },
         ...
-    ]
+    ],
+    "next_cursor": "eyJ0IjoiMjAyNS0wNy0w..."   # null on the last page
+}
+
+Response Format (format=linestring):
+{
+    "mmsi": 123456789,
+    "geometry": { "type": "LineString", "coordinates": [[-3.01, 53.45], ...] },
+    "timestamps": ["2025-07-01T14:32:00Z", ...],
+    "sog": [12.5, ...],
+    "next_cursor": null
 }
 
 Raises:
-- HTTPException 404 if no records found for the given MMSI and time filters.
+- HTTPException 404 if no records found for the given MMSI and time filters (first page only).
+- HTTPException 400 for a malformed cursor, or simplify combined with format=ndjson.
 
 Usage Example:
 GET /vessel_history/123456789?start_time=2025-07-01T00:00:00Z&end_time=2025-07-10T23:59:59Z&limit=100
+GET /vessel_history/123456789?limit=20000&bucket_seconds=300&simplify=dp&format=linestring
+GET /vessel_history/123456789?limit=1000000&format=ndjson
 
 Notes:
 - Designed for integration with frontend map-based trajectory visualisation.
 - Ensure that MongoDB index on `mmsi` and `timestamp_utc` exists for performance.
 """
 
+import asyncio
+import base64
+import json
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from bson import ObjectId
+from pydantic import BaseModel, Field
 from pymongo import ASCENDING
-from typing import Optional
-from datetime import datetime
-from src.database.mongo_connection import get_mongo_connection
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from starlette.concurrency import run_in_threadpool
+from src.database.mongo_connection import get_async_mongo_connection
+from src.utils.trajectory import SIMPLIFY_METHODS, simplify_rows, time_bucket_pipeline, to_linestring
 
 router = APIRouter()
-db = get_mongo_connection()
+db = get_async_mongo_connection()
+
+# Fields every trajectory row needs (ordering + geometry)
+BASE_FIELDS = ("mmsi", "timestamp_utc", "coordinates")
+
+# Rows per Mongo batch when streaming NDJSON
+STREAM_BATCH_SIZE = 1000
+
+# Batch endpoint limits: MMSIs per aggregation, aggregations in flight, vessels per request
+BATCH_CHUNK_SIZE = 50
+BATCH_PARALLELISM = 4
+BATCH_MAX_VESSELS = 500
+# Bounds on the batch request's knobs: a week per bucket, 20k points per vessel, 1 degree tolerance
+BATCH_MAX_BUCKET_SECONDS = 7 * 24 * 3600
+BATCH_MAX_POINTS = 20000
+BATCH_MAX_TOLERANCE = 1.0
+# bbox mode geo-tests every fix of the window in memory (vessel_position has no 2dsphere
+# index: AIS "not available" 181/91 fixes would make inserts fail), so its window is capped
+BATCH_MAX_BBOX_WINDOW = timedelta(hours=24)
+
+
+def _projection(fields: Optional[str], output_format: str) -> dict:
+    """
+    Build a Mongo projection from the `fields` query parameter (None -> all fields).
+    `_id` is always fetched for the keyset cursor and stripped before responding.
+    """
+    if output_format == "linestring":
+        return {"timestamp_utc": 1, "coordinates": 1, "sog": 1}
+    if not fields:
+        return {}
+    wanted = {f.strip() for f in fields.split(",") if f.strip() and f.strip() != "_id"}
+    return {f: 1 for f in sorted(wanted.union(BASE_FIELDS))}
+
+
+def _encode_cursor(doc: dict) -> str:
+    """Opaque keyset token for the position after `doc`."""
+    _id = doc["_id"]
+    payload = {
+        "t": doc["timestamp_utc"].isoformat(),
+        "i": str(_id),
+        "o": isinstance(_id, ObjectId),
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token: str):
+    """Inverse of _encode_cursor -> (timestamp_utc, _id). Raises HTTP 400 if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        ts = datetime.fromisoformat(payload["t"])
+        _id = ObjectId(payload["i"]) if payload.get("o") else payload["i"]
+        return ts, _id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _after_cursor(token: str, bucket_seconds: Optional[int]) -> dict:
+    """Filter selecting rows strictly after the cursor position in (timestamp_utc, _id) order."""
+    ts, _id = _decode_cursor(token)
+    if bucket_seconds:
+        # Bucketed pages resume at the next bucket boundary so a bucket is never split
+        epoch = datetime(1970, 1, 1, tzinfo=ts.tzinfo)
+        elapsed = int((ts - epoch).total_seconds())
+        next_bucket = epoch + timedelta(seconds=(elapsed // bucket_seconds + 1) * bucket_seconds)
+        return {"timestamp_utc": {"$gte": next_bucket}}
+    return {"$or": [
+        {"timestamp_utc": {"$gt": ts}},
+        {"timestamp_utc": ts, "_id": {"$gt": _id}},
+    ]}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+async def _ndjson_rows(cursor):
+    """Yield one JSON line per document as the Mongo cursor produces them."""
+    async for doc in cursor:
+        doc.pop("_id", None)
+        yield json.dumps(doc, default=_json_default) + "\n"
+
+
+class BatchTrajectoryRequest(BaseModel):
+    """Body for POST /vessel_history/batch. Give `mmsis`, `bbox`, or both (intersection)."""
+    mmsis: Optional[List[int]] = None
+    bbox: Optional[List[float]] = None          # [min_lon, min_lat, max_lon, max_lat]
+    start_time: datetime
+    end_time: Optional[datetime] = None
+    bucket_seconds: Optional[int] = Field(None, ge=1, le=BATCH_MAX_BUCKET_SECONDS)
+    simplify: Optional[str] = "dp"              # "dp", "vw" or None
+    tolerance: float = Field(0.0001, gt=0, le=BATCH_MAX_TOLERANCE)
+    max_points_per_vessel: int = Field(5000, ge=1, le=BATCH_MAX_POINTS)
+    max_vessels: int = BATCH_MAX_VESSELS
+
+
+def _time_filter(start_time: datetime, end_time: Optional[datetime]) -> dict:
+    ts = {"$gte": start_time}
+    if end_time:
+        ts["$lte"] = end_time
+    return ts
+
+
+async def _mmsis_in_bbox(bbox: List[float], ts_filter: dict, max_vessels: int) -> List[int]:
+    """Distinct MMSIs with at least one position inside `bbox` during the window."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    polygon = {"type": "Polygon", "coordinates": [[
+        [min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]
+    ]]}
+    pipeline = [
+        {"$match": {"timestamp_utc": ts_filter, "coordinates": {"$geoWithin": {"$geometry": polygon}}}},
+        {"$group": {"_id": "$mmsi"}},
+        {"$limit": max_vessels},
+    ]
+    rows = await db.vessel_position.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+    return [r["_id"] for r in rows if r.get("_id") is not None]
+
+
+def _window_end(start_time: datetime, end_time: Optional[datetime]) -> datetime:
+    now = datetime.now(timezone.utc)
+    return end_time or (now if start_time.tzinfo else now.replace(tzinfo=None))
+
+
+def _min_bucket_seconds(start_time: datetime, end_time: Optional[datetime], max_points: int) -> int:
+    """Smallest bucket that spreads at most `max_points` buckets over the whole window."""
+    window = max((_window_end(start_time, end_time) - start_time).total_seconds(), 1)
+    return max(1, -(-int(window) // max_points))
+
+
+async def _tracks_for_chunk(mmsis: List[int], ts_filter: dict, bucket_seconds: int,
+                            max_points: int, sem: asyncio.Semaphore) -> List[dict]:
+    """
+    One aggregation over the mmsi_ts_id index returning {_id: mmsi, points: [...]} per vessel.
+    Always bucketed (see _min_bucket_seconds), so each vessel's group stays small and spans
+    the whole window; the $slice only trims the extra bucket from window alignment.
+    """
+    bucket_ms = int(bucket_seconds) * 1000
+    pipeline = [
+        {"$match": {"mmsi": {"$in": mmsis}, "timestamp_utc": ts_filter}},
+        {"$sort": {"mmsi": ASCENDING, "timestamp_utc": ASCENDING}},
+        {"$project": {"_id": 0, "mmsi": 1, "timestamp_utc": 1, "coordinates": 1, "sog": 1}},
+        {"$group": {
+            "_id": {"mmsi": "$mmsi",
+                    "b": {"$floor": {"$divide": [{"$toLong": "$timestamp_utc"}, bucket_ms]}}},
+            "doc": {"$first": "$$ROOT"},
+        }},
+        {"$replaceRoot": {"newRoot": "$doc"}},
+        {"$sort": {"mmsi": ASCENDING, "timestamp_utc": ASCENDING}},
+        {"$group": {"_id": "$mmsi", "points": {"$push": {
+            "timestamp_utc": "$timestamp_utc", "coordinates": "$coordinates", "sog": "$sog",
+        }}}},
+        {"$project": {"points": {"$slice": ["$points", max_points]}}},
+    ]
+    async with sem:
+        return await db.vessel_position.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+
+
+def _build_tracks(groups: List[dict], simplify: Optional[str], tolerance: float) -> List[dict]:
+    """Simplify each vessel's points and convert to the compact LineString shape."""
+    tracks = []
+    for g in groups:
+        points = g.get("points") or []
+        if simplify:
+            points = simplify_rows(points, simplify, tolerance)
+        line = to_linestring(points)
+        if not line["timestamps"]:
+            continue
+        tracks.append({"mmsi": g["_id"], "point_count": len(line["timestamps"]), **line})
+    tracks.sort(key=lambda t: t["mmsi"])
+    return tracks
+
+
+@router.post("/batch", summary="Get simplified trajectories for many vessels in one request")
+async def get_batch_trajectories(req: BatchTrajectoryRequest):
+    """
+    Returns one simplified LineString track per vessel for a time window.
+
+    Vessels come from `mmsis`, from `bbox` (any position inside it during the window),
+    or the intersection of both. MMSIs are split into chunks that run as parallel
+    aggregations over the (mmsi, timestamp_utc) index; simplification runs in the threadpool.
+    """
+    if not req.mmsis and not req.bbox:
+        raise HTTPException(status_code=400, detail="Provide mmsis, bbox, or both")
+    if req.bbox is not None and len(req.bbox) != 4:
+        raise HTTPException(status_code=400, detail="bbox must be [min_lon, min_lat, max_lon, max_lat]")
+    if req.simplify not in (None, *SIMPLIFY_METHODS):
+        raise HTTPException(status_code=400, detail=f"simplify must be one of {SIMPLIFY_METHODS}")
+    if req.end_time and req.end_time < req.start_time:
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+    if req.bbox:
+        min_lon, min_lat, max_lon, max_lat = req.bbox
+        if not (-180 <= min_lon < max_lon <= 180 and -90 <= min_lat < max_lat <= 90):
+            raise HTTPException(status_code=400, detail="bbox must be [min_lon, min_lat, max_lon, max_lat] in degrees")
+        if max_lon - min_lon >= 180:
+            # $geoWithin $geometry polygons must fit in one hemisphere
+            raise HTTPException(status_code=400, detail="bbox must span less than 180 degrees of longitude")
+        if _window_end(req.start_time, req.end_time) - req.start_time > BATCH_MAX_BBOX_WINDOW:
+            raise HTTPException(status_code=400, detail=f"bbox queries cover at most "
+                                                        f"{BATCH_MAX_BBOX_WINDOW.total_seconds() / 3600:g} hours")
+
+    max_vessels = max(1, min(req.max_vessels, BATCH_MAX_VESSELS))
+    ts_filter = _time_filter(req.start_time, req.end_time)
+
+    mmsis = list(dict.fromkeys(req.mmsis or []))
+    if req.bbox:
+        in_bbox = await _mmsis_in_bbox(req.bbox, ts_filter, max_vessels if not mmsis else BATCH_MAX_VESSELS * 10)
+        if mmsis:
+            in_bbox_set = set(in_bbox)
+            mmsis = [m for m in mmsis if m in in_bbox_set]
+        else:
+            mmsis = in_bbox
+    mmsis = mmsis[:max_vessels]
+
+    if not mmsis:
+        return {"start_time": req.start_time, "end_time": req.end_time, "vessel_count": 0, "tracks": []}
+
+    # never finer than max_points_per_vessel buckets over the window
+    bucket_seconds = max(req.bucket_seconds or 1,
+                         _min_bucket_seconds(req.start_time, req.end_time, req.max_points_per_vessel))
+    sem = asyncio.Semaphore(BATCH_PARALLELISM)
+    chunks = [mmsis[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(mmsis), BATCH_CHUNK_SIZE)]
+    results = await asyncio.gather(*[
+        _tracks_for_chunk(chunk, ts_filter, bucket_seconds, req.max_points_per_vessel, sem)
+        for chunk in chunks
+    ])
+    groups = [g for chunk_groups in results for g in chunk_groups]
+
+    tracks = await run_in_threadpool(_build_tracks, groups, req.simplify, req.tolerance)
+    return {
+        "start_time": req.start_time,
+        "end_time": req.end_time,
+        "vessel_count": len(tracks),
+        "tracks": tracks,
+    }
+
 
 @router.get("/{mmsi}", summary="Get full historical AIS positions for a vessel by MMSI")
 
 async def get_vessel_history(
     mmsi: int,
-    limit: int = Query(500, description="Maximum number of AIS records to return"),
+    limit: int = Query(500, ge=1, description="Maximum number of AIS records to return"),
     start_time: Optional[datetime] = Query(None, description="Optional start time (ISO format)"),
-    end_time: Optional[datetime] = Query(None, description="Optional end time (ISO format)")
+    end_time: Optional[datetime] = Query(None, description="Optional end time (ISO format)"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (timestamp_utc and coordinates are always included)"),
+    bucket_seconds: Optional[int] = Query(None, ge=1, description="Keep one position per N-second time bucket"),
+    simplify: Optional[str] = Query(None, pattern="^(dp|vw)$", description="Line simplification: dp (Douglas–Peucker) or vw (Visvalingam–Whyatt)"),
+    tolerance: float = Query(0.0001, gt=0, description="Simplification tolerance in degrees"),
+    output_format: str = Query("points", alias="format", pattern="^(points|linestring|ndjson)$", description="points (documents), linestring (GeoJSON + parallel arrays) or ndjson (streamed)"),
+    cursor: Optional[str] = Query(None, description="Opaque next_cursor token from the previous page"),
 ):
     """
-    Returns full historical AIS data from 'vessel_position' for a given vessel MMSI,
-    sorted by timestamp_utc ascending.
+    Returns historical AIS data from 'vessel_position' for a given vessel MMSI,
+    sorted by timestamp_utc ascending, optionally bucketed, simplified and projected.
+    Pages are keyset-paginated on (timestamp_utc, _id); format=ndjson streams instead.
     """
+    if simplify and output_format == "ndjson":
+        raise HTTPException(status_code=400, detail="simplify is not supported with format=ndjson")
+
     query = {"mmsi": mmsi}
     if start_time or end_time:
         query["timestamp_utc"] = {}
@@ -74,20 +355,55 @@ async def get_vessel_history(
             query["timestamp_utc"]["$gte"] = start_time
         if end_time:
             query["timestamp_utc"]["$lte"] = end_time
+    if cursor:
+        query = {"$and": [query, _after_cursor(cursor, bucket_seconds)]}
+
+    projection = _projection(fields, output_format)
+
+    if bucket_seconds:
+        # Reduce inside Mongo so only one row per bucket crosses the wire
+        pipeline = [
+            {"$match": query},
+            {"$sort": {"timestamp_utc": ASCENDING, "_id": ASCENDING}},
+            *time_bucket_pipeline(bucket_seconds),
+            {"$limit": limit},
+        ]
+        if projection:
+            pipeline.append({"$project": projection})
+        rows = db.vessel_position.aggregate(pipeline, allowDiskUse=True, batchSize=STREAM_BATCH_SIZE)
+    else:
+        rows = (
+            db.vessel_position
+            .find(query, projection or None)
+            .sort([("timestamp_utc", ASCENDING), ("_id", ASCENDING)])
+            .limit(limit)
+            .batch_size(STREAM_BATCH_SIZE)
+        )
 
-    cursor = (
-        db.vessel_position
-        .find(query, {"_id": 0})  # exclude _id for cleaner frontend use
-        .sort("timestamp_utc", ASCENDING)
-        .limit(limit)
-    )
+    if output_format == "ndjson":
+        return StreamingResponse(_ndjson_rows(rows), media_type="application/x-ndjson")
 
-    results = list(cursor)
+    results = await rows.to_list(length=limit)
 
     if not results:
+        if cursor:
+            return {"mmsi": mmsi, "trajectory": [], "next_cursor": None}
         raise HTTPException(status_code=404, detail=f"No AIS history found for MMSI {mmsi}")
 
+    # A full page means there may be more; the token points just past the last raw row
+    next_cursor = _encode_cursor(results[-1]) if len(results) == limit else None
+    for doc in results:
+        doc.pop("_id", None)
+
+    if simplify:
+        # Pure-Python geometry work; keep it off the event loop for long tracks
+        results = await run_in_threadpool(simplify_rows, results, simplify, tolerance)
+
+    if output_format == "linestring":
+        return {"mmsi": mmsi, **to_linestring(results), "next_cursor": next_cursor}
+
     return {
         "mmsi": mmsi,
-        "trajectory": results
+        "trajectory": results,
+        "next_cursor": next_cursor
     }
@@ -121,14 +121,20 @@
 
 # src/api/endpoints/vessel_popup.py
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Body, HTTPException
 from fastapi.encoders import jsonable_encoder
-from src.database.mongo_connection import db
-from pymongo.collection import Collection
+from src.database.mongo_connection import async_db
+from motor.motor_asyncio import AsyncIOMotorCollection
 from datetime import datetime, timezone
 import traceback
 from typing import List
 
+from src.utils.recent_calls import recent_calls
+
+POPUP_LIMIT = 6
+POPUP_BATCH_MAX = 200  # MMSIs per /batch request (one $in query for the ones not indexed)
+NO_CALLS = ["No port calls found"]
+
 router = APIRouter()
 
 # ---------------------------------------------------------------------
@@ -149,10 +155,10 @@ def _dedupe_consecutive(names: List[str]) -> List[str]:
     return out
 
 
-def find_port_calls_from_materialised(
+async def find_port_calls_from_materialised(
     mmsi: int,
-    calls_coll: Collection,
-    visit_state_coll: Collection,
+    calls_coll: AsyncIOMotorCollection,
+    visit_state_coll: AsyncIOMotorCollection,
     limit: int = 6,
     include_active: bool = False
 ) -> List[str]:
@@ -178,7 +184,7 @@ def find_port_calls_from_materialised(
         {"$limit": max(limit * 3, limit)},  # over-fetch a bit to allow dedupe
         {"$project": {"_id": 0, "port_name": 1, "entry_ts": 1, "exit_ts": 1}},
     ]
-    recent = list(calls_coll.aggregate(pipeline))
+    recent = await calls_coll.aggregate(pipeline).to_list(length=None)
 
     # 2) Build a reverse-chron list of names (newest → oldest)
     names_desc = [doc.get("port_name") for doc in recent if doc.get("port_name")]
@@ -186,7 +192,7 @@ def find_port_calls_from_materialised(
     # 3) Optionally include an active (in-progress) visit at the *end* of the
     #    descending list (i.e., as the "newest" item), then we'll reverse later.
     if include_active:
-        active = visit_state_coll.find_one(
+        active = await visit_state_coll.find_one(
             {"mmsi": mmsi, "in_port": True},
             projection={"_id": 0, "port_name": 1, "entered_at": 1}
         )
@@ -195,6 +201,11 @@ def find_port_calls_from_materialised(
             if not names_desc or active["port_name"] != names_desc[0]:
                 names_desc.insert(0, active["port_name"])
 
+    return _popup_names(names_desc, limit)
+
+
+def _popup_names(names_desc: List[str], limit: int = POPUP_LIMIT) -> List[str]:
+    """Newest-first call names -> popup list (chronological, consecutive repeats removed)."""
     # 4) Reverse to chronological order (oldest → newest) to match the old API’s feel
     names_chrono = list(reversed(names_desc))
 
@@ -210,27 +221,33 @@ def find_port_calls_from_materialised(
 
 
 @router.get("/{mmsi}", summary="Get port calls in the last 10 days for a vessel (materialised)")
-def get_port_calls_for_vessel(mmsi: int):
+async def get_port_calls_for_vessel(mmsi: int):
     """
     Endpoint: /api/vessel_popup/{mmsi}
     Returns a list of up to the last 6 port names visited by the vessel
     using the new materialised collections (completed visits in `port_calls`).
     """
     try:
-        # Collections
-        coll_calls = db["port_calls"]
-        coll_state = db["port_visit_state"]
-
-        port_calls = find_port_calls_from_materialised(
-            mmsi=mmsi,
-            calls_coll=coll_calls,
-            visit_state_coll=coll_state,
-            limit=6,
-            include_active=False  # keep backward-compatible semantics: completed only
-        )
+        # Served from the in-memory recent-calls index once it has warmed up (a vessel it has
+        # not seen yet is loaded into it once)
+        if recent_calls.ready:
+            names_desc = (await recent_calls.names_desc_many(async_db, [mmsi]))[mmsi]
+            port_calls = _popup_names(names_desc, POPUP_LIMIT)
+        else:
+            # Collections
+            coll_calls = async_db["port_calls"]
+            coll_state = async_db["port_visit_state"]
+
+            port_calls = await find_port_calls_from_materialised(
+                mmsi=mmsi,
+                calls_coll=coll_calls,
+                visit_state_coll=coll_state,
+                limit=POPUP_LIMIT,
+                include_active=False  # keep backward-compatible semantics: completed only
+            )
 
         if not port_calls:
-            return jsonable_encoder({"mmsi": mmsi, "port_calls": ["No port calls found"]})
+            return jsonable_encoder({"mmsi": mmsi, "port_calls": NO_CALLS})
 
         return jsonable_encoder({"mmsi": mmsi, "port_calls": port_calls})
 
@@ -241,3 +258,24 @@ def get_port_calls_for_vessel(mmsi: int):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+
+@router.post("/batch", summary="Port calls for many vessels in one request")
+async def get_port_calls_for_vessels(mmsis: List[int] = Body(..., description="MMSIs to resolve")):
+    """
+    Endpoint: /api/vessel-popup/batch
+    Same payload as /{mmsi} for every MMSI, keyed by MMSI. Answered from the in-memory
+    recent-calls index; vessels it does not know yet are loaded with a single $in query.
+    At most POPUP_BATCH_MAX MMSIs per request.
+    """
+    if len(mmsis) > POPUP_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {POPUP_BATCH_MAX} MMSIs per batch")
+    try:
+        names = await recent_calls.names_desc_many(async_db, mmsis)
+        return jsonable_encoder({
+            str(m): {"mmsi": m, "port_calls": _popup_names(names_desc, POPUP_LIMIT) or NO_CALLS}
+            for m, names_desc in names.items()
+        })
+    except Exception as e:
+        print(f"[ERROR] Internal error for popup batch ({len(mmsis)} MMSIs): {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -1,9 +1,11 @@
 # src/api/endpoints/vessels.py
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
-from src.database.mongo_connection import db
+from src.database.mongo_connection import async_db
 from datetime import datetime, timezone, timedelta
 from src.utils.constants import SHIP_TYPE_MAP
+from src.utils.flag_utils import flag_table
+from src.utils.fleet_store import fleet_store
 router = APIRouter()
 
 
@@ -13,38 +15,42 @@ router = APIRouter()
     response_description="GeoJSON FeatureCollection of latest vessel positions"
 )
 
-def get_all_latest_vessel_positions():
+async def get_all_latest_vessel_positions():
     """
     Returns a GeoJSON FeatureCollection of vessels seen in the last 12 hours,
-    enriched with static metadata like name, type, callsign, and destination.
+    enriched with static metadata like name, type, callsign, destination and flag.
     """
 
    # Define the cutoff time (vessels seen in last 5 days)
     cutoff_time = datetime.now(timezone.utc) - timedelta(days=5)
 
-    # Query dynamic position data from 'latest_positions'
-    
-    vessel_docs = list(db["latest_positions"].find(
-        {"timestamp_utc": {"$gte": cutoff_time}},
-        {"_id": 0}
-    ))
+    # Dynamic position data from the collector's shared fleet store, else 'latest_positions'
+    vessel_docs = fleet_store.recent_docs(cutoff_time)
+    if vessel_docs is None:
+        vessel_docs = await async_db["latest_positions"].find(
+            {"timestamp_utc": {"$gte": cutoff_time}},
+            {"_id": 0}
+        ).to_list(length=None)
 
     
     # Build lookup for static vessel details from 'vessel_details'
    
     static_details_lookup = {
         doc["mmsi"]: doc
-        for doc in db["vessel_details"].find(
+        async for doc in async_db["vessel_details"].find(
             {}, {"_id": 0, "mmsi": 1, "Callsign": 1, "Name": 1, "Type": 1, "Destination": 1}
         )
     }
 
   
+    # Flags for every vessel in one vectorised lookup against the in-process MID table
+    flags = (await flag_table.aensure(async_db)).resolve(v.get("mmsi") for v in vessel_docs)
+
     # Build GeoJSON FeatureCollection
    
     features = []
 
-    for v in vessel_docs:
+    for v, flag_iso in zip(vessel_docs, flags):
         coords_obj = v.get("coordinates")
         if not coords_obj or coords_obj.get("type") != "Point" or "coordinates" not in coords_obj:
             continue  # skip invalid entries
@@ -75,6 +81,7 @@ def get_all_latest_vessel_positions():
                 "callsign": detail.get("Callsign"),
                 "type": ship_type_label,
                 "destination": detail.get("Destination"),
+                "flag": flag_iso,
 
                 "sog": v.get("sog"),
                 "cog": v.get("cog"),              # from dynamic collection
@@ -3,6 +3,9 @@
 
 
 # src/api/main.py
+import asyncio
+import os
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -17,6 +20,16 @@ from .endpoints import dashboard_liverpool
 from src.api.endpoints import area_traffic
 from .endpoints import vessel_popup
 from src.api.endpoints.traffic_insights import router as traffic_insights_router
+from .endpoints import llm_jobs
+from .endpoints.flags import router as flags_router
+from .endpoints.metrics import record_request_metrics, router as metrics_router
+from src.utils.llm_jobs import run_summary_worker
+from src.utils.recent_calls import RECENT_CALLS_INDEX, recent_calls
+from src.database.mongo_connection import async_db
+
+# Run the LLM summary job worker inside this process (set LLM_JOB_WORKER=false to disable,
+# e.g. on all but one replica)
+LLM_JOB_WORKER = os.getenv("LLM_JOB_WORKER", "true").lower() == "true"
 
 app = FastAPI()
 
@@ -29,6 +42,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency / payload / DB-time histograms, scraped from /metrics
+app.middleware("http")(record_request_metrics)
+
 # Routers
 app.include_router(ports_router, prefix="/api/ports", tags=["ports"])
 app.include_router(vessels_router, prefix="/api/vessels", tags=["vessels"])
@@ -39,4 +55,16 @@ app.include_router(traffic_routes.router, prefix="/api", tags=["traffic"])
 app.include_router(dashboard_liverpool.router, prefix="/api/liverpool", tags=["liverpool"])
 app.include_router(area_traffic.router, prefix="/api/area-traffic", tags=["liverpool-areas"])
 app.include_router(vessel_popup.router, prefix="/api/vessel-popup", tags=["vessel-popup"])
-app.include_router(traffic_insights_router, prefix="/api/traffic-insights", tags=["traffic-insights"])
\ No newline at end of file
+app.include_router(traffic_insights_router, prefix="/api/traffic-insights", tags=["traffic-insights"])
+app.include_router(llm_jobs.router, prefix="/api/llm-jobs", tags=["llm-jobs"])
+app.include_router(flags_router, tags=["flags"])  # routes carry their full /api/flag(s) paths
+app.include_router(metrics_router, tags=["metrics"])
+
+
+@app.on_event("startup")
+async def start_background_workers():
+    if LLM_JOB_WORKER:
+        app.state.llm_job_worker = asyncio.create_task(run_summary_worker())
+    if RECENT_CALLS_INDEX:
+        # popups fall back to Mongo until the index has warmed up
+        app.state.recent_calls = asyncio.create_task(recent_calls.run(async_db))
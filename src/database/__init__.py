@@ -0,0 +1,7 @@
+# src/database/__init__.py
+"""
+The aggregator scripts run as `python src/database/aggregate_port_traffic.py` and import
+their neighbours bare (`import settings`, `from traffic_rollups import ...`). A module they
+load must therefore import both as `src.database.<name>` and as `<name>`: use no package
+imports at all, or `try: from src.database.x import ... / except ImportError: from x import ...`.
+"""
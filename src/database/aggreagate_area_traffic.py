@@ -6,14 +6,19 @@ from src.database.mongo_connection import get_mongo_connection
 import settings
 from src.database.settings import COLL_PORT_CALLS, COLL_PORT_TRAFFIC
 from src.database.time_utils import floor_to_6h, parse_mongo_ts
+from src.database.cache_generations import bump_generation
+from src.database.traffic_rollups import RollupAccumulator
+from src.database.traffic_anomalies import close_days
 
 def aggregate_new_area_arrivals(db):
     calls = db["area_calls"]
     traffic = db["area_traffic"]
 
     cursor = calls.find({"aggregated_window": None}, projection={
-        "_id": 1, "area_name": 1, "entry_ts": 1
+        "_id": 1, "area_name": 1, "entry_ts": 1,
+        "mmsi": 1, "type_group": 1, "type_code": 1, "duration_min": 1, "area_id": 1,  # for the rollup cube
     })
+    rollups = RollupAccumulator("area")
 
     buckets = defaultdict(lambda: defaultdict(int))
     ids_to_mark = []
@@ -26,6 +31,7 @@ def aggregate_new_area_arrivals(db):
 
         buckets[area_name][window_iso] += 1
         ids_to_mark.append((doc["_id"], window_dt))
+        rollups.add(doc)
 
     for area_name, windows in buckets.items():
         for window_iso, arrivals in windows.items():
@@ -39,9 +45,15 @@ def aggregate_new_area_arrivals(db):
                 upsert=True
             )
 
+    rollups.flush(db)
+    close_days(db, "area")  # score days that have closed since the last run
+
     for _id, window_dt in ids_to_mark:
         calls.update_one({"_id": _id}, {"$set": {"aggregated_window": window_dt}})
 
+    if ids_to_mark:
+        bump_generation(db, "area_traffic")  # invalidate cached /area-traffic responses
+
     print(f"Aggregated {len(ids_to_mark)} area visit(s) into area_traffic.")
 
 def main():
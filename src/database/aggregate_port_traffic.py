@@ -4,14 +4,20 @@ from datetime import datetime, timezone
 from mongo_connection import get_mongo_connection
 import settings
 from time_utils import floor_to_6h, parse_mongo_ts
+from cache_generations import bump_generation
+from llm_job_queue import enqueue_pregeneration
+from traffic_rollups import RollupAccumulator
+from traffic_anomalies import close_days
 
 def aggregate_new_arrivals(db):
     calls = db[settings.COLL_PORT_CALLS]
     traffic = db[settings.COLL_PORT_TRAFFIC]
 
     cursor = calls.find({"aggregated_window": None}, projection={
-        "_id": 1, "port_name": 1, "entry_ts": 1
+        "_id": 1, "port_name": 1, "entry_ts": 1,
+        "mmsi": 1, "type_group": 1, "type_code": 1, "duration_min": 1, "port_id": 1,  # for the rollup cube
     })
+    rollups = RollupAccumulator("port")
 
     # buckets[port_name][window_iso] = count
     buckets = defaultdict(lambda: defaultdict(int))
@@ -25,6 +31,7 @@ def aggregate_new_arrivals(db):
 
         buckets[port_name][window_iso] += 1
         ids_to_mark.append((doc["_id"], window_dt))
+        rollups.add(doc)
 
     # upsert arrivals per bucket
     for port_name, windows in buckets.items():
@@ -39,10 +46,17 @@ def aggregate_new_arrivals(db):
                 upsert=True
             )
 
+    rollups.flush(db)
+    close_days(db, "port")  # score days that have closed since the last run
+
     # mark visits as aggregated
     for _id, window_dt in ids_to_mark:
         calls.update_one({"_id": _id}, {"$set": {"aggregated_window": window_dt}})
 
+    if ids_to_mark:
+        bump_generation(db, settings.COLL_PORT_TRAFFIC)  # invalidate cached /traffic responses
+        enqueue_pregeneration(db)  # refresh the dashboard LLM summaries off the request path
+
     print(f"Aggregated {len(ids_to_mark)} visit(s) into port_traffic.")
 
 def main():
@@ -23,6 +23,10 @@ from pymongo import UpdateOne
 from mongo_connection import get_mongo_connection
 import settings
 from time_utils import floor_to_6h, parse_mongo_ts
+from cache_generations import bump_generation
+from llm_job_queue import enqueue_pregeneration
+from traffic_rollups import RollupAccumulator, rebuild_rollups
+from traffic_anomalies import close_days, rebuild_anomalies
 
 FULL_REBUILD = os.getenv("FULL_REBUILD", "false").lower() == "true"
 CONFIRM = os.getenv("CONFIRM_REBUILD", "").upper() == "YES"
@@ -121,7 +125,7 @@ def _server_side_group_and_upsert(db, filter_q):
         )
 
     # set aggregated_window on processed port_calls
-    # For FULL_REBUILD, mark ALL matched; for incremental, only those that were null (same filter_q)
+    # For FULL_REBUILD, mark ALL matched; for incremental, the calls fed to the rollups (same filter_q)
     calls.update_many(
         filter_q,
         [{"$set": {"aggregated_window": {
@@ -129,6 +133,23 @@ def _server_side_group_and_upsert(db, filter_q):
         }}}]
     )
 
+def _update_rollups(db, filter_q):
+    """
+    Feed the calls about to be aggregated into the traffic_rollups cube; returns their _ids,
+    so exactly these calls are grouped and marked (not ones finalised in the meantime).
+    """
+    rollups = RollupAccumulator("port")
+    cursor = db[settings.COLL_PORT_CALLS].find(filter_q, projection={
+        "_id": 1, "port_name": 1, "entry_ts": 1, "mmsi": 1, "type_group": 1, "type_code": 1, "duration_min": 1, "port_id": 1
+    })
+    ids = []
+    for doc in cursor:
+        rollups.add(doc)
+        ids.append(doc["_id"])
+    rows = rollups.flush(db)
+    print(f"[aggregate] rollups: {rollups.calls} call(s) -> {rows} row(s).")
+    return ids
+
 def rebuild_or_incremental():
     db = get_mongo_connection()
 
@@ -140,9 +161,13 @@ def rebuild_or_incremental():
         print(f"[rebuild] cleared port_traffic ({deleted} docs).")
         # process ALL port_calls
         filter_q = {}  # all
+        rebuild_rollups(db, "port", include_pending=True)  # every call is marked below
+        rebuild_anomalies(db, "port")
     else:
         # process only unaggregated port_calls
-        filter_q = {"aggregated_window": None}
+        ids = _update_rollups(db, {"aggregated_window": None})
+        filter_q = {"_id": {"$in": ids}, "aggregated_window": None}
+        close_days(db, "port")
 
     # Prefer server-side aggregation if supported
     if _supports_date_trunc(db):
@@ -151,6 +176,8 @@ def rebuild_or_incremental():
         print("[aggregate] $dateTrunc unsupported; using Python fallback.")
         _python_group_and_upsert(db, filter_q)
 
+    bump_generation(db, settings.COLL_PORT_TRAFFIC)  # invalidate cached /traffic responses
+    enqueue_pregeneration(db)  # refresh the dashboard LLM summaries off the request path
     print("[aggregate] done.")
 
 def main():
@@ -7,14 +7,19 @@ One-off or scheduled backfill for Liverpool dock/terminal/facility visits.
 - Matches only Liverpool sub-areas: type ∈ {Dock, Terminal, Facilities, Lock}
 - Finalizes visits to area_calls
 - Use aggregate_area_traffic.py to generate area_traffic buckets afterwards
+
+    python -m src.database.backfill_area_calls_from_history
 """
 
 import re
 from collections import defaultdict
 from datetime import datetime
-from mongo_connection import get_mongo_connection
-import settings
-from time_utils import parse_mongo_ts, now_utc, minutes_between
+from src.database.mongo_connection import get_mongo_connection
+from src.database import settings
+from src.database.time_utils import parse_mongo_ts, now_utc, minutes_between
+from src.database.vessel_attributes import vessel_attributes
+from src.database.place_registry import register_place
+from src.database.history_segments import iter_history_docs
 
 
 def _slug(s: str) -> str:
@@ -74,25 +79,24 @@ def _finalize_area_visit(db, state, exit_ts, last_coord):
         "_id": call_id,
         "mmsi": state["mmsi"],
         "area_name": state["area_name"],
+        "area_id": register_place(db, "area", state["area_name"]),
         "entry_ts": entry_ts,
         "exit_ts": exit_ts,
         "duration_min": duration_min,
         "entry_method": "geo+status",
         "first_coord": state.get("first_coord"),
         "last_coord": last_coord,
-        "aggregated_window": None
+        "aggregated_window": None,
+        **vessel_attributes(db, state["mmsi"]),
     }
     db["area_calls"].replace_one({"_id": call_id}, doc, upsert=True)
 
 
 def backfill_area_calls():
     db = get_mongo_connection()
-    coll = db[settings.COLL_VESSEL_POSITION]
 
-    cursor = coll.find(
-        {},
-        projection={"_id": 0, "mmsi": 1, "coordinates": 1, "timestamp_utc": 1, "sog": 1, "nav_status": 1}
-    ).sort([("mmsi", 1), ("timestamp_utc", 1)])
+    # sorted by mmsi, timestamp_utc; archived days come from the history segments
+    cursor = iter_history_docs(db)
 
     state = {}
     processed = 0
@@ -5,13 +5,19 @@ One-off (or occasional) script:
 - Maintains an in-memory state per MMSI (minimal) to detect entry/exit
 - Finalizes visits into port_calls
 - You can run the aggregator afterwards to fill port_traffic
+
+    python -m src.database.backfill_port_calls_from_history
 """
 import re
 from collections import defaultdict
 from datetime import datetime
-from mongo_connection import get_mongo_connection
-import settings
-from time_utils import parse_mongo_ts, now_utc, minutes_between
+from src.database.mongo_connection import get_mongo_connection
+from src.database import settings
+from src.database.time_utils import parse_mongo_ts, now_utc, minutes_between
+from src.database.vessel_attributes import vessel_attributes
+from src.database.dashboard_stats import record_liverpool_arrival
+from src.database.place_registry import register_place
+from src.database.history_segments import iter_history_docs
 
 def _slug(s: str) -> str:
     s = (s or "").strip().lower()
@@ -42,25 +48,27 @@ def _finalize_visit(db, state, exit_ts, last_coord):
         "_id": call_id,
         "mmsi": state["mmsi"],
         "port_name": state["port_name"],
+        "port_id": register_place(db, "port", state["port_name"]),
         "entry_ts": entry_ts,
         "exit_ts": exit_ts,
         "duration_min": duration_min,
         "entry_method": "geo+status",
         "first_coord": state.get("first_coord"),
         "last_coord": last_coord,
-        "aggregated_window": None
+        "aggregated_window": None,
+        **vessel_attributes(db, state["mmsi"]),
     }
-    db[settings.COLL_PORT_CALLS].replace_one({"_id": call_id}, doc, upsert=True)
+    res = db[settings.COLL_PORT_CALLS].replace_one({"_id": call_id}, doc, upsert=True)
+
+    # New calls feed the Liverpool dashboard counters, as in the live updater (re-runs are no-ops)
+    if res.upserted_id is not None:
+        record_liverpool_arrival(db, doc["port_id"], entry_ts, doc["type_group"])
 
 def backfill():
     db = get_mongo_connection()
-    coll = db[settings.COLL_VESSEL_POSITION]
 
-    # Stream everything sorted by mmsi, timestamp_utc
-    cursor = coll.find(
-        {},
-        projection={"_id": 0, "mmsi": 1, "coordinates": 1, "timestamp_utc": 1, "sog": 1, "nav_status": 1}
-    ).sort([("mmsi", 1), ("timestamp_utc", 1)])
+    # Stream everything sorted by mmsi, timestamp_utc (archived days from the history segments)
+    cursor = iter_history_docs(db)
 
     # In-memory state per MMSI for the historical pass
     # state[mmsi] = { ...same shape as port_visit_state... }
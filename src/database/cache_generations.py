@@ -0,0 +1,20 @@
+# src/database/cache_generations.py
+"""
+Generation counters used to invalidate cached API responses (see src/utils/response_cache.py).
+
+Writers bump the counter for the collection they changed; readers embed the current
+counter in their cache keys.
+"""
+import os
+
+COLL_CACHE_GENERATIONS = os.getenv("COLL_CACHE_GENERATIONS", "cache_generations")
+
+
+def bump_generation(db, source: str) -> None:
+    """Mark `source` (e.g. "port_traffic") as changed."""
+    db[COLL_CACHE_GENERATIONS].update_one({"_id": source}, {"$inc": {"gen": 1}}, upsert=True)
+
+
+async def abump_generation(async_db, source: str) -> None:
+    """bump_generation for the async (Motor) connection, e.g. from API background tasks."""
+    await async_db[COLL_CACHE_GENERATIONS].update_one({"_id": source}, {"$inc": {"gen": 1}}, upsert=True)
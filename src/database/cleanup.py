@@ -1,5 +1,7 @@
 # src/database/cleanup.py
 # This module handles cleanup of old vessel positions from the database.
+# Routine expiry is done by the TTL index on latest_positions.timestamp_utc (create_indexes);
+# this is only for one-off manual pruning.
 from datetime import datetime, timedelta
 from src.database.mongo_connection import db
 from datetime import timezone
@@ -9,7 +11,8 @@ def cleanup_old_vessel_positions(hours=6):
     Deletes entries from latest_positions older than the specified number of hours.
     """
     cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
+    # timestamp_utc is stored as a BSON date, so compare with a datetime (not an ISO string)
     result = db["latest_positions"].delete_many({
-        "timestamp_utc": {"$lt": cutoff.isoformat()}
+        "timestamp_utc": {"$lt": cutoff}
     })
     print(f"[{datetime.now(timezone.utc)}] Cleanup complete. Deleted {result.deleted_count} outdated vessel positions.")
@@ -1,8 +1,12 @@
 # src/database/create_indexes.py
 import os
 from pymongo import ASCENDING, DESCENDING, GEOSPHERE
+from pymongo.errors import OperationFailure
 from src.database.mongo_connection import get_mongo_connection
 from src.database import settings
+from src.database.llm_job_queue import COLL_LLM_JOBS
+from src.database.traffic_rollups import COLL_TRAFFIC_ROLLUPS
+from src.database.place_registry import COLL_PLACES
 
 ALLOW_DROP = os.getenv("ALLOW_INDEX_DROP", "false").lower() == "true"
 
@@ -24,10 +28,18 @@ def ensure_index(coll, keys, name=None, **opts):
         same_key = existing_key == requested_key
         same_unique = ix.get("unique", False) == opts.get("unique", False)
         same_sparse = ix.get("sparse", False) == opts.get("sparse", False)
-
-        if same_key and same_unique and same_sparse:
-            print(f"[OK] {coll.name}.{name} already compatible. Skipping.")
-            return name
+        same_partial = ix.get("partialFilterExpression") == opts.get("partialFilterExpression")
+        existing_ttl, requested_ttl = ix.get("expireAfterSeconds"), opts.get("expireAfterSeconds")
+
+        if same_key and same_unique and same_sparse and same_partial:
+            if existing_ttl == requested_ttl:
+                print(f"[OK] {coll.name}.{name} already compatible. Skipping.")
+                return name
+            if existing_ttl is not None and requested_ttl is not None:
+                # TTL changes are applied in place, no rebuild needed
+                coll.database.command("collMod", coll.name, index={"name": name, "expireAfterSeconds": requested_ttl})
+                print(f"[UPDATE] {coll.name}.{name} expireAfterSeconds {existing_ttl} -> {requested_ttl}")
+                return name
 
         msg = (f"[WARN] {coll.name}.{name} exists with different options. "
                f"existing={{key:{existing_key}, unique:{ix.get('unique', False)}, sparse:{ix.get('sparse', False)}}} "
@@ -43,36 +55,130 @@ def ensure_index(coll, keys, name=None, **opts):
     print(f"[CREATE] {coll.name}.{created}")
     return created
 
-def main():
-    db = get_mongo_connection()
-
+def drop_index_if_exists(coll, name):
+    """Drop an index superseded by another one on the same key (e.g. replaced by a TTL index)."""
+    if name in {ix["name"] for ix in coll.list_indexes()}:
+        coll.drop_index(name)
+        print(f"[DROP] {coll.name}.{name} (superseded)")
+
+# Indexes to drop before creating INDEX_SPECS: superseded by another one, or no longer wanted
+SUPERSEDED = [
+    (settings.COLL_LATEST_POSITIONS, "ts_desc"),      # -> ts_ttl
+    (settings.COLL_VISIT_STATE, "last_seen_ts_1"),    # -> last_seen_ttl (Mongo refuses two indexes on one key)
+    (settings.COLL_PORT_CALLS, "agg_window_1"),       # sparse -> agg_window (sparse can't serve `== null`)
+    # no query uses it, and AIS "not available" fixes (181/91) make latest_positions upserts fail
+    (settings.COLL_LATEST_POSITIONS, "coordinates_2dsphere"),
+]
+
+# Indexes made redundant by a longer one in INDEX_SPECS (dropped only after that one exists)
+REDUNDANT = [
+    (settings.COLL_VESSEL_POSITION, "mmsi_ts"),       # strict prefix of mmsi_ts_id
+]
+
+# The full index set: (collection, keys, name, options)
+INDEX_SPECS = [
     # 2dsphere for port polygons
-    ensure_index(db[settings.COLL_PORT_AREAS], [("geometry", GEOSPHERE)], name="geometry_2dsphere")
+    (settings.COLL_PORT_AREAS, [("geometry", GEOSPHERE)], "geometry_2dsphere", {}),
 
     # latest_positions
     # Use unique=True: one latest doc per MMSI
-    ensure_index(db[settings.COLL_LATEST_POSITIONS], [("mmsi", ASCENDING)], name="mmsi_1", unique=True)
-    ensure_index(db[settings.COLL_LATEST_POSITIONS], [("timestamp_utc", DESCENDING)], name="ts_desc")
+    (settings.COLL_LATEST_POSITIONS, [("mmsi", ASCENDING)], "mmsi_1", {"unique": True}),
+    # TTL: vessels silent for LATEST_POSITION_TTL_HOURS expire server-side (also serves recency scans/sorts)
+    (settings.COLL_LATEST_POSITIONS, [("timestamp_utc", ASCENDING)], "ts_ttl",
+     {"expireAfterSeconds": settings.LATEST_POSITION_TTL_HOURS * 3600}),
 
     # vessel_position (history)
-    ensure_index(db[settings.COLL_VESSEL_POSITION], [("mmsi", ASCENDING), ("timestamp_utc", ASCENDING)], name="mmsi_ts")
+    # per-vessel time ranges; the trailing _id serves the keyset pagination in /api/vessel_history,
+    # which sorts on (timestamp_utc, _id) within one MMSI
+    (settings.COLL_VESSEL_POSITION, [("mmsi", ASCENDING), ("timestamp_utc", ASCENDING), ("_id", ASCENDING)], "mmsi_ts_id", {}),
+    # day-range reads when archiving closed days into history segments
+    (settings.COLL_VESSEL_POSITION, [("timestamp_utc", ASCENDING)], "ts_1", {}),
 
     # port_visit_state
-    ensure_index(db[settings.COLL_VISIT_STATE], [("mmsi", ASCENDING)], name="mmsi_unique", unique=True)
-    ensure_index(db[settings.COLL_VISIT_STATE], [("last_seen_ts", ASCENDING)], name="last_seen_ts_1")
-    # TTL (optional):
-    # ensure_index(db[settings.COLL_VISIT_STATE], [("last_seen_ts", ASCENDING)], name="last_seen_ttl", expireAfterSeconds=7*24*3600)
+    (settings.COLL_VISIT_STATE, [("mmsi", ASCENDING)], "mmsi_unique", {"unique": True}),
+    # TTL backstop for abandoned states; the reconciler finalises silent vessels well before this
+    (settings.COLL_VISIT_STATE, [("last_seen_ts", ASCENDING)], "last_seen_ttl",
+     {"expireAfterSeconds": settings.VISIT_STATE_TTL_DAYS * 24 * 3600}),
+
+    # visit_state_areas (same reconciler + TTL backstop as port_visit_state)
+    # not unique: an area switch while still tentative can leave a second state row
+    ("visit_state_areas", [("mmsi", ASCENDING)], "mmsi_1", {}),
+    ("visit_state_areas", [("last_seen_ts", ASCENDING)], "last_seen_ttl",
+     {"expireAfterSeconds": settings.VISIT_STATE_TTL_DAYS * 24 * 3600}),
 
     # port_calls
-    ensure_index(db[settings.COLL_PORT_CALLS], [("port_name", ASCENDING), ("entry_ts", ASCENDING)], name="portname_entry")
-    ensure_index(db[settings.COLL_PORT_CALLS], [("mmsi", ASCENDING), ("entry_ts", ASCENDING)], name="mmsi_entry")
-    ensure_index(db[settings.COLL_PORT_CALLS], [("aggregated_window", ASCENDING)], name="agg_window_1", sparse=True)
+    (settings.COLL_PORT_CALLS, [("port_name", ASCENDING), ("entry_ts", ASCENDING)], "portname_entry", {}),
+    (settings.COLL_PORT_CALLS, [("port_id", ASCENDING), ("entry_ts", ASCENDING)], "portid_entry", {}),
+    (settings.COLL_PORT_CALLS, [("mmsi", ASCENDING), ("entry_ts", ASCENDING)], "mmsi_entry", {}),
+    # vessel popup: one vessel's newest calls (sorted by exit_ts) without an in-memory sort
+    (settings.COLL_PORT_CALLS, [("mmsi", ASCENDING), ("exit_ts", DESCENDING), ("entry_ts", DESCENDING)], "mmsi_exit", {}),
+    # incremental aggregation selects aggregated_window == null; a sparse index can't answer that
+    (settings.COLL_PORT_CALLS, [("aggregated_window", ASCENDING)], "agg_window", {}),
+    # recent-calls popup index: warm-up / catch-up by exit time
+    (settings.COLL_PORT_CALLS, [("exit_ts", ASCENDING)], "exit_ts_1", {}),
+    # analytics group on the denormalised vessel attributes within an entry_ts window
+    (settings.COLL_PORT_CALLS, [("entry_ts", ASCENDING), ("type_group", ASCENDING), ("type_code", ASCENDING)],
+     "entry_type", {}),
+
+    # area_calls
+    ("area_calls", [("area_name", ASCENDING), ("entry_ts", ASCENDING)], "areaname_entry", {}),
+    ("area_calls", [("area_id", ASCENDING), ("entry_ts", ASCENDING)], "areaid_entry", {}),
+    ("area_calls", [("aggregated_window", ASCENDING)], "agg_window", {}),
+    ("area_calls", [("entry_ts", ASCENDING), ("type_group", ASCENDING), ("type_code", ASCENDING)], "entry_type", {}),
+
+    # vessel_details: one static record per MMSI (partial, so legacy rows without an MMSI don't collide)
+    ("vessel_details", [("mmsi", ASCENDING)], "mmsi_unique",
+     {"unique": True, "partialFilterExpression": {"mmsi": {"$exists": True}}}),
+
+    # mmsi_flags: MID -> ISO table load / lookups
+    ("mmsi_flags", [("MID", ASCENDING)], "MID_1", {"unique": True}),  # as created by insert_flag_mapping
 
     # port_traffic (remove if you prefer no index here)
-    ensure_index(db[settings.COLL_PORT_TRAFFIC], [("port_name", ASCENDING), ("window_start", ASCENDING)],
-                 name="portname_window_unique", unique=True)
+    (settings.COLL_PORT_TRAFFIC, [("port_name", ASCENDING), ("window_start", ASCENDING)],
+     "portname_window_unique", {"unique": True}),
+
+    # llm_summaries: newest summary per scope (stale-while-revalidate fallback)
+    (settings.COLL_LLM_SUMMARIES, [("scope", ASCENDING), ("created_at", DESCENDING)], "scope_created", {}),
+
+    # llm_jobs: worker claims the oldest queued job
+    (COLL_LLM_JOBS, [("status", ASCENDING), ("queued_at", ASCENDING)], "status_queued", {}),
 
-    print("Indexes created/verified.")
+    # traffic_rollups: readers select (kind, grain, bucket_start in [...]) per place id
+    (COLL_TRAFFIC_ROLLUPS, [("kind", ASCENDING), ("grain", ASCENDING), ("bucket_start", ASCENDING), ("place_id", ASCENDING)],
+     "kind_grain_bucket_place", {}),
+
+    # traffic_rollups: day rows touched since they were last scored (traffic_anomalies.close_days)
+    (COLL_TRAFFIC_ROLLUPS, [("kind", ASCENDING), ("bucket_start", ASCENDING)], "anomaly_dirty",
+     {"partialFilterExpression": {"anomaly_dirty": True}}),
+
+    # places: registry lookups by kind
+    (COLL_PLACES, [("kind", ASCENDING)], "kind_1", {}),
+]
+
+def ensure_all(db):
+    """
+    Drop superseded indexes, create/verify every index in INDEX_SPECS (errors are reported,
+    not fatal), then drop the redundant ones whose collection built cleanly.
+    """
+    for coll_name, name in SUPERSEDED:
+        drop_index_if_exists(db[coll_name], name)
+    failed = []
+    for coll_name, keys, name, opts in INDEX_SPECS:
+        try:
+            ensure_index(db[coll_name], keys, name=name, **opts)
+        except OperationFailure as e:
+            # e.g. duplicate MMSIs blocking a unique index: report and carry on with the rest
+            print(f"[FAIL] {coll_name}.{name}: {e}")
+            failed.append((coll_name, name))
+    for coll_name, name in REDUNDANT:
+        if not any(c == coll_name for c, _ in failed):
+            drop_index_if_exists(db[coll_name], name)
+    return failed
+
+def main():
+    db = get_mongo_connection()
+    failed = ensure_all(db)
+    print("Indexes created/verified." if not failed else f"Indexes created/verified; {len(failed)} failed.")
 
 if __name__ == "__main__":
     main()
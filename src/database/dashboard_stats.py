@@ -0,0 +1,342 @@
+# src/database/dashboard_stats.py
+"""
+Materialised dashboard statistics.
+
+The dashboard used to read every latest_positions doc, $in-join vessel_details and scan up
+to 200k vessel_position rows per request. Instead, two small documents in `dashboard_stats`
+are maintained as data arrives and the API just reads them:
+
+  uk_fleet         -> snapshot of the current fleet (latest_positions):
+                      total_vessels, avg_speed, last_update, grouped_vessel_types, top_destinations
+                      Maintained in memory by FleetStatsMaterialiser inside the AIS collector
+                      (O(1) per message) and flushed every FLEET_FLUSH_SECONDS.
+  liverpool_daily  -> per-UTC-day counters, summed over the requested ?days= window:
+                      arrivals.<day>, type_groups.<day>.<group>  ($inc on visit finalisation)
+                      speed.<day>.sum / .count                    ($inc on each history snapshot)
+
+rebuild_all() recomputes both from the raw collections; the collector runs the fleet
+rebuild at startup and every FLEET_REBUILD_SECONDS to absorb deletes made by cleanup/TTL.
+"""
+
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.database import settings
+from src.database.time_utils import now_utc, parse_mongo_ts, to_iso
+from src.database.place_registry import LIVERPOOL_PORT_IDS
+from src.utils.vessel_types import DEFAULT_GROUP, type_group, type_label
+
+UK_FLEET_ID = "uk_fleet"
+LIVERPOOL_DAILY_ID = "liverpool_daily"
+
+FLEET_FLUSH_SECONDS = int(os.getenv("DASHBOARD_FLUSH_SECONDS", 30))
+FLEET_REBUILD_SECONDS = int(os.getenv("DASHBOARD_REBUILD_SECONDS", 3600))
+LIVERPOOL_RETENTION_DAYS = int(os.getenv("DASHBOARD_RETENTION_DAYS", 120))
+TOP_DESTINATIONS = 5
+
+
+def _day_key(ts) -> str:
+    return parse_mongo_ts(ts).date().isoformat()
+
+
+# -----------------------------------------------------------------------------
+# UK fleet snapshot (collector process)
+# -----------------------------------------------------------------------------
+
+class FleetStatsMaterialiser:
+    """
+    Incrementally maintained aggregates over latest_positions.
+
+    Static data (type/destination) is remembered for every MMSI seen, so a vessel that
+    reports its position after its static message is still counted under the right type.
+    """
+
+    def __init__(self):
+        self._sog: Dict[int, float] = {}           # MMSIs currently in the fleet -> sog
+        self._static: Dict[int, tuple] = {}        # MMSI -> (type label, destination)
+        self.sog_sum = 0.0
+        self.type_counts: Counter = Counter()
+        self.dest_counts: Counter = Counter()
+        self.last_update: Optional[datetime] = None
+        self.dirty = False
+        # observations made while a rebuild reads Mongo; replayed onto the rebuilt state
+        self._journal: Optional[List[Tuple[str, Dict]]] = None
+
+    # --- incremental updates -------------------------------------------------
+
+    def _static_for(self, mmsi) -> tuple:
+        return self._static.get(mmsi, ("Unknown", ""))
+
+    def _count(self, mmsi, sign: int):
+        label, dest = self._static_for(mmsi)
+        self.type_counts[label] += sign
+        if self.type_counts[label] <= 0:
+            del self.type_counts[label]
+        if dest:
+            self.dest_counts[dest] += sign
+            if self.dest_counts[dest] <= 0:
+                del self.dest_counts[dest]
+
+    def observe_position(self, doc: Dict):
+        """Apply one transformed PositionReport (same shape as latest_positions)."""
+        mmsi = doc.get("mmsi")
+        if not mmsi:
+            return
+        if self._journal is not None:
+            self._journal.append(("position", doc))
+        sog = doc.get("sog") or 0
+        if mmsi in self._sog:
+            self.sog_sum += sog - self._sog[mmsi]
+        else:
+            self.sog_sum += sog
+            self._count(mmsi, +1)
+        self._sog[mmsi] = sog
+
+        ts = doc.get("timestamp_utc")
+        if ts is not None:
+            ts = parse_mongo_ts(ts)
+            if self.last_update is None or ts > self.last_update:
+                self.last_update = ts
+        self.dirty = True
+
+    def observe_static(self, doc: Dict):
+        """Apply one transformed ShipStaticData (same shape as vessel_details)."""
+        mmsi = doc.get("mmsi")
+        if not mmsi:
+            return
+        if self._journal is not None:
+            self._journal.append(("static", doc))
+        new = (type_label(doc.get("Type")), (doc.get("Destination") or "").strip())
+        if self._static.get(mmsi) == new:
+            return
+        in_fleet = mmsi in self._sog
+        if in_fleet:
+            self._count(mmsi, -1)
+        self._static[mmsi] = new
+        if in_fleet:
+            self._count(mmsi, +1)
+        self.dirty = True
+
+    # --- full recompute ------------------------------------------------------
+
+    @classmethod
+    def from_db(cls, db) -> "FleetStatsMaterialiser":
+        """Build fresh aggregates from latest_positions + vessel_details (blocking; run off-loop)."""
+        fresh = cls()
+        for d in db["vessel_details"].find({}, {"_id": 0, "mmsi": 1, "Type": 1, "Destination": 1}):
+            fresh.observe_static(d)
+        cursor = db[settings.COLL_LATEST_POSITIONS].find({}, {"_id": 0, "mmsi": 1, "sog": 1, "timestamp_utc": 1})
+        for d in cursor:
+            fresh.observe_position(d)
+        return fresh
+
+    def begin_rebuild(self):
+        """Start journaling observations; call before from_db() and pair with adopt()."""
+        self._journal = []
+
+    def adopt(self, other: "FleetStatsMaterialiser"):
+        """
+        Swap in a rebuilt state (startup / hourly drift repair after cleanup deletes).
+        Observations journaled since begin_rebuild() are replayed onto it first, so positions
+        that arrived while from_db() was reading are not lost. Both run on the collector's loop.
+        """
+        journal, self._journal = self._journal or [], None
+        for kind, doc in journal:
+            if kind == "position":
+                other.observe_position(doc)
+            else:
+                other.observe_static(doc)
+        self.__dict__.update(other.__dict__)
+        self._journal = None
+        self.dirty = True
+
+    def cancel_rebuild(self):
+        """Stop journaling after a failed from_db()."""
+        self._journal = None
+
+    # --- output --------------------------------------------------------------
+
+    def to_document(self) -> Dict:
+        total = len(self._sog)
+        grouped: Dict[str, Dict[str, int]] = {}
+        for label, cnt in self.type_counts.items():
+            grouped.setdefault(type_group(label), {})[label] = cnt
+        return {
+            "_id": UK_FLEET_ID,
+            "total_vessels": total,
+            "avg_speed": round(self.sog_sum / total, 2) if total else 0.0,
+            "last_update": to_iso(self.last_update) if self.last_update else None,
+            "grouped_vessel_types": grouped,
+            "top_destinations": [d for d, _ in self.dest_counts.most_common(TOP_DESTINATIONS)],
+            "updated_at": now_utc(),
+        }
+
+    def flush(self, db):
+        """Write the snapshot document if anything changed since the last flush."""
+        if not self.dirty:
+            return
+        db[settings.COLL_DASHBOARD_STATS].replace_one({"_id": UK_FLEET_ID}, self.to_document(), upsert=True)
+        self.dirty = False
+
+
+# Shared instance for the collector process
+fleet_stats = FleetStatsMaterialiser()
+
+
+# -----------------------------------------------------------------------------
+# Liverpool daily counters (visit processor + snapshot task)
+# -----------------------------------------------------------------------------
+
+def record_liverpool_arrival(db, port_id: str, entry_ts, group: str) -> None:
+    """Count one newly finalised port call if it belongs to the Liverpool ports group."""
+    if port_id not in LIVERPOOL_PORT_IDS:
+        return
+    day = _day_key(entry_ts)
+    db[settings.COLL_DASHBOARD_STATS].update_one(
+        {"_id": LIVERPOOL_DAILY_ID},
+        {"$inc": {f"arrivals.{day}": 1, f"type_groups.{day}.{group}": 1}},
+        upsert=True,
+    )
+
+
+def record_speed_sample(db, position_docs: Iterable[Dict]) -> None:
+    """Add one history snapshot's SOG values to today's running sum/count."""
+    total, count = 0.0, 0
+    for d in position_docs:
+        total += d.get("sog", 0) or 0
+        count += 1
+    if not count:
+        return
+    day = now_utc().date().isoformat()
+    db[settings.COLL_DASHBOARD_STATS].update_one(
+        {"_id": LIVERPOOL_DAILY_ID},
+        {"$inc": {f"speed.{day}.sum": total, f"speed.{day}.count": count}},
+        upsert=True,
+    )
+
+
+def rebuild_liverpool_daily(db, days: int = LIVERPOOL_RETENTION_DAYS) -> None:
+    """Recompute liverpool_daily from port_calls / vessel_position for the last `days` days."""
+    since = now_utc() - timedelta(days=days)
+
+    arrivals: Dict[str, int] = {}
+    type_groups: Dict[str, Dict[str, int]] = {}
+    pipeline = [
+        {"$match": {"entry_ts": {"$gte": since}, "port_id": {"$in": sorted(LIVERPOOL_PORT_IDS)}}},
+        {"$group": {
+            "_id": {"day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$entry_ts"}},
+                    "type_group": {"$ifNull": ["$type_group", DEFAULT_GROUP]}},
+            "count": {"$sum": 1},
+        }},
+    ]
+    for r in db[settings.COLL_PORT_CALLS].aggregate(pipeline, allowDiskUse=True):
+        day, cnt = r["_id"]["day"], int(r["count"])
+        group = r["_id"]["type_group"]
+        arrivals[day] = arrivals.get(day, 0) + cnt
+        type_groups.setdefault(day, {})
+        type_groups[day][group] = type_groups[day].get(group, 0) + cnt
+
+    speed: Dict[str, Dict[str, float]] = {}
+    pipeline = [
+        {"$match": {"timestamp_utc": {"$gte": since}}},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp_utc"}},
+            "sum": {"$sum": {"$ifNull": ["$sog", 0]}},
+            "count": {"$sum": 1},
+        }},
+    ]
+    for r in db[settings.COLL_VESSEL_POSITION].aggregate(pipeline, allowDiskUse=True):
+        speed[r["_id"]] = {"sum": float(r["sum"]), "count": int(r["count"])}
+
+    db[settings.COLL_DASHBOARD_STATS].replace_one(
+        {"_id": LIVERPOOL_DAILY_ID},
+        {"_id": LIVERPOOL_DAILY_ID, "arrivals": arrivals, "type_groups": type_groups,
+         "speed": speed, "rebuilt_at": now_utc()},
+        upsert=True,
+    )
+    print(f"[dashboard_stats] rebuilt liverpool_daily ({len(arrivals)} day(s) with arrivals).")
+
+
+# -----------------------------------------------------------------------------
+# Read side (API, async)
+# -----------------------------------------------------------------------------
+
+async def read_dashboard_stats(async_db, days: int) -> Dict:
+    """
+    Assemble the /api/dashboard response from the two materialised documents.
+    Liverpool figures cover whole UTC days from (today - days) through today.
+    """
+    coll = async_db[settings.COLL_DASHBOARD_STATS]
+    uk = await coll.find_one({"_id": UK_FLEET_ID}) or {}
+    liv = await coll.find_one({"_id": LIVERPOOL_DAILY_ID}) or {}
+
+    first_day = (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
+
+    liverpool_arrivals = sum(n for d, n in (liv.get("arrivals") or {}).items() if d >= first_day)
+
+    grouped_vessel_types_liv: Dict[str, int] = {}
+    for d, groups in (liv.get("type_groups") or {}).items():
+        if d < first_day:
+            continue
+        for g, n in groups.items():
+            grouped_vessel_types_liv[g] = grouped_vessel_types_liv.get(g, 0) + n
+
+    speed_sum, speed_count = 0.0, 0
+    for d, s in (liv.get("speed") or {}).items():
+        if d >= first_day:
+            speed_sum += s.get("sum", 0)
+            speed_count += s.get("count", 0)
+    avg_liverpool_speed = round(speed_sum / speed_count, 2) if speed_count else 0.0
+
+    grouped_vessel_types_uk = uk.get("grouped_vessel_types") or {}
+    return {
+        "uk": {
+            "total_vessels": uk.get("total_vessels", 0),
+            "avg_speed": uk.get("avg_speed", 0.0),
+            "last_update": uk.get("last_update"),
+            "grouped_vessel_types": grouped_vessel_types_uk,
+            # Back-compat alias (some old frontend expects this key):
+            "type_groups": grouped_vessel_types_uk,
+            "top_destinations": uk.get("top_destinations", []),
+        },
+        "liverpool": {
+            # Renamed for generality (parameterized by ?days=):
+            "vessel_count": liverpool_arrivals,  # arrivals across the three ports
+            "avg_speed": avg_liverpool_speed,
+            "grouped_vessel_types": grouped_vessel_types_liv,
+            # Back-compat (optional; remove once frontend is migrated):
+            "vessel_count_last_3d": liverpool_arrivals,
+            "avg_speed_last_3d": avg_liverpool_speed,
+        },
+    }
+
+
+def prune_liverpool_daily(db, keep_days: int = LIVERPOOL_RETENTION_DAYS) -> None:
+    """$unset day keys older than keep_days so the document stays small."""
+    doc = db[settings.COLL_DASHBOARD_STATS].find_one({"_id": LIVERPOOL_DAILY_ID}) or {}
+    cutoff = (now_utc() - timedelta(days=keep_days)).date().isoformat()
+    unset = {}
+    for field in ("arrivals", "type_groups", "speed"):
+        for day in (doc.get(field) or {}):
+            if day < cutoff:
+                unset[f"{field}.{day}"] = ""
+    if unset:
+        db[settings.COLL_DASHBOARD_STATS].update_one({"_id": LIVERPOOL_DAILY_ID}, {"$unset": unset})
+
+
+def rebuild_all(db) -> None:
+    fleet_stats.begin_rebuild()
+    fleet_stats.adopt(FleetStatsMaterialiser.from_db(db))
+    fleet_stats.flush(db)
+    rebuild_liverpool_daily(db)
+
+
+def main():
+    from src.database.mongo_connection import get_mongo_connection
+    rebuild_all(get_mongo_connection())
+
+
+if __name__ == "__main__":
+    main()
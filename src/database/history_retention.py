@@ -0,0 +1,174 @@
+# src/database/history_retention.py
+"""
+Tiered retention for `vessel_position`.
+
+    age <  RETENTION_FULL_DAYS              full resolution (every 15-minute snapshot)
+    age <  RETENTION_DOWNSAMPLED_DAYS       one point per vessel per RETENTION_DOWNSAMPLE_MINUTES
+    older                                   deleted from Mongo (kept in the history segments)
+
+Before a day leaves the full-resolution tier it is archived into the history segments
+(src.database.history_segments), so downsampling and deletion never lose the full-resolution
+copy when RETENTION_ARCHIVE is on (default). Days are processed one at a time and deletes go
+out in RETENTION_DELETE_BATCH-sized `_id $in` batches with a short pause in between, so a
+pass never holds long locks or starves the collector's inserts. Progress is kept in a
+watermark document, making each run incremental; re-running a day is harmless. Days that
+gain rows after the watermark passed them (bulk imports, see
+history_segments.mark_days_dirty) are downsampled again once re-archived, and rows are only
+ever expired from days whose segment is up to date.
+
+TTL indexes are not used here: they cannot downsample, and expiring rows before they are
+archived would lose them. Run periodically from the collector (ais_stream_runner) or as
+`python -m src.database.history_retention`.
+"""
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Set
+
+from src.database import settings
+from src.database.history_segments import COLL_HISTORY_DIRTY_DAYS, archive_closed_days, archived_days, dirty_days
+from src.database.time_utils import parse_mongo_ts
+
+COLL_HISTORY_RETENTION = os.getenv("COLL_HISTORY_RETENTION", "history_retention")
+
+RETENTION_FULL_DAYS = int(os.getenv("RETENTION_FULL_DAYS", 30))
+RETENTION_DOWNSAMPLE_MINUTES = int(os.getenv("RETENTION_DOWNSAMPLE_MINUTES", 60))
+RETENTION_DOWNSAMPLED_DAYS = int(os.getenv("RETENTION_DOWNSAMPLED_DAYS", 365))
+RETENTION_ARCHIVE = os.getenv("RETENTION_ARCHIVE", "true").lower() == "true"
+RETENTION_DELETE_BATCH = int(os.getenv("RETENTION_DELETE_BATCH", 5000))
+RETENTION_PAUSE_SECONDS = float(os.getenv("RETENTION_PAUSE_SECONDS", 0.2))
+RETENTION_INTERVAL_MINUTES = int(os.getenv("RETENTION_INTERVAL_MINUTES", 60))
+
+WATERMARK_ID = "downsampled_through"
+
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def _delete_ids(coll, ids) -> int:
+    deleted = 0
+    for i in range(0, len(ids), RETENTION_DELETE_BATCH):
+        deleted += coll.delete_many({"_id": {"$in": ids[i:i + RETENTION_DELETE_BATCH]}}).deleted_count
+        time.sleep(RETENTION_PAUSE_SECONDS)
+    return deleted
+
+
+def _archived_days(db) -> Set[date]:
+    """Days whose segment holds every row (archived and not waiting to be re-archived)."""
+    return set(archived_days()) - set(dirty_days(db, "archive"))
+
+
+def downsample_day(db, day: date) -> int:
+    """Keep the first fix per vessel per RETENTION_DOWNSAMPLE_MINUTES bucket of `day`; returns rows deleted."""
+    coll = db[settings.COLL_VESSEL_POSITION]
+    start = _day_start(day)
+    bucket_s = RETENTION_DOWNSAMPLE_MINUTES * 60
+    seen, drop = set(), []
+    cursor = coll.find(
+        {"timestamp_utc": {"$gte": start, "$lt": start + timedelta(days=1)}},
+        {"_id": 1, "mmsi": 1, "timestamp_utc": 1},
+        batch_size=settings.HISTORY_BATCH_SIZE,
+    ).sort("timestamp_utc", 1)
+    for doc in cursor:
+        key = (doc.get("mmsi"), int(parse_mongo_ts(doc["timestamp_utc"]).timestamp()) // bucket_s)
+        if key in seen:
+            drop.append(doc["_id"])
+        else:
+            seen.add(key)
+    return _delete_ids(coll, drop)
+
+
+def downsample_closed_days(db, now: Optional[datetime] = None) -> int:
+    """Downsample every day that has aged out of the full-resolution tier; returns days done."""
+    now = now or datetime.now(timezone.utc)
+    horizon = now.date() - timedelta(days=RETENTION_FULL_DAYS)
+    state = db[COLL_HISTORY_RETENTION]
+
+    wm = state.find_one({"_id": WATERMARK_ID})
+    if wm:
+        day = parse_mongo_ts(wm["day"]).date() + timedelta(days=1)
+    else:
+        first = db[settings.COLL_VESSEL_POSITION].find_one(
+            {"timestamp_utc": {"$ne": None}}, {"timestamp_utc": 1}, sort=[("timestamp_utc", 1)]
+        )
+        if not first:
+            return 0
+        day = parse_mongo_ts(first["timestamp_utc"]).date()
+
+    archived = _archived_days(db) if RETENTION_ARCHIVE else None
+    done = 0
+    while day < horizon:
+        if archived is not None and day not in archived:
+            print(f"[retention] {day} is not archived yet; stopping downsampling there.")
+            break
+        removed = downsample_day(db, day)
+        state.update_one({"_id": WATERMARK_ID}, {"$set": {"day": _day_start(day)}}, upsert=True)
+        print(f"[retention] downsampled {day}: removed {removed} row(s).")
+        day += timedelta(days=1)
+        done += 1
+
+    # days behind the watermark that gained rows since they were downsampled
+    marks = db[COLL_HISTORY_DIRTY_DAYS]
+    for mark in marks.find({"retention": {"$exists": True}, "day": {"$lt": _day_start(day)}}).sort("day", 1):
+        marked = parse_mongo_ts(mark["day"]).date()
+        if archived is not None and marked not in archived:
+            continue  # re-archived first, next pass
+        removed = downsample_day(db, marked)
+        marks.update_one({"_id": mark["_id"], "retention": mark["retention"]}, {"$unset": {"retention": ""}})
+        print(f"[retention] downsampled {marked} again (rows added later): removed {removed} row(s).")
+        done += 1
+    return done
+
+
+def expire_old_rows(db, now: Optional[datetime] = None) -> int:
+    """Delete rows past RETENTION_DOWNSAMPLED_DAYS, day by day and only from archived days; returns rows deleted."""
+    now = now or datetime.now(timezone.utc)
+    coll = db[settings.COLL_VESSEL_POSITION]
+    cutoff = now.date() - timedelta(days=RETENTION_DOWNSAMPLED_DAYS)
+    first = coll.find_one({"timestamp_utc": {"$ne": None}}, {"timestamp_utc": 1}, sort=[("timestamp_utc", 1)])
+    if not first:
+        return 0
+    archived = _archived_days(db) if RETENTION_ARCHIVE else None
+
+    deleted, kept = 0, []
+    day = parse_mongo_ts(first["timestamp_utc"]).date()
+    while day < cutoff:
+        start = _day_start(day)
+        if archived is not None and day not in archived:
+            kept.append(day)
+        else:
+            window = {"timestamp_utc": {"$gte": start, "$lt": start + timedelta(days=1)}}
+            while True:
+                ids = [d["_id"] for d in coll.find(window, {"_id": 1}).limit(RETENTION_DELETE_BATCH)]
+                if not ids:
+                    break
+                deleted += _delete_ids(coll, ids)
+        # jump to the next day that has rows
+        nxt = coll.find_one({"timestamp_utc": {"$gte": start + timedelta(days=1)}}, {"timestamp_utc": 1},
+                            sort=[("timestamp_utc", 1)])
+        if not nxt:
+            break
+        day = parse_mongo_ts(nxt["timestamp_utc"]).date()
+    if deleted:
+        print(f"[retention] deleted {deleted} row(s) older than {cutoff}.")
+    if kept:
+        print(f"[retention] kept {len(kept)} expired day(s) without an up-to-date segment, e.g. {kept[0]}.")
+    return deleted
+
+
+def apply_retention(db, now: Optional[datetime] = None) -> None:
+    """One incremental pass: archive closed days, downsample aged days, expire the oldest tier."""
+    if RETENTION_ARCHIVE:
+        archive_closed_days(db, now)
+    downsample_closed_days(db, now)
+    expire_old_rows(db, now)
+
+
+def main():
+    from src.database.mongo_connection import get_mongo_connection
+    apply_retention(get_mongo_connection())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# src/database/history_segments.py
+"""
+Day-partitioned, memory-mappable archive of `vessel_position`.
+
+Each closed UTC day of history is written to
+
+    HISTORY_SEGMENTS_DIR/vessel_position-YYYY-MM-DD.npy
+
+as a fixed-width numpy structured array (SEGMENT_DTYPE) sorted by (mmsi, ts). `.npy` keeps
+the dtype in its header, so np.load(..., mmap_mode="r") gives zero-copy column access and
+per-vessel slices are two searchsorted calls on the sorted `mmsi` column.
+
+A day is closed once it is HISTORY_ARCHIVE_LAG_DAYS old (the 15-minute snapshots for it are
+all in). Archiving is incremental: `python -m src.database.history_segments` writes every
+closed day that has no segment yet. Segments are written to a temp file and renamed, so
+readers never see a partial day. Mongo keeps its rows; retention is handled separately.
+
+Rows can still land in a day after it was archived (bulk imports of old AIS files). Writers
+of such rows call mark_days_dirty(), which records the day in `history_dirty_days`; the next
+archive pass re-archives it by merging the Mongo rows into the existing segment (rows are
+unique per (mmsi, ts)), so nothing retention has already removed from Mongo is lost. For
+rows imported before marks existed, HISTORY_RECHECK=true marks every archived day on which
+Mongo holds more rows than the segment.
+
+Readers:
+  - load_day(day)                 -> memmapped rows for one day (or None)
+  - rows_for(mmsi, start, end)    -> one vessel's rows across days (numpy)
+  - iter_history_docs(db)         -> vessel_position-shaped dicts ordered by (mmsi, timestamp_utc):
+                                     archived days from segments, the rest from Mongo
+                                     (dirty days are re-archived first)
+"""
+import heapq
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+from pymongo import UpdateOne
+
+from src.database import settings
+from src.database.time_utils import parse_mongo_ts
+
+HISTORY_SEGMENTS_DIR = os.getenv("HISTORY_SEGMENTS_DIR", "data/history_segments")
+COLL_HISTORY_DIRTY_DAYS = os.getenv("COLL_HISTORY_DIRTY_DAYS", "history_dirty_days")
+HISTORY_RECHECK = os.getenv("HISTORY_RECHECK", "false").lower() == "true"
+HISTORY_ARCHIVE_LAG_DAYS = int(os.getenv("HISTORY_ARCHIVE_LAG_DAYS", 1))
+ARCHIVE_CHUNK_ROWS = int(os.getenv("HISTORY_ARCHIVE_CHUNK_ROWS", 100_000))
+
+SEGMENT_PREFIX = "vessel_position-"
+
+SEGMENT_DTYPE = np.dtype([
+    ("mmsi", "<i8"),
+    ("ts", "<i8"),            # epoch milliseconds (UTC)
+    ("lon", "<f8"),
+    ("lat", "<f8"),
+    ("sog", "<f4"),           # NaN = missing
+    ("cog", "<f4"),
+    ("heading", "<i2"),       # -1 = missing
+    ("nav_status", "<i2"),
+])
+
+_PROJECTION = {"_id": 0, "mmsi": 1, "timestamp_utc": 1, "coordinates": 1,
+               "sog": 1, "cog": 1, "heading": 1, "nav_status": 1}
+
+
+def _ms(ts) -> int:
+    return int(parse_mongo_ts(ts).timestamp() * 1000)
+
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def segment_path(day: date) -> str:
+    return os.path.join(HISTORY_SEGMENTS_DIR, f"{SEGMENT_PREFIX}{day.isoformat()}.npy")
+
+
+def archived_days() -> List[date]:
+    """Days that have a segment, oldest first."""
+    if not os.path.isdir(HISTORY_SEGMENTS_DIR):
+        return []
+    days = []
+    for name in os.listdir(HISTORY_SEGMENTS_DIR):
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(".npy"):
+            try:
+                days.append(date.fromisoformat(name[len(SEGMENT_PREFIX):-4]))
+            except ValueError:
+                continue
+    return sorted(days)
+
+
+def mark_days_dirty(db, days: Iterable[date]) -> None:
+    """
+    Record that rows were added to `days` after they may have been archived (and
+    downsampled): `archive` is cleared by the archive pass, `retention` by history_retention.
+    """
+    now = datetime.now(timezone.utc)
+    ops = [
+        UpdateOne({"_id": d.isoformat()}, {"$set": {"day": _day_start(d), "archive": now, "retention": now}},
+                  upsert=True)
+        for d in set(days)
+    ]
+    if ops:
+        db[COLL_HISTORY_DIRTY_DAYS].bulk_write(ops, ordered=False)
+
+
+def dirty_days(db, stage: str = "archive") -> List[date]:
+    """Days still marked for `stage` ("archive" or "retention"), oldest first."""
+    marks = db[COLL_HISTORY_DIRTY_DAYS].find({stage: {"$exists": True}}, {"day": 1}).sort("day", 1)
+    return [parse_mongo_ts(m["day"]).date() for m in marks]
+
+
+# -----------------------------------------------------------------------------
+# Writer
+# -----------------------------------------------------------------------------
+
+def _row(doc: Dict) -> Optional[tuple]:
+    coords = (doc.get("coordinates") or {}).get("coordinates")
+    if not coords or len(coords) != 2 or coords[0] is None or coords[1] is None:
+        return None
+    try:
+        mmsi = int(doc["mmsi"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    def opt(v, missing):
+        return missing if v is None else v
+
+    return (
+        mmsi, _ms(doc.get("timestamp_utc")), float(coords[0]), float(coords[1]),
+        opt(doc.get("sog"), np.nan), opt(doc.get("cog"), np.nan),
+        opt(doc.get("heading"), -1), opt(doc.get("nav_status"), -1),
+    )
+
+
+def archive_day(db, day: date) -> int:
+    """
+    Write one day's vessel_position rows to its segment, merged with the rows of an existing
+    segment for that day; returns the row count.
+    """
+    start = _day_start(day)
+    cursor = db[settings.COLL_VESSEL_POSITION].find(
+        {"timestamp_utc": {"$gte": start, "$lt": start + timedelta(days=1)}}, _PROJECTION,
+        batch_size=settings.HISTORY_BATCH_SIZE,
+    )
+    chunks, pending = [], []
+    for doc in cursor:
+        row = _row(doc)
+        if row is not None:
+            pending.append(row)
+        if len(pending) >= ARCHIVE_CHUNK_ROWS:
+            chunks.append(np.array(pending, dtype=SEGMENT_DTYPE))
+            pending = []
+    if pending:
+        chunks.append(np.array(pending, dtype=SEGMENT_DTYPE))
+    existing = load_day(day)
+    if existing is not None:
+        chunks.append(np.array(existing))
+
+    rows = np.concatenate(chunks) if chunks else np.empty(0, dtype=SEGMENT_DTYPE)
+    rows = rows[np.lexsort((rows["ts"], rows["mmsi"]))]
+    if len(rows):
+        keep = np.ones(len(rows), dtype=bool)
+        keep[1:] = (rows["mmsi"][1:] != rows["mmsi"][:-1]) | (rows["ts"][1:] != rows["ts"][:-1])
+        rows = rows[keep]
+
+    os.makedirs(HISTORY_SEGMENTS_DIR, exist_ok=True)
+    path = segment_path(day)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, rows)
+    os.replace(tmp, path)
+    return len(rows)
+
+
+def archive_closed_days(db, now: Optional[datetime] = None) -> int:
+    """Archive every closed day after the newest segment (or from the first row); returns days written."""
+    now = now or datetime.now(timezone.utc)
+    horizon = now.date() - timedelta(days=HISTORY_ARCHIVE_LAG_DAYS)
+
+    done = archived_days()
+    if done:
+        day = done[-1] + timedelta(days=1)
+    else:
+        first = db[settings.COLL_VESSEL_POSITION].find_one(
+            {"timestamp_utc": {"$ne": None}}, {"timestamp_utc": 1}, sort=[("timestamp_utc", 1)]
+        )
+        if not first:
+            return 0
+        day = parse_mongo_ts(first["timestamp_utc"]).date()
+
+    written = 0
+    while day < horizon:
+        n = archive_day(db, day)
+        print(f"[history] archived {day}: {n} row(s).")
+        day += timedelta(days=1)
+        written += 1
+    return written + archive_dirty_days(db)
+
+
+def archive_dirty_days(db) -> int:
+    """
+    Re-archive the days marked by mark_days_dirty, up to the newest segment (later days are
+    still read from Mongo and archived by the contiguous pass); returns days written.
+    """
+    done = archived_days()
+    if not done:
+        return 0
+    marks = db[COLL_HISTORY_DIRTY_DAYS]
+    query = {"archive": {"$exists": True}, "day": {"$lte": _day_start(done[-1])}}
+    written = 0
+    for mark in marks.find(query).sort("day", 1):
+        day = parse_mongo_ts(mark["day"]).date()
+        n = archive_day(db, day)
+        # a mark set again while we were archiving stays for the next pass
+        marks.update_one({"_id": mark["_id"], "archive": mark["archive"]}, {"$unset": {"archive": ""}})
+        print(f"[history] re-archived {day} (rows added after archiving): {n} row(s).")
+        written += 1
+    return written
+
+
+def mark_changed_days(db) -> int:
+    """Mark every archived day on which Mongo has more rows than the segment; returns days marked."""
+    coll = db[settings.COLL_VESSEL_POSITION]
+    changed = []
+    for day in archived_days():
+        start = _day_start(day)
+        n = coll.count_documents({"timestamp_utc": {"$gte": start, "$lt": start + timedelta(days=1)}})
+        rows = load_day(day)
+        if n > (len(rows) if rows is not None else 0):
+            changed.append(day)
+    mark_days_dirty(db, changed)
+    print(f"[history] {len(changed)} archived day(s) have rows missing from their segment.")
+    return len(changed)
+
+
+# -----------------------------------------------------------------------------
+# Readers
+# -----------------------------------------------------------------------------
+
+def load_day(day: date) -> Optional[np.ndarray]:
+    """Zero-copy view of one day's segment, or None if that day is not archived."""
+    path = segment_path(day)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def _vessel_slice(rows: np.ndarray, mmsi: int) -> np.ndarray:
+    lo, hi = np.searchsorted(rows["mmsi"], [mmsi, mmsi + 1])
+    return rows[lo:hi]
+
+
+def rows_for(mmsi: int, start: datetime, end: datetime) -> np.ndarray:
+    """One vessel's archived rows with start <= ts < end, in time order."""
+    lo_ms, hi_ms = _ms(start), _ms(end)
+    parts = []
+    day = parse_mongo_ts(start).date()
+    while day <= parse_mongo_ts(end).date():
+        rows = load_day(day)
+        if rows is not None:
+            v = _vessel_slice(rows, int(mmsi))
+            parts.append(v[(v["ts"] >= lo_ms) & (v["ts"] < hi_ms)])
+        day += timedelta(days=1)
+    return np.concatenate(parts) if parts else np.empty(0, dtype=SEGMENT_DTYPE)
+
+
+def _opt_float(x) -> Optional[float]:
+    return None if np.isnan(x) else round(float(x), 1)
+
+
+def _to_doc(mmsi: int, r) -> Dict:
+    return {
+        "mmsi": mmsi,
+        "timestamp_utc": datetime.fromtimestamp(int(r["ts"]) / 1000, timezone.utc).replace(tzinfo=None),
+        "coordinates": {"type": "Point", "coordinates": [float(r["lon"]), float(r["lat"])]},
+        "sog": _opt_float(r["sog"]),
+        "cog": _opt_float(r["cog"]),
+        "heading": None if r["heading"] < 0 else int(r["heading"]),
+        "nav_status": None if r["nav_status"] < 0 else int(r["nav_status"]),
+    }
+
+
+def _iter_segment_docs(days: List[date]) -> Iterator[Dict]:
+    """Archived rows as docs, ordered by (mmsi, ts) across all `days`."""
+    segments = [rows for rows in (load_day(d) for d in days) if rows is not None and len(rows)]
+    if not segments:
+        return
+    # per-segment start offset of every vessel, so each vessel is one slice per day
+    starts = []
+    for rows in segments:
+        uniq, first = np.unique(rows["mmsi"], return_index=True)
+        starts.append((uniq, np.append(first, len(rows))))
+    for mmsi in np.unique(np.concatenate([u for u, _ in starts])):
+        m = int(mmsi)
+        for rows, (uniq, bounds) in zip(segments, starts):
+            i = np.searchsorted(uniq, mmsi)
+            if i < len(uniq) and uniq[i] == mmsi:
+                for r in rows[bounds[i]:bounds[i + 1]]:
+                    yield _to_doc(m, r)
+
+
+def _merge_key(doc: Dict):
+    try:
+        mmsi = int(doc.get("mmsi"))
+    except (TypeError, ValueError):
+        mmsi = -1
+    return mmsi, _ms(doc.get("timestamp_utc"))
+
+
+def iter_history_docs(db) -> Iterator[Dict]:
+    """
+    Every vessel_position row ordered by (mmsi, timestamp_utc), like the backfills' sorted
+    find(): archived days come from the segments, newer rows from Mongo, merged per vessel.
+    Days marked dirty are re-archived first, so rows added to archived days are included.
+    """
+    archive_dirty_days(db)
+    days = archived_days()
+    coll = db[settings.COLL_VESSEL_POSITION]
+    tail_filter = {"timestamp_utc": {"$gte": _day_start(days[-1] + timedelta(days=1))}} if days else {}
+    tail = coll.find(tail_filter, _PROJECTION, batch_size=settings.HISTORY_BATCH_SIZE).sort(
+        [("mmsi", 1), ("timestamp_utc", 1)]
+    )
+    if days:
+        print(f"[history] reading {days[0]}..{days[-1]} from segments, later rows from Mongo.")
+    return heapq.merge(_iter_segment_docs(days), tail, key=_merge_key)
+
+
+def main():
+    from src.database.mongo_connection import get_mongo_connection
+    db = get_mongo_connection()
+    if HISTORY_RECHECK:
+        mark_changed_days(db)
+    archive_closed_days(db)
+
+
+if __name__ == "__main__":
+    main()
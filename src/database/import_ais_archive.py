@@ -0,0 +1,266 @@
+# src/database/import_ais_archive.py
+"""
+Streaming import of archived AIS position files into `vessel_position`.
+
+Accepted inputs (optionally gzipped, detected from the extension):
+  - .ndjson / .jsonl   one message per line
+  - .json              a JSON array (parsed incrementally) or NDJSON
+  - .csv               header row; aisstream-style or MarineCadastre-style column names
+
+Each record may be a raw PositionReport (UserID, Latitude, ...), a full aisstream message
+({"MetaData": {...}, "Message": {"PositionReport": {...}}}) or a flat row (MMSI, LAT, LON,
+BaseDateTime, ...). The *source* timestamp is kept (MetaData.time_utc, BaseDateTime,
+timestamp_utc, ...); records without one are skipped rather than stamped with now().
+
+Rows are inserted in IMPORT_BATCH_SIZE unordered insert_many batches spread over
+IMPORT_WORKERS threads, with at most 2 * IMPORT_WORKERS batches in flight so memory stays
+bounded. Imported rows get a natural-key _id ("imp_<mmsi>_<epoch ms>"), so re-importing the
+same or overlapping archives skips duplicates instead of doubling history. The days that got
+rows are marked dirty (history_segments.mark_days_dirty) so already-archived days are
+re-archived with them.
+
+    IMPORT_FILES="archive/2025-07-*.ndjson.gz" python -m src.database.import_ais_archive
+"""
+import csv
+import glob
+import gzip
+import io
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional
+
+from pymongo.errors import BulkWriteError
+
+from src.database import settings
+from src.database.history_segments import mark_days_dirty
+from src.database.mongo_connection import get_mongo_connection
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 5000))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", 4))
+READ_CHUNK = 1 << 20
+
+DUPLICATE_KEY = 11000
+
+# flat-row column aliases -> canonical field
+COLUMN_ALIASES = {
+    "mmsi": "mmsi", "userid": "mmsi", "mmsi/userid": "mmsi",
+    # (not PositionReport "Timestamp": that is only the second of the minute)
+    "timestamp_utc": "timestamp", "time_utc": "timestamp", "basedatetime": "timestamp",
+    "lat": "lat", "latitude": "lat",
+    "lon": "lon", "longitude": "lon",
+    "sog": "sog", "cog": "cog",
+    "heading": "heading", "trueheading": "heading",
+    "nav_status": "nav_status", "navigationalstatus": "nav_status", "status": "nav_status",
+    "rot": "rot", "rateofturn": "rot",
+}
+
+
+# -----------------------------------------------------------------------------
+# Reading
+# -----------------------------------------------------------------------------
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def _iter_json_array(f) -> Iterator[Dict]:
+    """Decode the elements of a top-level JSON array one at a time."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,[":
+            pos += 1
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                if buf[pos:].strip():
+                    raise
+                return
+            chunk = f.read(READ_CHUNK)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield obj
+        pos = end
+
+
+def _iter_ndjson(f) -> Iterator[Dict]:
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_records(path: str) -> Iterator[Dict]:
+    """Raw records from one archive file, read incrementally."""
+    name = path[:-3] if path.endswith(".gz") else path
+    with _open_text(path) as f:
+        if name.endswith(".csv"):
+            yield from csv.DictReader(f)
+        elif name.endswith(".json"):
+            head = f.read(1)
+            while head and head.isspace():
+                head = f.read(1)
+            if head == "[":
+                yield from _iter_json_array(f)
+            else:
+                yield from _iter_ndjson(io.StringIO(head + f.readline()))
+                yield from _iter_ndjson(f)
+        else:
+            yield from _iter_ndjson(f)
+
+
+# -----------------------------------------------------------------------------
+# Normalising
+# -----------------------------------------------------------------------------
+
+def parse_source_ts(value) -> Optional[datetime]:
+    """Parse archive timestamps: datetimes, epoch s/ms, ISO strings, aisstream '... +0000 UTC'."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.replace(".", "", 1).isdigit()):
+        secs = float(value)
+        return datetime.fromtimestamp(secs / 1000 if secs > 1e11 else secs, timezone.utc)
+    s = str(value).strip()
+    if s.endswith(" UTC"):
+        s = s[:-4]
+    # nanosecond fractions (aisstream) -> microseconds
+    if "." in s:
+        head, frac = s.split(".", 1)
+        digits = len(frac) - len(frac.lstrip("0123456789"))
+        s = f"{head}.{frac[:min(digits, 6)]}{frac[digits:]}"
+    try:
+        ts = datetime.fromisoformat(s.replace(" +", "+").replace(" -", "-"))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _num(value, cast=float):
+    if value is None or value == "":
+        return None
+    try:
+        return cast(float(value)) if cast is int else cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_position_doc(record: Dict, fallback_ts: Optional[datetime] = None) -> Optional[Dict]:
+    """
+    Map any supported record shape to a vessel_position document (None if unusable).
+    `fallback_ts` is only used for records that carry no timestamp of their own.
+    """
+    meta = record.get("MetaData") or {}
+    report = (record.get("Message") or {}).get("PositionReport")
+    if report is not None:
+        flat = {**report, "time_utc": meta.get("time_utc")}
+    else:
+        flat = record
+
+    f = {}
+    for k, v in flat.items():
+        canonical = COLUMN_ALIASES.get(str(k).strip().lower())
+        if canonical and f.get(canonical) in (None, ""):
+            f[canonical] = v
+
+    mmsi = _num(f.get("mmsi"), int)
+    ts = parse_source_ts(f.get("timestamp")) or fallback_ts
+    lon, lat = _num(f.get("lon")), _num(f.get("lat"))
+    if mmsi is None or ts is None or lon is None or lat is None:
+        return None
+
+    return {
+        "_id": f"imp_{mmsi}_{int(ts.timestamp() * 1000)}",
+        "mmsi": mmsi,
+        "timestamp_utc": ts,
+        "coordinates": {"type": "Point", "coordinates": [lon, lat]},
+        "sog": _num(f.get("sog")),
+        "cog": _num(f.get("cog")),
+        "heading": _num(f.get("heading"), int),
+        "nav_status": _num(f.get("nav_status"), int),
+        "rot": _num(f.get("rot")),
+        "source": "archive-import",
+    }
+
+
+# -----------------------------------------------------------------------------
+# Writing
+# -----------------------------------------------------------------------------
+
+def _insert_batch(coll, docs) -> Dict[str, int]:
+    try:
+        inserted = len(coll.insert_many(docs, ordered=False).inserted_ids)
+        result = {"inserted": inserted, "duplicates": 0, "errors": 0}
+    except BulkWriteError as e:
+        errs = e.details.get("writeErrors", [])
+        dups = sum(1 for w in errs if w.get("code") == DUPLICATE_KEY)
+        if len(errs) > dups:
+            print(f"[import] batch had {len(errs) - dups} write error(s), e.g. {errs[0].get('errmsg')}")
+        result = {"inserted": e.details.get("nInserted", 0), "duplicates": dups, "errors": len(errs) - dups}
+    if result["inserted"]:
+        # imported days may already be archived: have the next archive pass merge them in
+        mark_days_dirty(coll.database, {d["timestamp_utc"].astimezone(timezone.utc).date() for d in docs})
+    return result
+
+
+def import_files(paths, db=None, fallback_ts: Optional[datetime] = None) -> Dict[str, int]:
+    """Stream every file in `paths` into vessel_position; returns running totals."""
+    db = db if db is not None else get_mongo_connection()
+    coll = db[settings.COLL_VESSEL_POSITION]
+    totals = {"read": 0, "skipped": 0, "inserted": 0, "duplicates": 0, "errors": 0}
+    in_flight = set()
+
+    def drain(limit: int):
+        nonlocal in_flight
+        while len(in_flight) > limit:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                for k, v in fut.result().items():
+                    totals[k] += v
+
+    with ThreadPoolExecutor(max_workers=IMPORT_WORKERS) as pool:
+        for path in paths:
+            batch = []
+            for record in iter_records(path):
+                totals["read"] += 1
+                doc = to_position_doc(record, fallback_ts)
+                if doc is None:
+                    totals["skipped"] += 1
+                    continue
+                batch.append(doc)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    drain(2 * IMPORT_WORKERS - 1)
+                    in_flight.add(pool.submit(_insert_batch, coll, batch))
+                    batch = []
+            if batch:
+                drain(2 * IMPORT_WORKERS - 1)
+                in_flight.add(pool.submit(_insert_batch, coll, batch))
+            print(f"[import] {path}: read {totals['read']} record(s) so far.")
+        drain(0)
+
+    print(
+        f"[import] done: {totals['inserted']} inserted, {totals['duplicates']} duplicate(s) skipped, "
+        f"{totals['skipped']} unusable record(s), {totals['errors']} error(s)."
+    )
+    return totals
+
+
+def main():
+    patterns = [p.strip() for p in os.getenv("IMPORT_FILES", "").split(",") if p.strip()]
+    paths = sorted({p for pattern in patterns for p in glob.glob(pattern)})
+    if not paths:
+        raise RuntimeError("No input files: set IMPORT_FILES to a comma-separated list of paths/globs.")
+    import_files(paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# src/database/index_advisor.py
+"""
+Index advisor: explain the query shapes the API and jobs actually run, flag collection scans
+and in-memory sorts, and verify the index set declared in create_indexes.INDEX_SPECS.
+
+    python -m src.database.index_advisor                  # report only
+    ADVISOR_APPLY=true python -m src.database.index_advisor   # create/verify indexes, re-explain
+
+Every shape is run through `explain` (executionStats) with sample values taken from the
+database itself (a real MMSI, port id, area name, ...), so plans and timings reflect the
+data you point MONGO_URI at; use a local copy rather than production. With ADVISOR_APPLY the
+index set is applied via create_indexes.ensure_all and each shape is explained again, giving
+a before/after table of plan, docs examined and execution time.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from src.database import settings
+from src.database.create_indexes import INDEX_SPECS, ensure_all
+from src.database.llm_job_queue import COLL_LLM_JOBS
+from src.database.traffic_rollups import COLL_TRAFFIC_ROLLUPS
+
+ADVISOR_APPLY = os.getenv("ADVISOR_APPLY", "false").lower() == "true"
+
+def _sample(db, coll: str, field: str, default=None):
+    doc = db[coll].find_one({field: {"$exists": True}}, {field: 1})
+    return doc.get(field, default) if doc else default
+
+
+def query_shapes(db) -> List[Dict]:
+    """The hot query shapes, filled in with sample values from `db`."""
+    now = datetime.now(timezone.utc)
+    mmsi = _sample(db, settings.COLL_LATEST_POSITIONS, "mmsi", 235000000)
+    port_id = _sample(db, settings.COLL_PORT_CALLS, "port_id", "port:port-of-liverpool")
+    area_name = _sample(db, "area_calls", "area_name", "Gladstone Dock")
+    week = {"$gte": now - timedelta(days=7), "$lt": now}
+    return [
+        # API
+        {"name": "vessels: recent latest positions", "collection": settings.COLL_LATEST_POSITIONS,
+         "filter": {"timestamp_utc": {"$gte": now - timedelta(days=5)}}},
+        {"name": "vessel_history: one vessel, keyset page", "collection": settings.COLL_VESSEL_POSITION,
+         "filter": {"mmsi": mmsi, "timestamp_utc": week}, "sort": [("timestamp_utc", 1), ("_id", 1)], "limit": 1000},
+        {"name": "vessel_history batch: fixes in a bbox", "collection": settings.COLL_VESSEL_POSITION,
+         "filter": {"timestamp_utc": {"$gte": now - timedelta(hours=24), "$lt": now},
+                    "coordinates": {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [[
+                        [-3.2, 53.3], [-2.9, 53.3], [-2.9, 53.5], [-3.2, 53.5], [-3.2, 53.3]]]}}}}},
+        {"name": "vessel_popup: newest calls", "collection": settings.COLL_PORT_CALLS,
+         "filter": {"mmsi": mmsi}, "sort": [("exit_ts", -1), ("entry_ts", -1)], "limit": 18},
+        {"name": "vessel_popup: active visit", "collection": settings.COLL_VISIT_STATE,
+         "filter": {"mmsi": mmsi, "in_port": True}},
+        {"name": "traffic: port calls by place id", "collection": settings.COLL_PORT_CALLS,
+         "filter": {"port_id": {"$in": [port_id]}, "entry_ts": week}},
+        {"name": "area traffic: calls by area name", "collection": "area_calls",
+         "filter": {"area_name": {"$in": [area_name]}, "entry_ts": week}},
+        {"name": "stats engine: rollup rows", "collection": COLL_TRAFFIC_ROLLUPS,
+         "filter": {"kind": "port", "grain": "day", "bucket_start": week}},
+        {"name": "flags: MID table load", "collection": "mmsi_flags",
+         "filter": {"MID": {"$gte": 200, "$lte": 799}}},
+        {"name": "vessel details by mmsi", "collection": "vessel_details", "filter": {"mmsi": mmsi}},
+        # jobs
+        {"name": "aggregator: unaggregated port calls", "collection": settings.COLL_PORT_CALLS,
+         "filter": {"aggregated_window": None}},
+        {"name": "aggregator: unaggregated area calls", "collection": "area_calls",
+         "filter": {"aggregated_window": None}},
+        {"name": "live updater: port state by mmsi", "collection": settings.COLL_VISIT_STATE, "filter": {"mmsi": mmsi}},
+        {"name": "live updater: area state by mmsi", "collection": "visit_state_areas", "filter": {"mmsi": mmsi}},
+        {"name": "reconciler: stale area states", "collection": "visit_state_areas",
+         "filter": {"last_seen_ts": {"$lt": now - timedelta(hours=settings.VISIT_STALE_HOURS)}}},
+        {"name": "history archive: one day", "collection": settings.COLL_VESSEL_POSITION,
+         "filter": {"timestamp_utc": {"$gte": now - timedelta(days=2), "$lt": now - timedelta(days=1)}}},
+        {"name": "summaries: newest for scope", "collection": settings.COLL_LLM_SUMMARIES,
+         "filter": {"scope": "ports"}, "sort": [("created_at", -1)], "limit": 1},
+        {"name": "llm worker: claim job", "collection": COLL_LLM_JOBS,
+         "filter": {"status": "queued"}, "sort": [("queued_at", 1)], "limit": 1},
+    ]
+
+
+# -----------------------------------------------------------------------------
+# Explain
+# -----------------------------------------------------------------------------
+
+def _walk(node, stages: List[str], indexes: List[str]) -> None:
+    if isinstance(node, dict):
+        if "stage" in node:
+            stages.append(node["stage"])
+        if "indexName" in node:
+            indexes.append(node["indexName"])
+        for v in node.values():
+            _walk(v, stages, indexes)
+    elif isinstance(node, list):
+        for v in node:
+            _walk(v, stages, indexes)
+
+
+def explain_shape(db, shape: Dict) -> Dict:
+    cmd = {"find": shape["collection"], "filter": shape["filter"]}
+    if shape.get("sort"):
+        cmd["sort"] = dict(shape["sort"])
+    if shape.get("limit"):
+        cmd["limit"] = shape["limit"]
+    try:
+        out = db.command("explain", cmd, verbosity="executionStats")
+    except Exception as e:
+        return {"error": str(e)}
+    stages, indexes = [], []
+    _walk(out.get("queryPlanner", {}).get("winningPlan", {}), stages, indexes)
+    stats = out.get("executionStats", {})
+    return {
+        "collscan": "COLLSCAN" in stages,
+        "blocking_sort": "SORT" in stages,
+        "indexes": sorted(set(indexes)),
+        "ms": stats.get("executionTimeMillis"),
+        "examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+    }
+
+
+def _plan(r: Optional[Dict]) -> str:
+    if r is None:
+        return "-"
+    if "error" in r:
+        return f"error: {r['error'][:40]}"
+    plan = "COLLSCAN" if r["collscan"] else ",".join(r["indexes"]) or "?"
+    return plan + (" +SORT" if r["blocking_sort"] else "")
+
+
+def report(shapes: List[Dict], before: List[Dict], after: Optional[List[Dict]] = None) -> int:
+    """Print one line per shape; returns how many still scan or sort in memory."""
+    problems = 0
+    for i, shape in enumerate(shapes):
+        b = before[i]
+        a = after[i] if after else None
+        final = a or b
+        bad = "error" not in final and (final["collscan"] or final["blocking_sort"])
+        problems += bad
+        line = f"{'!!' if bad else 'ok'} {shape['name']:<44} {_plan(b):<32}"
+        if "error" not in b:
+            line += f" {b['examined']} examined / {b['returned']} returned in {b['ms']} ms"
+        if a is not None and "error" not in a:
+            line += f"  ->  {_plan(a)}: {a['examined']} examined in {a['ms']} ms"
+        print(line)
+    return problems
+
+
+def verify_indexes(db) -> List[str]:
+    """Names of INDEX_SPECS entries that are missing or differ from their declaration."""
+    issues = []
+    existing: Dict[str, Dict] = {}
+    for coll_name, keys, name, opts in INDEX_SPECS:
+        if coll_name not in existing:
+            existing[coll_name] = {ix["name"]: ix for ix in db[coll_name].list_indexes()}
+        ix = existing[coll_name].get(name)
+        if ix is None:
+            issues.append(f"{coll_name}.{name}: missing")
+            continue
+        if list(ix["key"].items()) != list(keys):
+            issues.append(f"{coll_name}.{name}: key {list(ix['key'].items())} != {list(keys)}")
+        for opt, default in (("unique", False), ("sparse", False), ("expireAfterSeconds", None),
+                             ("partialFilterExpression", None)):
+            if ix.get(opt, default) != opts.get(opt, default):
+                issues.append(f"{coll_name}.{name}: {opt} {ix.get(opt, default)} != {opts.get(opt, default)}")
+    return issues
+
+
+def main():
+    from src.database.mongo_connection import get_mongo_connection
+    db = get_mongo_connection()
+    shapes = query_shapes(db)
+
+    before = [explain_shape(db, s) for s in shapes]
+    after = None
+    if ADVISOR_APPLY:
+        ensure_all(db)
+        after = [explain_shape(db, s) for s in shapes]
+
+    print("\n== Query plans ==")
+    problems = report(shapes, before, after)
+    issues = verify_indexes(db)
+    print("\n== Index set ==")
+    for issue in issues:
+        print(f"  {issue}")
+    print(f"{len(INDEX_SPECS) - len(issues)}/{len(INDEX_SPECS)} declared indexes verified; "
+          f"{problems} query shape(s) still scanning or sorting in memory.")
+    if issues and not ADVISOR_APPLY:
+        print("Run with ADVISOR_APPLY=true to create/verify the index set.")
+
+
+if __name__ == "__main__":
+    main()
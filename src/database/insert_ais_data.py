@@ -1,5 +1,4 @@
 #database/insert_ais_data.py
-import json
 from datetime import datetime
 from .mongo_connection import db
 from datetime import timezone
@@ -33,13 +32,14 @@ def transform_ais_record(record):
         "source": "ais-websocket"
     }
 
-def insert_ais_from_file(filepath: str):
-    with open(filepath, "r") as f:
-        data = json.load(f)
-    collection = db["vessel_position"]
-    transformed = [transform_ais_record(entry) for entry in data]
-    result = collection.insert_many(transformed)
-    print(f"Inserted {len(result.inserted_ids)} AIS records.")
+def insert_ais_from_file(filepath: str, stamp_now: bool = False):
+    """
+    Stream an AIS dump (JSON array / NDJSON / CSV, optionally .gz) into vessel_position.
+    Rows keep their source timestamps; stamp_now=True restores the old behaviour of
+    stamping now() on records that have none (bare PositionReports from the live stream).
+    """
+    from .import_ais_archive import import_files
+    import_files([filepath], db, fallback_ts=datetime.now(timezone.utc) if stamp_now else None)
 
 
 def insert_ais_batch(data_list):
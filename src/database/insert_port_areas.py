@@ -6,6 +6,7 @@ from pathlib import Path
 import sys
 
 from src.database.mongo_connection import get_mongo_connection
+from src.database.precompute_port_area_geometry import precompute_port_area_geometry
 # Add the root directory to the path so `src` can be imported
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
@@ -37,6 +38,9 @@ def insert_port_areas(filepath: str):
     collection.create_index([("geometry", GEOSPHERE)])
     print("📌 2dsphere index created on 'geometry'.")
 
+    # Centroids + simplified geometries for the vector tile endpoint (also resets tile cache)
+    precompute_port_area_geometry(db)
+
 if __name__ == "__main__":
     # Full Windows path to geojson
     geojson_path = Path(r"C:\Users\minahil\vec\vehicle-gis-platform\data\json\geojson\port_areas.geojson")
@@ -0,0 +1,69 @@
+# src/database/llm_job_queue.py
+"""
+Mongo-backed queue of LLM summary jobs (`llm_jobs`), shared by the API and the batch jobs.
+
+A job is identified by (kind, params), so submitting the same summary twice while it is
+queued or running is a no-op. Finished jobs keep their last result and are re-queued on
+the next submit. The worker lives in src/utils/llm_jobs.py (API process).
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+COLL_LLM_JOBS = os.getenv("COLL_LLM_JOBS", "llm_jobs")
+ACTIVE_STATUSES = ["queued", "running"]
+
+# Summaries pre-generated after every aggregation run (the dashboard defaults)
+PREGENERATE_KINDS = ["traffic-insights:uk", "traffic-insights:liverpool"]
+PREGENERATE_DAYS = [int(d) for d in os.getenv("LLM_PREGENERATE_DAYS", "7").split(",") if d.strip()]
+
+
+def job_id_for(kind: str, params: Optional[Dict[str, Any]] = None) -> str:
+    payload = json.dumps({"kind": kind, "params": params or {}}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def queued_job_update(kind: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Update document that (re)queues a job; used with upsert by both sync and async callers."""
+    now = datetime.now(timezone.utc)
+    return {
+        "$set": {
+            "kind": kind,
+            "params": params or {},
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "queued_at": now,
+            "updated_at": now,
+            # a fresh submit gets a fresh retry budget (the worker's own retries keep counting)
+            "attempts": 0,
+            "worker": None,
+        },
+        "$setOnInsert": {"created_at": now},
+    }
+
+
+def enqueue_summary_job(db, kind: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Queue a job unless an identical one is already queued/running. Returns the job id."""
+    job_id = job_id_for(kind, params)
+    try:
+        db[COLL_LLM_JOBS].update_one(
+            {"_id": job_id, "status": {"$nin": ACTIVE_STATUSES}},
+            queued_job_update(kind, params),
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass  # already queued or running
+    return job_id
+
+
+def enqueue_pregeneration(db) -> None:
+    """Schedule the default dashboard summaries; called at the end of each aggregation run."""
+    for kind in PREGENERATE_KINDS:
+        for days in PREGENERATE_DAYS:
+            enqueue_summary_job(db, kind, {"days": days})
+    print(f"[llm_jobs] queued summary pre-generation for {PREGENERATE_KINDS} x days={PREGENERATE_DAYS}.")
@@ -0,0 +1,36 @@
+"""
+Backfill registry ids (port_id / area_id) onto existing `port_calls` and `area_calls`, and
+rebuild the `places` registry, matching what visit finalisation now writes.
+
+- One update_many per distinct raw name (served by the portname_entry index), so this is
+  cheap even on large collections; aliases get their canonical place's id.
+- Applying it also rebuilds traffic_rollups when needed (traffic_rollups.migrate_place_ids),
+  into a staging collection swapped in with a rename. Run it once per deployment, with the
+  aggregators paused; re-running is a no-op.
+
+Run first with DRY_RUN=true to preview, then DRY_RUN=false to apply.
+"""
+
+import os
+
+from src.database.mongo_connection import get_mongo_connection
+from src.database.place_registry import CALLS_COLLECTION, backfill_place_ids, rebuild_places
+from src.database.traffic_rollups import migrate_place_ids
+
+DRY_RUN = os.getenv("DRY_RUN", "true").lower() == "true"
+
+
+def add_place_ids(db, kind: str):
+    updated = backfill_place_ids(db, kind, dry_run=DRY_RUN)
+    mode = "DRY_RUN" if DRY_RUN else "APPLIED"
+    print(f"[add_place_ids:{mode}] {CALLS_COLLECTION[kind]}: updated={updated}")
+
+
+if __name__ == "__main__":
+    db = get_mongo_connection()
+    if DRY_RUN:
+        add_place_ids(db, "port")
+        add_place_ids(db, "area")
+    else:
+        migrate_place_ids(db)
+        rebuild_places(db)
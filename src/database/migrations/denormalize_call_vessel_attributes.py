@@ -0,0 +1,64 @@
+"""
+Backfill vessel attributes (type_code, type_group, vessel_name, flag_iso) onto existing
+`port_calls` and `area_calls`, matching what visit finalisation now writes.
+
+- Only calls without `type_group` are touched unless FORCE=true (re-derive everything,
+  e.g. after vessel_details has been enriched).
+- vessel_details is read once per batch with a single $in query.
+
+Run first with DRY_RUN=true to preview, then DRY_RUN=false to apply.
+"""
+
+import os
+from typing import List
+
+from pymongo import UpdateOne
+from src.database import settings
+from src.database.mongo_connection import get_mongo_connection
+from src.database.vessel_attributes import CALL_ATTRIBUTE_FIELDS, vessel_attributes_many
+
+DRY_RUN = os.getenv("DRY_RUN", "true").lower() == "true"
+FORCE = os.getenv("FORCE", "false").lower() == "true"
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "5000"))
+
+
+def _flush(coll, batch: List[dict]) -> int:
+    attrs = vessel_attributes_many(coll.database, (d.get("mmsi") for d in batch))
+    ops = [
+        UpdateOne({"_id": d["_id"]}, {"$set": attrs.get(d.get("mmsi")) or dict.fromkeys(CALL_ATTRIBUTE_FIELDS)})
+        for d in batch
+    ]
+    if not DRY_RUN and ops:
+        coll.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def denormalize(coll_name: str):
+    db = get_mongo_connection()
+    coll = db[coll_name]
+    query = {} if FORCE else {"type_group": {"$exists": False}}
+
+    scanned = 0
+    updated = 0
+    batch: List[dict] = []
+
+    cursor = coll.find(query, projection={"_id": 1, "mmsi": 1}, no_cursor_timeout=True)
+    try:
+        for doc in cursor:
+            scanned += 1
+            batch.append(doc)
+            if len(batch) >= BATCH_SIZE:
+                updated += _flush(coll, batch)
+                batch.clear()
+        if batch:
+            updated += _flush(coll, batch)
+    finally:
+        cursor.close()
+
+    mode = "DRY_RUN" if DRY_RUN else "APPLIED"
+    print(f"[denormalize_call_vessel_attributes:{mode}] {coll_name}: scanned={scanned}, updated={updated}")
+
+
+if __name__ == "__main__":
+    denormalize(settings.COLL_PORT_CALLS)
+    denormalize("area_calls")
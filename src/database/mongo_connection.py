@@ -1,25 +1,53 @@
 # src/database/mongo_connection.py
 import os
 from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 
+try:
+    from src.database.query_profiler import event_listeners
+except ImportError:  # imported as a bare module by the aggregator scripts
+    from query_profiler import event_listeners
+
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB = os.getenv("MONGO_DB", "metaliverpool-intern")
 
+# Connection pool size for the shared async client used by the API
+MONGO_ASYNC_MAX_POOL = int(os.getenv("MONGO_ASYNC_MAX_POOL", 100))
+
 # Raise error if missing
 if not MONGO_URI:
     raise ValueError("MONGO_URI not found in environment variables.")
 
-client = MongoClient(MONGO_URI)
+# Both clients report every command to the query profiler (src.database.query_profiler)
+
+# Blocking client: ingestion, visit processing and one-off scripts
+client = MongoClient(MONGO_URI, event_listeners=event_listeners())
 db = client[MONGO_DB]
 
+# Non-blocking client: FastAPI endpoints await queries on this one so a single
+# uvicorn worker can serve many concurrent requests. Motor binds to the running
+# event loop on first use, so creating it at import time is safe.
+async_client = AsyncIOMotorClient(MONGO_URI, maxPoolSize=MONGO_ASYNC_MAX_POOL,
+                                  event_listeners=event_listeners())
+async_db = async_client[MONGO_DB]
+
 def get_mongo_connection():
     """
     Returns the MongoDB connection object.
-    
+
     Returns:
         MongoClient: The MongoDB client connected to the specified database.
     """
-    return db
\ No newline at end of file
+    return db
+
+def get_async_mongo_connection():
+    """
+    Returns the shared async (Motor) database handle for API endpoints.
+
+    Returns:
+        AsyncIOMotorDatabase: The Motor database for the configured MONGO_DB.
+    """
+    return async_db
@@ -0,0 +1,221 @@
+# src/database/place_registry.py
+"""
+Canonical registry of ports and Liverpool sub-areas (`places`).
+
+Every place has a stable id derived from its canonical name ("port:port-of-liverpool",
+"area:<slug>"); known misspellings seen in port_areas are aliases of the canonical place and
+share its id. Calls carry the id (`port_id` / `area_id`) next to the raw name, so filters are
+`{"port_id": {"$in": [...]}}` index seeks instead of unanchored regex scans.
+
+    { _id: "port:port-of-garston", kind: "port", name: "Port of Garston",
+      aliases: ["Port of Gartson"], groups: ["liverpool"] }
+
+Groups (e.g. "liverpool") replace the hard-coded Liverpool name lists the dashboards and
+insights used to carry.
+
+The collection is filled as calls are finalised (register_place) and can be rebuilt with
+`python -m src.database.place_registry`.
+"""
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+COLL_PLACES = os.getenv("COLL_PLACES", "places")
+
+ID_FIELD = {"port": "port_id", "area": "area_id"}
+NAME_FIELD = {"port": "port_name", "area": "area_name"}
+CALLS_COLLECTION = {"port": os.getenv("COLL_PORT_CALLS", "port_calls"), "area": "area_calls"}
+
+# alias -> canonical name, per kind (typo variants occasionally present in port_areas)
+PLACE_ALIASES: Dict[str, Dict[str, str]] = {
+    "port": {"Port of Gartson": "Port of Garston"},
+    "area": {},
+}
+
+# group -> (kind, canonical names)
+PLACE_GROUPS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "liverpool": ("port", ("Birkenhead Dock Estate", "Port of Liverpool", "Port of Garston")),
+}
+
+REGISTRY_TTL_SECONDS = int(os.getenv("PLACE_REGISTRY_TTL_SECONDS", "300"))
+
+
+# -----------------------------------------------------------------------------
+# Pure helpers (no DB)
+# -----------------------------------------------------------------------------
+
+def _slug(s: str) -> str:
+    s = (s or "").strip().lower()
+    s = re.sub(r"[^a-z0-9]+", "-", s)
+    return s.strip("-") or "unknown"
+
+
+def canonical_name(kind: str, name: str) -> str:
+    return PLACE_ALIASES.get(kind, {}).get(name, name)
+
+
+def place_id(kind: str, name: str) -> str:
+    """Stable id for a place name (aliases resolve to their canonical place)."""
+    return f"{kind}:{_slug(canonical_name(kind, name))}"
+
+
+def _aliases_of(kind: str, canonical: str) -> List[str]:
+    return sorted(a for a, c in PLACE_ALIASES.get(kind, {}).items() if c == canonical)
+
+
+def _groups_of(kind: str, canonical: str) -> List[str]:
+    return sorted(g for g, (k, names) in PLACE_GROUPS.items() if k == kind and canonical in names)
+
+
+def group_names(group: str, include_aliases: bool = True) -> List[str]:
+    """Raw names belonging to a group (canonical, plus aliases as they appear in stored docs)."""
+    kind, names = PLACE_GROUPS[group]
+    out = list(names)
+    if include_aliases:
+        for n in names:
+            out.extend(_aliases_of(kind, n))
+    return out
+
+
+def group_ids(group: str) -> List[str]:
+    kind, names = PLACE_GROUPS[group]
+    return [place_id(kind, n) for n in names]
+
+
+LIVERPOOL_PORT_NAMES = group_names("liverpool")
+LIVERPOOL_PORT_IDS = frozenset(group_ids("liverpool"))
+
+
+def place_doc(kind: str, name: str) -> Dict:
+    canonical = canonical_name(kind, name)
+    return {
+        "_id": place_id(kind, name),
+        "kind": kind,
+        "name": canonical,
+        "aliases": _aliases_of(kind, canonical),
+        "groups": _groups_of(kind, canonical),
+    }
+
+
+# -----------------------------------------------------------------------------
+# Write side (sync, jobs)
+# -----------------------------------------------------------------------------
+
+_registered: set = set()
+
+
+def register_place(db, kind: str, name: str) -> str:
+    """Make sure `name` has a registry entry (one upsert per place per process); returns its id."""
+    pid = place_id(kind, name)
+    if pid not in _registered:
+        doc = place_doc(kind, name)
+        db[COLL_PLACES].update_one({"_id": pid}, {"$set": doc}, upsert=True)
+        _registered.add(pid)
+    return pid
+
+
+def backfill_place_ids(db, kind: str, dry_run: bool = False) -> int:
+    """
+    Set `port_id` / `area_id` on calls finalised before ids existed (or under an alias that has
+    since been mapped). One update_many per distinct raw name; idempotent, so a no-op once
+    every call carries its id. Returns the number of calls updated (matched when `dry_run`).
+    """
+    coll = db[CALLS_COLLECTION[kind]]
+    name_field, id_field = NAME_FIELD[kind], ID_FIELD[kind]
+    updated = 0
+    for name in coll.distinct(name_field):
+        if not name:
+            continue
+        pid = place_id(kind, name)
+        query = {name_field: name, id_field: {"$ne": pid}}
+        if dry_run:
+            updated += coll.count_documents(query)
+        else:
+            updated += coll.update_many(query, {"$set": {id_field: pid}}).modified_count
+    return updated
+
+
+def rebuild_places(db) -> int:
+    """Recreate the registry from port_areas (type Port) and the names present on calls."""
+    names: Dict[str, set] = {
+        "port": set(n for n in db["port_areas"].distinct("properties.name", {"properties.type": "Port"}) if n),
+        "area": set(),
+    }
+    for kind in ("port", "area"):
+        names[kind].update(n for n in db[CALLS_COLLECTION[kind]].distinct(NAME_FIELD[kind]) if n)
+
+    docs = {}
+    for kind, kind_names in names.items():
+        for n in kind_names:
+            d = place_doc(kind, n)
+            docs[d["_id"]] = d
+
+    coll = db[COLL_PLACES]
+    coll.delete_many({})
+    if docs:
+        coll.insert_many(list(docs.values()))
+    _registered.clear()
+    print(f"[places] registry rebuilt: {len(docs)} place(s).")
+    return len(docs)
+
+
+# -----------------------------------------------------------------------------
+# Read side (async, API)
+# -----------------------------------------------------------------------------
+
+_cache: Dict[str, Tuple[float, List[Dict]]] = {}
+
+
+async def load_places(async_db, kind: str) -> List[Dict]:
+    """Registry entries for `kind`, cached in-process for REGISTRY_TTL_SECONDS."""
+    hit = _cache.get(kind)
+    if hit and time.monotonic() - hit[0] < REGISTRY_TTL_SECONDS:
+        return hit[1]
+    docs = await async_db[COLL_PLACES].find({"kind": kind}).to_list(length=None)
+    if not docs:
+        # Registry not built yet: derive it from the (indexed) names on the calls
+        raw = await async_db[CALLS_COLLECTION[kind]].distinct(NAME_FIELD[kind])
+        by_id = {}
+        for n in raw:
+            if n:
+                d = place_doc(kind, n)
+                by_id[d["_id"]] = d
+        docs = list(by_id.values())
+    _cache[kind] = (time.monotonic(), docs)
+    return docs
+
+
+def _compile(pattern: str):
+    try:
+        return re.compile(pattern, re.IGNORECASE)
+    except re.error:
+        return re.compile(re.escape(pattern), re.IGNORECASE)
+
+
+async def resolve_places(async_db, kind: str, pattern: Optional[str]) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    Resolve a case-insensitive name pattern (the old `$regex` filters) against the registry
+    once, matching canonical names and aliases. Returns (ids, raw names incl. aliases) to use
+    as `$in` filters, or None when there is no pattern (= no filter).
+    """
+    if not pattern:
+        return None
+    rx = _compile(pattern)
+    ids: List[str] = []
+    names: List[str] = []
+    for d in await load_places(async_db, kind):
+        candidates = [d["name"], *d.get("aliases", [])]
+        if any(rx.search(c) for c in candidates):
+            ids.append(d["_id"])
+            names.extend(candidates)
+    return ids, names
+
+
+def main():
+    from src.database.mongo_connection import get_mongo_connection
+    rebuild_places(get_mongo_connection())
+
+
+if __name__ == "__main__":
+    main()
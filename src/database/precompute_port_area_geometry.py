@@ -0,0 +1,74 @@
+# src/database/precompute_port_area_geometry.py
+"""
+Precompute derived geometry for `port_areas` and reset the vector tile cache.
+
+For every port area feature:
+  - properties.centroid   -> [lon, lat] (Shapely centroid, computed once)
+  - simplified.z{band}    -> GeoJSON geometry simplified for that zoom band
+
+Tiles in `port_area_tiles` are generated lazily by the API and are only valid for the
+geometry version they were built from, so this script clears them and bumps the version.
+Run it whenever `port_areas` changes (insert_port_areas.py calls it automatically).
+"""
+
+import hashlib
+import json
+
+from pymongo import UpdateOne
+
+from src.database.mongo_connection import get_mongo_connection
+from src.database import settings
+from src.database.time_utils import now_utc
+from src.utils.vector_tiles import SIMPLIFY_ZOOMS, centroid_of, simplify_geometry
+
+TILES_VERSION_ID = "__version__"
+
+
+def precompute_port_area_geometry(db) -> str:
+    """
+    Store centroids + simplified geometries on every port_areas doc, then invalidate tiles.
+    Returns the new geometry version (a hash of the source geometries).
+    """
+    areas = db[settings.COLL_PORT_AREAS]
+    digest = hashlib.sha1()
+    ops = []
+
+    for doc in areas.find({}, projection={"_id": 1, "geometry": 1}).sort("_id", 1):
+        geometry = doc.get("geometry")
+        if not geometry:
+            continue
+        digest.update(json.dumps(geometry, sort_keys=True, default=str).encode("utf-8"))
+
+        simplified = {}
+        for band in SIMPLIFY_ZOOMS:
+            geom = simplify_geometry(geometry, band)
+            if geom:
+                simplified[f"z{band}"] = geom
+
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {
+            "properties.centroid": centroid_of(geometry),
+            "simplified": simplified,
+        }}))
+
+    for i in range(0, len(ops), 500):
+        areas.bulk_write(ops[i:i + 500], ordered=False)
+
+    version = digest.hexdigest()[:12]
+    tiles = db[settings.COLL_PORT_AREA_TILES]
+    tiles.delete_many({"_id": {"$ne": TILES_VERSION_ID}})
+    tiles.replace_one(
+        {"_id": TILES_VERSION_ID},
+        {"_id": TILES_VERSION_ID, "version": version, "updated_at": now_utc()},
+        upsert=True,
+    )
+
+    print(f"[port_areas] precomputed geometry for {len(ops)} feature(s); tiles version={version}.")
+    return version
+
+
+def main():
+    precompute_port_area_geometry(get_mongo_connection())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# src/database/query_profiler.py
+"""
+Mongo command profiling and request metrics, rendered in Prometheus text format.
+
+- QueryProfiler is a pymongo CommandListener registered on both the blocking and the Motor
+  client (src.database.mongo_connection), so every command from the API, the collector and
+  the batch jobs is timed. Latencies go into a histogram per (collection, command).
+- Commands slower than SLOW_QUERY_MS are written as one JSON line (event "slow_query") with
+  the filter / pipeline / update that caused them, truncated to SLOW_QUERY_MAX_CHARS, plus
+  the API route that issued them when there is one.
+- track_db_time() opens a per-request accumulator (a contextvar, so it follows the request
+  into Motor's executor threads); the API middleware reads it to report DB time per route.
+
+Set QUERY_PROFILER=false to leave the clients without a listener.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+QUERY_PROFILER = os.getenv("QUERY_PROFILER", "true").lower() == "true"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+SLOW_QUERY_MAX_CHARS = int(os.getenv("SLOW_QUERY_MAX_CHARS", 4000))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# the parts of a command worth logging, by command name
+_SHAPE_FIELDS = {
+    "find": ("filter", "sort", "projection", "limit"),
+    "aggregate": ("pipeline",),
+    "count": ("query",),
+    "distinct": ("key", "query"),
+    "findAndModify": ("query", "sort", "update"),
+    "update": ("updates",),
+    "delete": ("deletes",),
+    "insert": (),
+}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a label tuple (thread-safe)."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}   # counts per bucket + [+Inf, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: Tuple[str, ...], value: float) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in sorted(self._series.items())]
+        for label_values, series in items:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            sep = "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by a label tuple (thread-safe)."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values: Tuple[str, ...], amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value}")
+        return lines
+
+
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_duration_seconds", "Mongo command latency by collection and command.",
+    ("collection", "command"), LATENCY_BUCKETS,
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total", "Mongo commands that returned an error.", ("collection", "command"),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "API request latency (until the last body byte) by route.",
+    ("method", "route", "status"), LATENCY_BUCKETS,
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent in Mongo commands per API request, by route.",
+    ("method", "route"), LATENCY_BUCKETS,
+)
+HTTP_RESPONSE_BYTES = Histogram(
+    "http_response_bytes", "API response body size by route.", ("method", "route"), BYTES_BUCKETS,
+)
+
+METRICS = (MONGO_COMMAND_SECONDS, MONGO_COMMAND_FAILURES, HTTP_REQUEST_SECONDS,
+           HTTP_REQUEST_DB_SECONDS, HTTP_RESPONSE_BYTES)
+
+
+def render_metrics() -> str:
+    """All metrics in Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------------------------------------------------------
+# Per-request DB time
+# -----------------------------------------------------------------------------
+
+class DbTime:
+    __slots__ = ("route", "seconds", "commands")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.seconds = 0.0
+        self.commands = 0
+
+
+_current: ContextVar[Optional[DbTime]] = ContextVar("query_profiler_db_time", default=None)
+
+
+def track_db_time(route: str) -> DbTime:
+    """Start accumulating Mongo time for the current request (and tasks/threads it spawns)."""
+    acc = DbTime(route)
+    _current.set(acc)
+    return acc
+
+
+# -----------------------------------------------------------------------------
+# Command listener
+# -----------------------------------------------------------------------------
+
+def _shape(command_name: str, command) -> Dict:
+    fields = _SHAPE_FIELDS.get(command_name)
+    if fields is None:
+        return {}
+    return {f: command[f] for f in fields if f in command}
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """Times every command; records histograms and logs slow commands with their shape."""
+
+    def __init__(self):
+        self._pending: Dict[Tuple, Tuple[str, str, str, Dict, Optional[DbTime]]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        command = event.command
+        target = command.get(event.command_name)
+        # getMore carries the cursor id there and the collection name separately
+        collection = target if isinstance(target, str) else command.get("collection", "")
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                event.database_name, collection, event.command_name,
+                _shape(event.command_name, command), _current.get(),
+            )
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        database, collection, command_name, shape, acc = pending
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMAND_SECONDS.observe((collection, command_name), seconds)
+        if failed:
+            MONGO_COMMAND_FAILURES.inc((collection, command_name))
+        if acc is not None:
+            acc.seconds += seconds
+            acc.commands += 1
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            ns = f"{database}.{collection}" if collection else database
+            self._log_slow(ns, command_name, shape, seconds, acc, failed)
+
+    def _log_slow(self, namespace, command_name, shape, seconds, acc, failed):
+        detail = json.dumps(shape, default=str)
+        if len(detail) > SLOW_QUERY_MAX_CHARS:
+            detail = detail[:SLOW_QUERY_MAX_CHARS] + "...(truncated)"
+        print(json.dumps({
+            "event": "slow_query",
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "ns": namespace,
+            "command": command_name,
+            "ms": round(seconds * 1000, 1),
+            "failed": failed,
+            "route": acc.route if acc is not None else None,
+            "shape": detail,
+        }))
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+profiler = QueryProfiler()
+
+
+def event_listeners() -> List[monitoring.CommandListener]:
+    """Listeners to pass to MongoClient / AsyncIOMotorClient (empty when profiling is off)."""
+    return [profiler] if QUERY_PROFILER else []
@@ -16,6 +16,9 @@ COLL_PORT_AREAS       = os.getenv("COLL_PORT_AREAS", "port_areas")
 COLL_VISIT_STATE      = os.getenv("COLL_VISIT_STATE", "port_visit_state")
 COLL_PORT_CALLS       = os.getenv("COLL_PORT_CALLS", "port_calls")
 COLL_PORT_TRAFFIC     = os.getenv("COLL_PORT_TRAFFIC", "port_traffic")
+COLL_PORT_AREA_TILES  = os.getenv("COLL_PORT_AREA_TILES", "port_area_tiles")
+COLL_DASHBOARD_STATS  = os.getenv("COLL_DASHBOARD_STATS", "dashboard_stats")
+COLL_LLM_SUMMARIES    = os.getenv("COLL_LLM_SUMMARIES", "llm_summaries")
 
 # Scan limits
 SCAN_LIMIT = int(os.getenv("STATE_UPDATE_SCAN_LIMIT", 5000))
@@ -25,3 +28,11 @@ LIVE_RECENT_MINUTES = int(os.getenv("LIVE_RECENT_MINUTES", 15))
 
 # Historical backfill batch size (how many docs to stream per find() batch)
 HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", 20000))
+
+# Expiry
+# latest_positions rows expire (TTL index) once a vessel has been silent this long (= /api/vessels/ window)
+LATEST_POSITION_TTL_HOURS = int(os.getenv("LATEST_POSITION_TTL_HOURS", 120))
+# Visit state for a vessel silent this long is reconciled: confirmed visits finalised, tentative ones dropped
+VISIT_STALE_HOURS = float(os.getenv("VISIT_STALE_HOURS", 6))
+# TTL backstop for visit state rows the reconciler never reached
+VISIT_STATE_TTL_DAYS = int(os.getenv("VISIT_STATE_TTL_DAYS", 7))
@@ -0,0 +1,138 @@
+# src/database/traffic_anomalies.py
+"""
+Streaming, weekday-seasonal spike detection over the daily rollup rows.
+
+When a day closes, each place's count is scored against that place's counts on the same
+weekday over the previous BASELINE_WEEKS weeks (read from the same day rows, starting at the
+place's first week with traffic, missing weeks counting as zero):
+
+    z = (count - median) / max(1.4826 * MAD, 1)        (robust z-score)
+    spike = z >= ANOMALY_Z and the baseline has >= MIN_HISTORY days
+
+and the result is written onto the day's rollup row as
+
+    anomaly: { z, median, mad, spike }
+
+so readers (compute_traffic_stats) get per-day flags and scores with the rows they already
+fetch. Each close is O(places) with O(BASELINE_WEEKS) work per place, independent of the
+query window.
+
+Calls are finalised (and rolled up) when the vessel leaves, so a day's count keeps growing
+for as long as its longest stay, and no fixed lag covers that. Instead every rollup flush
+marks the day rows it touches `anomaly_dirty`. close_days() re-scores each dirty day older
+than ANOMALY_CLOSE_LAG_DAYS, together with the later same-weekday days whose baseline
+includes it. The partial `anomaly_dirty` index keeps that lookup cheap after every
+aggregator run. `python -m src.database.traffic_anomalies` re-scores everything. Run it once
+after upgrading from the stored-baseline version.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+try:
+    from src.database.traffic_rollups import COLL_TRAFFIC_ROLLUPS, bucket_start
+except ImportError:  # imported as a bare module by the aggregator scripts
+    from traffic_rollups import COLL_TRAFFIC_ROLLUPS, bucket_start
+
+BASELINE_WEEKS = int(os.getenv("ANOMALY_BASELINE_WEEKS", "8"))
+MIN_HISTORY = int(os.getenv("ANOMALY_MIN_HISTORY", "3"))
+ANOMALY_Z = float(os.getenv("ANOMALY_Z", "3.0"))
+CLOSE_LAG_DAYS = int(os.getenv("ANOMALY_CLOSE_LAG_DAYS", "1"))
+
+MAD_SCALE = 1.4826  # MAD -> standard deviation for normally distributed counts
+
+
+def _median(values: List[float]) -> float:
+    s = sorted(values)
+    if not s:
+        return 0.0
+    mid = len(s) // 2
+    return float(s[mid]) if len(s) % 2 == 1 else 0.5 * (s[mid - 1] + s[mid])
+
+
+def score(count: int, history: List[int]) -> Dict:
+    """Robust z-score of `count` against a weekday history (the baseline before this day)."""
+    median = _median(history)
+    mad = _median([abs(h - median) for h in history])
+    z = (count - median) / max(MAD_SCALE * mad, 1.0)
+    return {
+        "z": round(z, 2),
+        "median": median,
+        "mad": mad,
+        "spike": len(history) >= MIN_HISTORY and z >= ANOMALY_Z,
+    }
+
+
+def _close_day(db, kind: str, day: datetime) -> int:
+    """Score one closed day for every place with traffic on it; returns places scored."""
+    weeks = [day - timedelta(weeks=k) for k in range(BASELINE_WEEKS, -1, -1)]  # oldest first, `day` last
+    series: Dict[str, Dict[datetime, int]] = {}
+    today: Dict[str, Dict] = {}
+    for r in db[COLL_TRAFFIC_ROLLUPS].find(
+        {"kind": kind, "grain": "day", "bucket_start": {"$in": weeks}},
+        {"place_id": 1, "bucket_start": 1, "arrivals": 1},
+    ):
+        b = bucket_start("day", r["bucket_start"])
+        series.setdefault(r["place_id"], {})[b] = r.get("arrivals", 0)
+        if b == day:
+            today[r["place_id"]] = r
+
+    ops = []
+    for pid, row in today.items():
+        counts = series[pid]
+        first = next((i for i, w in enumerate(weeks[:-1]) if w in counts), len(weeks) - 1)
+        history = [int(counts.get(w, 0)) for w in weeks[first:-1]]
+        count = row.get("arrivals", 0)
+        # matching on the count read here leaves the row dirty if a flush lands in between
+        ops.append(UpdateOne(
+            {"_id": row["_id"], "arrivals": count},
+            {"$set": {"anomaly": score(int(count), history)}, "$unset": {"anomaly_dirty": ""}},
+        ))
+    if ops:
+        db[COLL_TRAFFIC_ROLLUPS].bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def close_days(db, kind: str = "port", now: Optional[datetime] = None) -> int:
+    """Score every closed day touched since the last call; returns the number of days scored."""
+    now = now or datetime.now(timezone.utc)
+    horizon = bucket_start("day", now) - timedelta(days=CLOSE_LAG_DAYS)
+
+    dirty = db[COLL_TRAFFIC_ROLLUPS].distinct(
+        "bucket_start", {"kind": kind, "grain": "day", "anomaly_dirty": True, "bucket_start": {"$lt": horizon}}
+    )
+    days = set()
+    for d in dirty:
+        d = bucket_start("day", d)
+        # the same weekday in later weeks used the old count in its baseline
+        for k in range(BASELINE_WEEKS + 1):
+            if d + timedelta(weeks=k) < horizon:
+                days.add(d + timedelta(weeks=k))
+
+    for day in sorted(days):
+        _close_day(db, kind, day)
+    if days:
+        print(f"[anomalies] scored {len(days)} {kind} day(s) ({len(dirty)} with new calls).")
+    return len(days)
+
+
+def rebuild_anomalies(db, kind: str = "port") -> int:
+    """Forget the scores for `kind` and score every closed day again."""
+    db[COLL_TRAFFIC_ROLLUPS].update_many(
+        {"kind": kind, "grain": "day"}, {"$set": {"anomaly_dirty": True}, "$unset": {"anomaly": ""}}
+    )
+    return close_days(db, kind)
+
+
+def main():
+    from src.database.mongo_connection import get_mongo_connection
+    db = get_mongo_connection()
+    db.drop_collection("traffic_baselines")  # stored baselines of the previous version
+    for kind in ("port", "area"):
+        rebuild_anomalies(db, kind)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+# src/database/traffic_rollups.py
+"""
+Precomputed traffic rollup cube (`traffic_rollups`).
+
+One row per (kind, place_id, grain, bucket_start):
+    kind          "port" (port_calls) | "area" (area_calls)
+    place_id      registry id of the port / area (see place_registry), or ALL_NAME for the
+                  total over every port/area
+    name          canonical port / area name (aliases fold into their canonical place)
+    grain         "6h" | "day" | "week" (ISO, Monday) | "month"
+    bucket_start  UTC start of the bucket
+
+and the counters:
+    arrivals                  number of calls entering in the bucket
+    by_group.<type group>     arrivals per vessel type group
+    by_type.<type code>       arrivals per AIS type code ("null" when unknown)
+    by_slot.<0|6|12|18>       arrivals per 6-hour UTC slot of entry
+    by_weekday.<0..6>         arrivals per weekday of entry (0 = Monday)
+    dwell_sum_min / dwell_count
+    mmsis                     distinct MMSIs seen in the bucket (exact; unions across rows)
+    hll.<register>            HyperLogLog sketch of the same MMSIs (sparse, merged with $max)
+
+Rows are maintained incrementally by the aggregators (RollupAccumulator over the calls they
+aggregate) and can be rebuilt from scratch with `python -m src.database.traffic_rollups`
+(into a staging collection swapped in with one rename; pause the aggregators while it runs).
+
+Readers cover a [start, end) window with the coarsest aligned buckets (cover_window), so a
+days=N query sums a few dozen rows per port instead of re-aggregating raw calls. Distinct
+vessel counts come from the HLL sketches by default (register-wise max across rows, ~1.6%
+standard error, constant memory); `exact=True` unions the MMSI arrays instead.
+"""
+import hashlib
+import math
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+try:
+    from src.database.place_registry import (
+        CALLS_COLLECTION, ID_FIELD, NAME_FIELD, backfill_place_ids, canonical_name, place_id,
+    )
+except ImportError:  # imported as a bare module by the aggregator scripts
+    from place_registry import CALLS_COLLECTION, ID_FIELD, NAME_FIELD, backfill_place_ids, canonical_name, place_id
+
+COLL_TRAFFIC_ROLLUPS = os.getenv("COLL_TRAFFIC_ROLLUPS", "traffic_rollups")
+
+GRAINS = ("6h", "day", "week", "month")
+ALL_NAME = "__all__"
+
+BULK_CHUNK = 1000
+
+HLL_P = 12                      # 4096 registers
+HLL_M = 1 << HLL_P
+
+
+# -----------------------------------------------------------------------------
+# Bucket math
+# -----------------------------------------------------------------------------
+
+def _utc(ts) -> datetime:
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def bucket_start(grain: str, ts) -> datetime:
+    ts = _utc(ts)
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if grain == "6h":
+        return day.replace(hour=(ts.hour // 6) * 6)
+    if grain == "day":
+        return day
+    if grain == "week":
+        return day - timedelta(days=day.weekday())
+    if grain == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown grain {grain!r}")
+
+
+def bucket_end(grain: str, start: datetime) -> datetime:
+    if grain == "6h":
+        return start + timedelta(hours=6)
+    if grain == "day":
+        return start + timedelta(days=1)
+    if grain == "week":
+        return start + timedelta(days=7)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def cover_window(start, end, grains: Iterable[str] = GRAINS) -> List[Tuple[str, datetime]]:
+    """
+    Greedy cover of [floor_6h(start), end) with the coarsest aligned buckets:
+    6h buckets up to the first midnight, days up to the next Monday / 1st, then weeks or
+    months, and back down at the far end. When `end` is (about) now, the last bucket may run
+    past it since it cannot hold future arrivals. A 30-day window is typically < 15 buckets.
+    `grains` caps the coarseness, e.g. ("day", "6h") when a daily series is needed.
+    """
+    allowed = [g for g in ("month", "week", "day", "6h") if g in grains or g == "6h"]
+    t = bucket_start("6h", start)
+    end = _utc(end)
+    open_ended = end >= datetime.now(timezone.utc) - timedelta(minutes=5)
+    cover: List[Tuple[str, datetime]] = []
+    while t < end:
+        for grain in allowed:
+            if bucket_start(grain, t) != t:
+                continue
+            nxt = bucket_end(grain, t)
+            if grain == "6h" or nxt <= end or open_ended:
+                break
+        cover.append((grain, t))
+        t = nxt
+    return cover
+
+
+def cover_clauses(start, end, grains: Iterable[str] = GRAINS) -> List[Dict[str, Any]]:
+    """`$or` branches (one per grain) matching the buckets of cover_window(start, end, grains)."""
+    by_grain: Dict[str, List[datetime]] = defaultdict(list)
+    for grain, b in cover_window(start, end, grains):
+        by_grain[grain].append(b)
+    return [{"grain": g, "bucket_start": {"$in": starts}} for g, starts in by_grain.items()]
+
+
+def rollup_query(kind: str, start, end, place_ids: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Mongo filter selecting the rows that cover [start, end) for `place_ids` (None = every place)."""
+    query: Dict[str, Any] = {"kind": kind, "$or": cover_clauses(start, end)}
+    if place_ids is not None:
+        query["place_id"] = {"$in": list(place_ids)}
+    else:
+        # rows written before place ids existed have no place_id and are superseded by the
+        # id-keyed rows (migrate_place_ids drops them); don't count them twice
+        query["place_id"] = {"$exists": True, "$ne": ALL_NAME}
+    return query
+
+
+# -----------------------------------------------------------------------------
+# Distinct-MMSI sketches (HyperLogLog)
+# -----------------------------------------------------------------------------
+
+def hll_register(mmsi) -> Tuple[int, int]:
+    """(register index, rank) for one MMSI; stable across processes (no PYTHONHASHSEED)."""
+    h = int.from_bytes(hashlib.blake2b(str(int(mmsi)).encode(), digest_size=8).digest(), "big")
+    idx = h >> (64 - HLL_P)
+    rest = h & ((1 << (64 - HLL_P)) - 1)
+    rank = (64 - HLL_P) - rest.bit_length() + 1
+    return idx, rank
+
+
+def hll_add(registers: Dict[str, int], mmsi) -> None:
+    """Fold one MMSI into a sparse {register: rank} sketch (keys are strings, as stored)."""
+    idx, rank = hll_register(mmsi)
+    key = str(idx)
+    if rank > registers.get(key, 0):
+        registers[key] = rank
+
+
+def hll_merge(into: Dict[str, int], other: Optional[Dict[str, int]]) -> None:
+    for key, rank in (other or {}).items():
+        if rank > into.get(key, 0):
+            into[key] = rank
+
+
+def hll_count(registers: Dict[str, int]) -> int:
+    """Cardinality estimate with the usual small-range (linear counting) correction."""
+    if not registers:
+        return 0
+    alpha = 0.7213 / (1 + 1.079 / HLL_M)
+    zeros = HLL_M - len(registers)
+    harmonic = zeros + sum(2.0 ** -int(r) for r in registers.values())
+    estimate = alpha * HLL_M * HLL_M / harmonic
+    if estimate <= 2.5 * HLL_M and zeros:
+        estimate = HLL_M * math.log(HLL_M / zeros)
+    return int(round(estimate))
+
+
+# -----------------------------------------------------------------------------
+# Incremental maintenance
+# -----------------------------------------------------------------------------
+
+def _key(value) -> str:
+    """Make a safe subdocument key (no dots / leading $)."""
+    return str(value).replace(".", "_").lstrip("$") or "null"
+
+
+def type_code_from_key(key: str):
+    """Inverse of _key for by_type keys: "null" -> None, "70" / "70_0" -> 70, else the raw key."""
+    if key == "null":
+        return None
+    try:
+        code = float(key.replace("_", "."))
+    except ValueError:
+        return key
+    return int(code) if code.is_integer() else code
+
+
+class RollupAccumulator:
+    """Collects increments for many calls in memory, then writes one upsert per touched row."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._inc: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._mmsis: Dict[tuple, set] = defaultdict(set)
+        self._hll: Dict[tuple, Dict[str, int]] = defaultdict(dict)
+        self.calls = 0
+
+    def add(self, call: Dict[str, Any]) -> None:
+        raw_name = call.get(NAME_FIELD[self.kind])
+        entry_ts = call.get("entry_ts")
+        if not raw_name or entry_ts is None:
+            return
+        pid = call.get(ID_FIELD[self.kind]) or place_id(self.kind, raw_name)
+        name = canonical_name(self.kind, raw_name)
+        entry_ts = _utc(entry_ts)
+        slot = _key((entry_ts.hour // 6) * 6)
+        weekday = _key(entry_ts.weekday())
+        group = _key(call.get("type_group") or "Other / Unknown")
+        type_code = _key(call.get("type_code") if call.get("type_code") is not None else "null")
+        duration = call.get("duration_min")
+        mmsi = call.get("mmsi")
+        register = hll_register(mmsi) if mmsi is not None else None
+
+        for grain in GRAINS:
+            b = bucket_start(grain, entry_ts)
+            for row_id, row_name in ((pid, name), (ALL_NAME, ALL_NAME)):
+                key = (row_id, row_name, grain, b)
+                inc = self._inc[key]
+                inc["arrivals"] += 1
+                inc[f"by_group.{group}"] += 1
+                inc[f"by_type.{type_code}"] += 1
+                inc[f"by_slot.{slot}"] += 1
+                inc[f"by_weekday.{weekday}"] += 1
+                if duration is not None:
+                    inc["dwell_sum_min"] += duration
+                    inc["dwell_count"] += 1
+                if register is not None:
+                    self._mmsis[key].add(mmsi)
+                    sketch = self._hll[key]
+                    idx = str(register[0])
+                    if register[1] > sketch.get(idx, 0):
+                        sketch[idx] = register[1]
+        self.calls += 1
+
+    def flush(self, db, coll_name: str = COLL_TRAFFIC_ROLLUPS) -> int:
+        """Upsert all touched rows (into `coll_name`); returns the number of rows written."""
+        ops = []
+        for key, inc in self._inc.items():
+            row_id, row_name, grain, b = key
+            update: Dict[str, Any] = {
+                "$inc": {k: (int(v) if float(v).is_integer() else v) for k, v in inc.items()},
+                "$setOnInsert": {"kind": self.kind, "place_id": row_id, "name": row_name, "grain": grain,
+                                 "bucket_start": b},
+            }
+            if grain == "day":
+                update["$set"] = {"anomaly_dirty": True}  # re-scored by traffic_anomalies.close_days
+            mmsis = self._mmsis.get(key)
+            if mmsis:
+                update["$addToSet"] = {"mmsis": {"$each": sorted(mmsis)}}
+            sketch = self._hll.get(key)
+            if sketch:
+                # $max per register makes concurrent/replayed flushes merge like HLL unions
+                update["$max"] = {f"hll.{idx}": rank for idx, rank in sketch.items()}
+            ops.append(UpdateOne({"_id": f"{self.kind}|{row_id}|{grain}|{b.isoformat()}"}, update, upsert=True))
+
+        coll = db[coll_name]
+        for i in range(0, len(ops), BULK_CHUNK):
+            coll.bulk_write(ops[i:i + BULK_CHUNK], ordered=False)
+        written = len(ops)
+        self._inc.clear()
+        self._mmsis.clear()
+        self._hll.clear()
+        return written
+
+
+def rebuild_rollups(db, kind: str, batch_size: int = 20000, include_pending: bool = False,
+                    coll_name: str = COLL_TRAFFIC_ROLLUPS) -> None:
+    """
+    Drop and recompute all rows of `kind` (in `coll_name`) from the raw calls. Calls still
+    pending aggregation (aggregated_window null) are left to the next incremental run, which
+    $incs them, so they are not counted twice; pass include_pending=True only when the caller
+    marks every call as aggregated in the same pass (the full rebuild in
+    aggregate_port_traffic_full).
+    """
+    deleted = db[coll_name].delete_many({"kind": kind}).deleted_count
+    print(f"[rollups] cleared {deleted} {kind} row(s).")
+    acc = RollupAccumulator(kind)
+    projection = {"_id": 0, NAME_FIELD[kind]: 1, ID_FIELD[kind]: 1, "entry_ts": 1, "type_group": 1, "type_code": 1,
+                  "duration_min": 1, "mmsi": 1}
+    rows = 0
+    query = {} if include_pending else {"aggregated_window": {"$ne": None}}
+    for call in db[CALLS_COLLECTION[kind]].find(query, projection).batch_size(batch_size):
+        acc.add(call)
+        if acc.calls % batch_size == 0:
+            rows += acc.flush(db, coll_name)
+    rows += acc.flush(db, coll_name)
+    print(f"[rollups] rebuilt {kind}: {acc.calls} call(s) -> {rows} row write(s).")
+
+
+def rebuild_all_rollups(db) -> None:
+    """
+    Rebuild every kind into a staging collection (with the live collection's indexes) and
+    swap it in with one rename, so readers never see a cleared or half-built cube.
+    """
+    staging = db[f"{COLL_TRAFFIC_ROLLUPS}_staging"]
+    staging.drop()
+    db.create_collection(staging.name)  # exists for the rename even when there are no calls
+    for ix in db[COLL_TRAFFIC_ROLLUPS].list_indexes():
+        if ix["name"] != "_id_":
+            opts = {k: v for k, v in ix.items() if k not in ("v", "key", "ns")}
+            staging.create_index(list(ix["key"].items()), **opts)
+    for kind in ("port", "area"):
+        rebuild_rollups(db, kind, coll_name=staging.name)
+    staging.rename(COLL_TRAFFIC_ROLLUPS, dropTarget=True)
+    print(f"[rollups] swapped the rebuilt cube into {COLL_TRAFFIC_ROLLUPS}.")
+
+
+def migrate_place_ids(db) -> None:
+    """
+    One-off migration to the place-id schema: backfill port_id / area_id onto old calls,
+    then rebuild the cube if any call was backfilled or rows without place_id are left over.
+    Run via `DRY_RUN=false python -m src.database.migrations.add_place_ids` with the
+    aggregators paused; re-running it is a no-op.
+    """
+    backfilled = sum(backfill_place_ids(db, kind) for kind in ("port", "area"))
+    legacy = db[COLL_TRAFFIC_ROLLUPS].find_one({"place_id": {"$exists": False}}, {"_id": 1})
+    if backfilled or legacy:
+        print(f"[rollups] {backfilled} call(s) given place ids; rebuilding the cube.")
+        rebuild_all_rollups(db)
+
+
+# -----------------------------------------------------------------------------
+# Read side
+# -----------------------------------------------------------------------------
+
+def merge_rows(rows: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Sum rows per place: counters add, subdocuments add key-wise, mmsis union, sketches
+    register-wise max. `unique_mmsi_count` is the exact set size when the rows carried
+    MMSIs, otherwise the HLL estimate.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for r in rows:
+        m = merged.setdefault(r.get("place_id") or r["name"], {
+            "name": r["name"], "arrivals": 0, "by_group": defaultdict(int), "by_type": defaultdict(int),
+            "by_slot": defaultdict(int), "by_weekday": defaultdict(int),
+            "dwell_sum_min": 0.0, "dwell_count": 0, "mmsis": set(), "hll": {},
+        })
+        m["arrivals"] += r.get("arrivals", 0)
+        for field in ("by_group", "by_type", "by_slot", "by_weekday"):
+            for k, v in (r.get(field) or {}).items():
+                m[field][k] += v
+        m["dwell_sum_min"] += r.get("dwell_sum_min", 0)
+        m["dwell_count"] += r.get("dwell_count", 0)
+        m["mmsis"].update(r.get("mmsis") or [])
+        hll_merge(m["hll"], r.get("hll"))
+    for m in merged.values():
+        m["unique_mmsi_count"] = len(m["mmsis"]) if m["mmsis"] else hll_count(m["hll"])
+    return merged
+
+
+async def read_rollups(async_db, kind: str, start, end, place_ids: Optional[Iterable[str]] = None,
+                       exact: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Merged per-place counters for [start, end), keyed by place id; `place_ids` restricts to
+    those places (resolve name patterns with place_registry.resolve_places first).
+    Only one of the distinct-vessel representations is fetched: the MMSI arrays when `exact`,
+    the (bounded-size) HLL registers otherwise.
+    """
+    query = rollup_query(kind, start, end, place_ids)
+    projection = {"_id": 0, ("hll" if exact else "mmsis"): 0}
+    rows = await async_db[COLL_TRAFFIC_ROLLUPS].find(query, projection).to_list(length=None)
+    return merge_rows(rows)
+
+
+def main():
+    from src.database.mongo_connection import get_mongo_connection
+    rebuild_all_rollups(get_mongo_connection())
+
+
+if __name__ == "__main__":
+    main()
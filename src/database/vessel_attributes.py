@@ -0,0 +1,49 @@
+# src/database/vessel_attributes.py
+"""
+Vessel attributes copied onto port_calls / area_calls when a visit is finalised, so the
+analytics pipelines can group on them directly instead of $lookup-ing vessel_details:
+
+    type_code    AIS ship type code (None when no static data has been seen)
+    type_group   UI group from VESSEL_TYPE_GROUPS ("Other / Unknown" when unknown)
+    vessel_name  vessel_details.Name
+    flag_iso     ISO flag code resolved from the MMSI's MID (src/utils/flag_utils.py)
+
+Existing calls are filled in by src/database/migrations/denormalize_call_vessel_attributes.py.
+"""
+from typing import Dict, Iterable, Optional
+
+from src.utils.flag_utils import flag_table
+from src.utils.vessel_types import type_group_for_code
+
+CALL_ATTRIBUTE_FIELDS = ("type_code", "type_group", "vessel_name", "flag_iso")
+
+
+def flag_iso_for(db, mmsi) -> Optional[str]:
+    return flag_table.ensure(db).iso_for(mmsi)
+
+
+def _attributes_from_details(db, mmsi, details: Optional[Dict]) -> Dict:
+    details = details or {}
+    type_code = details.get("Type")
+    return {
+        "type_code": type_code,
+        "type_group": type_group_for_code(type_code),
+        "vessel_name": details.get("Name"),
+        "flag_iso": flag_iso_for(db, mmsi),
+    }
+
+
+def vessel_attributes(db, mmsi) -> Dict:
+    """Attributes for one MMSI (one indexed find_one on vessel_details)."""
+    details = db["vessel_details"].find_one({"mmsi": mmsi}, {"_id": 0, "Type": 1, "Name": 1})
+    return _attributes_from_details(db, mmsi, details)
+
+
+def vessel_attributes_many(db, mmsis: Iterable) -> Dict[int, Dict]:
+    """Attributes for many MMSIs with a single $in query (backfills / migrations)."""
+    mmsis = list({m for m in mmsis if m is not None})
+    details = {
+        d["mmsi"]: d
+        for d in db["vessel_details"].find({"mmsi": {"$in": mmsis}}, {"_id": 0, "mmsi": 1, "Type": 1, "Name": 1})
+    }
+    return {m: _attributes_from_details(db, m, details.get(m)) for m in mmsis}
@@ -5,6 +5,10 @@ from datetime import timedelta
 from src.database.mongo_connection import get_mongo_connection
 from src.database import settings
 from src.database.time_utils import now_utc, parse_mongo_ts, minutes_between
+from src.database.dashboard_stats import record_liverpool_arrival
+from src.database.vessel_attributes import vessel_attributes
+from src.database.place_registry import register_place
+from src.utils.fleet_store import fleet_store
 
 
 def _slug(s: str) -> str:
@@ -65,6 +69,8 @@ def _finalize_visit(db, state_doc, exit_ts, last_coord):
 
     - Computes duration from 'entered_at' to provided 'exit_ts'
     - Uses deterministic _id to ensure exactly-once semantics
+    - Copies type/name/flag from vessel_details so analytics need no $lookup
+    - Stores the registry id (port_id) next to the raw port name
     - Deletes the per-MMSI state document after finalizing
     """
     entry_ts = parse_mongo_ts(state_doc["entered_at"])
@@ -75,6 +81,7 @@ def _finalize_visit(db, state_doc, exit_ts, last_coord):
         "_id": call_id,
         "mmsi": state_doc["mmsi"],
         "port_name": state_doc["port_name"],
+        "port_id": register_place(db, "port", state_doc["port_name"]),  # registry id for indexed filters
         "entry_ts": entry_ts,
         "exit_ts": exit_ts,
         "duration_min": duration_min,
@@ -82,12 +89,17 @@ def _finalize_visit(db, state_doc, exit_ts, last_coord):
         "first_coord": state_doc.get("first_coord"),
         "last_coord": last_coord,
         "aggregated_window": None,             # to be filled by the aggregator job
+        **vessel_attributes(db, state_doc["mmsi"]),
     }
 
     # Upsert the call and remove the live state for this MMSI (visit complete)
-    db[settings.COLL_PORT_CALLS].replace_one({"_id": call_id}, call_doc, upsert=True)
+    res = db[settings.COLL_PORT_CALLS].replace_one({"_id": call_id}, call_doc, upsert=True)
     db[settings.COLL_VISIT_STATE].delete_one({"_id": state_doc["_id"]})
 
+    # Only brand-new calls feed the dashboard counters (replays of the same visit are no-ops)
+    if res.upserted_id is not None:
+        record_liverpool_arrival(db, call_doc["port_id"], entry_ts, call_doc["type_group"])
+
 
 def _update_state_for_inside(db, pos_doc, port_name: str):
     """
@@ -239,13 +251,16 @@ def process_latest_positions_recent():
 
     # Only scan a sliding recent window to keep the job fast and incremental
     since = now_utc() - timedelta(minutes=settings.LIVE_RECENT_MINUTES)
-    cursor = lp.find(
-        {"timestamp_utc": {"$gte": since}},
-        projection={"_id": 1, "mmsi": 1, "coordinates": 1, "timestamp_utc": 1, "sog": 1, "nav_status": 1}
-    ).limit(settings.SCAN_LIMIT)
+    # Prefer the collector's shared fleet store; fall back to Mongo when it is unavailable
+    docs = fleet_store.recent_docs(since, limit=settings.SCAN_LIMIT)
+    if docs is None:
+        docs = lp.find(
+            {"timestamp_utc": {"$gte": since}},
+            projection={"_id": 1, "mmsi": 1, "coordinates": 1, "timestamp_utc": 1, "sog": 1, "nav_status": 1}
+        ).limit(settings.SCAN_LIMIT)
 
     count = 0
-    for doc in cursor:
+    for doc in docs:
         # Defensive guard against malformed or missing coordinates
         coords = (doc.get("coordinates") or {}).get("coordinates")
         if not coords or len(coords) != 2:
@@ -262,6 +277,47 @@ def process_latest_positions_recent():
         count += 1
 
     print(f"[live] Processed {count} latest_positions (last {settings.LIVE_RECENT_MINUTES} min).")
+    reconcile_stale_states(db)
+
+
+def stream_now(db):
+    """
+    Time of the newest fix in latest_positions (never later than now), or None if there is
+    none. "Silent" is measured against this rather than the wall clock, so a collector
+    outage doesn't make every vessel look silent and close all open visits.
+    """
+    newest = db[settings.COLL_LATEST_POSITIONS].find_one(
+        {"timestamp_utc": {"$ne": None}}, {"timestamp_utc": 1}, sort=[("timestamp_utc", -1)]
+    )
+    if not newest:
+        return None
+    return min(parse_mongo_ts(newest["timestamp_utc"]), now_utc())
+
+
+def reconcile_stale_states(db, now=None) -> int:
+    """
+    Close out visit_state rows for vessels that went silent (AIS off / out of coverage)
+    instead of leaving them for the TTL index:
+      - confirmed visits are finalised with exit_ts = last time the vessel was seen
+      - tentative states are dropped
+    `now` defaults to stream_now(). Uses the last_seen_ts index; returns the number of
+    states reconciled.
+    """
+    now = now or stream_now(db)
+    if now is None:
+        return 0
+    cutoff = now - timedelta(hours=settings.VISIT_STALE_HOURS)
+    state_coll = db[settings.COLL_VISIT_STATE]
+    count = 0
+    for state in state_coll.find({"last_seen_ts": {"$lt": cutoff}}):
+        if state.get("in_port") and state.get("entered_at") is not None:
+            _finalize_visit(db, state, parse_mongo_ts(state["last_seen_ts"]), state.get("last_coord"))
+        else:
+            state_coll.delete_one({"_id": state["_id"]})
+        count += 1
+    if count:
+        print(f"[live] Reconciled {count} stale visit state(s) (silent > {settings.VISIT_STALE_HOURS}h).")
+    return count
 
 
 def main():
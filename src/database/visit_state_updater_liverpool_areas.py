@@ -5,6 +5,10 @@ from datetime import timedelta
 from src.database.mongo_connection import get_mongo_connection
 from src.database import settings
 from src.database.time_utils import now_utc, parse_mongo_ts, minutes_between
+from src.database.vessel_attributes import vessel_attributes
+from src.database.place_registry import register_place
+from src.database.visit_state_updater import stream_now
+from src.utils.fleet_store import fleet_store
 
 # -----------------------------------------------------------------------------
 # Helpers
@@ -63,6 +67,7 @@ def _finalize_area_visit(db, state_doc, exit_ts, last_coord):
         "_id": call_id,
         "mmsi": state_doc["mmsi"],
         "area_name": state_doc["area_name"],
+        "area_id": register_place(db, "area", state_doc["area_name"]),
         "entry_ts": entry_ts,
         "exit_ts": exit_ts,
         "duration_min": duration_min,
@@ -70,6 +75,7 @@ def _finalize_area_visit(db, state_doc, exit_ts, last_coord):
         "first_coord": state_doc.get("first_coord"),
         "last_coord": last_coord,
         "aggregated_window": None,
+        **vessel_attributes(db, state_doc["mmsi"]),
     }
 
     db["area_calls"].replace_one({"_id": call_id}, call_doc, upsert=True)
@@ -181,13 +187,16 @@ def process_latest_positions_recent():
     lp = db[settings.COLL_LATEST_POSITIONS]
 
     since = now_utc() - timedelta(minutes=settings.LIVE_RECENT_MINUTES)
-    cursor = lp.find(
-        {"timestamp_utc": {"$gte": since}},
-        projection={"_id": 1, "mmsi": 1, "coordinates": 1, "timestamp_utc": 1, "sog": 1, "nav_status": 1}
-    ).limit(settings.SCAN_LIMIT)
+    # Prefer the collector's shared fleet store; fall back to Mongo when it is unavailable
+    docs = fleet_store.recent_docs(since, limit=settings.SCAN_LIMIT)
+    if docs is None:
+        docs = lp.find(
+            {"timestamp_utc": {"$gte": since}},
+            projection={"_id": 1, "mmsi": 1, "coordinates": 1, "timestamp_utc": 1, "sog": 1, "nav_status": 1}
+        ).limit(settings.SCAN_LIMIT)
 
     count = 0
-    for doc in cursor:
+    for doc in docs:
         coords = (doc.get("coordinates") or {}).get("coordinates")
         if not coords or len(coords) != 2:
             continue
@@ -202,6 +211,28 @@ def process_latest_positions_recent():
         count += 1
 
     print(f"[liverpool areas] Processed {count} latest_positions (last {settings.LIVE_RECENT_MINUTES} min).")
+    reconcile_stale_area_states(db)
+
+def reconcile_stale_area_states(db, now=None) -> int:
+    """
+    Finalise confirmed / drop tentative area states for vessels silent > VISIT_STALE_HOURS,
+    measured against the newest fix (visit_state_updater.stream_now), not the wall clock.
+    """
+    now = now or stream_now(db)
+    if now is None:
+        return 0
+    cutoff = now - timedelta(hours=settings.VISIT_STALE_HOURS)
+    state_coll = db["visit_state_areas"]
+    count = 0
+    for state in state_coll.find({"last_seen_ts": {"$lt": cutoff}}):
+        if state.get("in_area") and state.get("entered_at") is not None:
+            _finalize_area_visit(db, state, parse_mongo_ts(state["last_seen_ts"]), state.get("last_coord"))
+        else:
+            state_coll.delete_one({"_id": state["_id"]})
+        count += 1
+    if count:
+        print(f"[liverpool areas] Reconciled {count} stale area state(s).")
+    return count
 
 def main():
     process_latest_positions_recent()
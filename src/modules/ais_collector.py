@@ -10,9 +10,20 @@ from src.database.insert_ais_data import insert_or_update_vessel_details
 from src.database.insert_latest_position import upsert_latest_position
 from src.modules.transform_utils import transform_position_report, transform_ship_static_data
 from src.database.mongo_connection import get_mongo_connection
+from src.database.dashboard_stats import (
+    FLEET_FLUSH_SECONDS,
+    FLEET_REBUILD_SECONDS,
+    FleetStatsMaterialiser,
+    fleet_stats,
+    prune_liverpool_daily,
+    record_speed_sample,
+)
+from src.utils.fleet_store import FLEET_STORE, FLEET_STORE_COMPACT_SECONDS, FleetStoreWriter
 
 load_dotenv()
 
+fleet_writer = FleetStoreWriter()
+
 async def run_continuous_ais_stream():
     """
     Connects to the AIS WebSocket and listens for incoming messages.
@@ -35,7 +46,11 @@ async def run_continuous_ais_stream():
         async with websockets.connect("wss://stream.aisstream.io/v0/stream") as ws:
             await ws.send(json.dumps(subscription))
             print(f"[{datetime.now(timezone.utc)}] Connected and streaming...")
+            if FLEET_STORE:
+                await asyncio.to_thread(fleet_writer.warm, get_mongo_connection())
+                asyncio.create_task(maintain_fleet_store())
             asyncio.create_task(snapshot_latest_positions_every_15_minutes())
+            asyncio.create_task(maintain_dashboard_stats())
             while True:
                 try:
                     msg_json = await asyncio.wait_for(ws.recv(), timeout=30)
@@ -45,12 +60,15 @@ async def run_continuous_ais_stream():
                         report = message["Message"]["PositionReport"]
                         transformed = transform_position_report(report)
                         upsert_latest_position(transformed)
+                        fleet_writer.upsert(transformed)
+                        fleet_stats.observe_position(transformed)
 
                     elif message.get("MessageType") == "ShipStaticData":
                         static = message["Message"]["ShipStaticData"]
                         transformed = transform_ship_static_data(static)
                         print(f"[{datetime.now(timezone.utc)}] Inserting/updating vessel details for MMSI {transformed.get('mmsi')}")
                         insert_or_update_vessel_details([transformed])
+                        fleet_stats.observe_static(transformed)
 
                 except asyncio.TimeoutError:
                     print(f"[{datetime.now(timezone.utc)}] Timeout - no AIS messages. Still listening...")
@@ -71,6 +89,7 @@ async def snapshot_latest_positions_every_15_minutes():
                 for doc in latest_docs:
                     doc.pop("_id", None)
                 db["vessel_position"].insert_many(latest_docs)
+                record_speed_sample(db, latest_docs)
                 print(f"[{datetime.now(timezone.utc)}] Snapshot: Inserted {len(latest_docs)} into vessel_position.")
             else:
                 print(f"[{datetime.now(timezone.utc)}] Snapshot: No records to sync.")
@@ -80,3 +99,46 @@ async def snapshot_latest_positions_every_15_minutes():
         await asyncio.sleep(900)  # 15 minutes
 
 
+async def maintain_dashboard_stats():
+    """
+    Background task that keeps the materialised dashboard documents current:
+    flushes the in-memory UK fleet aggregates every FLEET_FLUSH_SECONDS and
+    rebuilds them from Mongo every FLEET_REBUILD_SECONDS (and once at startup)
+    so vessels removed by cleanup drop out of the counts.
+    """
+    db = get_mongo_connection()
+    last_rebuild = None
+    while True:
+        try:
+            loop_time = asyncio.get_running_loop().time()
+            if last_rebuild is None or loop_time - last_rebuild >= FLEET_REBUILD_SECONDS:
+                fleet_stats.begin_rebuild()
+                try:
+                    fresh = await asyncio.to_thread(FleetStatsMaterialiser.from_db, db)
+                except Exception:
+                    fleet_stats.cancel_rebuild()
+                    raise
+                fleet_stats.adopt(fresh)
+                await asyncio.to_thread(prune_liverpool_daily, db)
+                last_rebuild = loop_time
+                print(f"[{datetime.now(timezone.utc)}] Dashboard stats: rebuilt fleet aggregates.")
+            fleet_stats.flush(db)  # small doc; built on the loop so counters are not mutated mid-read
+        except Exception as e:
+            print(f"[{datetime.now(timezone.utc)}] Dashboard stats error: {e}")
+
+        await asyncio.sleep(FLEET_FLUSH_SECONDS)
+
+
+async def maintain_fleet_store():
+    """
+    Background task that drops vessels older than FLEET_STORE_MAX_AGE_HOURS from the
+    shared fleet store every FLEET_STORE_COMPACT_SECONDS. Each pass also refreshes the
+    store's heartbeat, so readers keep trusting it through quiet spells on the stream.
+    """
+    while True:
+        try:
+            fleet_writer.compact()
+        except Exception as e:
+            print(f"[{datetime.now(timezone.utc)}] Fleet store error: {e}")
+
+        await asyncio.sleep(FLEET_STORE_COMPACT_SECONDS)
@@ -0,0 +1,352 @@
+# src/modules/arrow_export.py
+"""
+Streaming Parquet / Feather export of AIS collections (replaces csv_saver / json_saver).
+
+Rows are read from a Mongo cursor (or from the archived history segments for
+vessel_position) EXPORT_BATCH_ROWS at a time, turned into Arrow record batches and appended
+to open Parquet / Feather (Arrow IPC) writers, so memory stays bounded by one batch per open
+partition whatever the size of the export.
+
+Position collections have a fixed schema. Other collections get theirs from the data: each
+batch's inferred schema is unified with the one written so far, and when that adds a field
+or widens a type (e.g. a field that was all-null in the first batch) the partition continues
+in a new part file. Read the output as a dataset with the unified schema.
+
+Optional hive-style partitioning:
+
+    data/exports/vessel_position/date=2026-01-01/mmsi_bucket=07/part-0.parquet
+
+"date" is the UTC day of the collection's time field and "mmsi" is bucketed as
+mmsi % EXPORT_MMSI_BUCKETS (one directory per vessel would mean tens of thousands of tiny
+files). When partitioning by date the cursor is sorted by the time field, so writers for a
+day are closed as soon as the export moves past it; segment exports write each day's
+partitions in one pass and close them before reading the next day.
+
+Run as a job, configured from the environment like the aggregators:
+
+    EXPORT_COLLECTION=vessel_position EXPORT_SINCE=2026-01-01 EXPORT_PARTITION=date,mmsi \
+        python -m src.modules.arrow_export
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from src.utils.file_utils import generate_timestamped_filename
+
+EXPORT_DIR = Path(os.getenv("EXPORT_DIR", "data/exports"))
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", 50_000))
+EXPORT_COMPRESSION = os.getenv("EXPORT_COMPRESSION", "zstd")    # parquet: zstd|snappy|gzip|none; feather: zstd|lz4
+EXPORT_MMSI_BUCKETS = int(os.getenv("EXPORT_MMSI_BUCKETS", 16))
+
+FORMATS = {"parquet": "parquet", "feather": "arrow"}
+PARTITION_KEYS = ("date", "mmsi")
+
+# time field per collection (filters, date partitions, sort order)
+TIME_FIELDS = {
+    "vessel_position": "timestamp_utc",
+    "latest_positions": "timestamp_utc",
+    "port_calls": "entry_ts",
+    "area_calls": "entry_ts",
+}
+
+# Position collections are flattened to fixed columns (GeoJSON point -> lon/lat)
+POSITION_SCHEMA = pa.schema([
+    ("mmsi", pa.int64()),
+    ("timestamp_utc", pa.timestamp("ms", tz="UTC")),
+    ("lon", pa.float64()),
+    ("lat", pa.float64()),
+    ("sog", pa.float32()),
+    ("cog", pa.float32()),
+    ("rot", pa.float32()),
+    ("heading", pa.int16()),
+    ("nav_status", pa.int16()),
+])
+POSITION_COLLECTIONS = ("vessel_position", "latest_positions")
+
+
+def _position_row(doc: Dict) -> Dict:
+    coords = (doc.get("coordinates") or {}).get("coordinates") or [None, None]
+    return {
+        "mmsi": doc.get("mmsi"),
+        "timestamp_utc": doc.get("timestamp_utc"),
+        "lon": coords[0] if len(coords) == 2 else None,
+        "lat": coords[1] if len(coords) == 2 else None,
+        "sog": doc.get("sog"),
+        "cog": doc.get("cog"),
+        "rot": doc.get("rot"),
+        "heading": doc.get("heading"),
+        "nav_status": doc.get("nav_status"),
+    }
+
+
+def _clean_row(doc: Dict) -> Dict:
+    """Generic documents: drop _id and stringify ObjectIds (as save_to_json did)."""
+    from bson import ObjectId
+    return {k: (str(v) if isinstance(v, ObjectId) else v) for k, v in doc.items() if k != "_id"}
+
+
+# -----------------------------------------------------------------------------
+# Partitioned batch writer
+# -----------------------------------------------------------------------------
+
+class BatchExporter:
+    """Buffers rows per partition and appends them to per-partition writers as record batches."""
+
+    def __init__(self, base: Path, fmt: str = "parquet", schema: Optional[pa.Schema] = None,
+                 partition_by: Sequence[str] = (), time_field: Optional[str] = None,
+                 compression: str = EXPORT_COMPRESSION, batch_rows: int = EXPORT_BATCH_ROWS):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        unknown = set(partition_by) - set(PARTITION_KEYS)
+        if unknown:
+            raise ValueError(f"Unsupported partition key(s): {sorted(unknown)}")
+        if "date" in partition_by and not time_field:
+            raise ValueError("Partitioning by date needs a time field.")
+        self.base, self.fmt, self.schema = base, fmt, schema
+        self.partition_by, self.time_field = tuple(partition_by), time_field
+        self.compression = None if compression == "none" else compression
+        self.batch_rows = batch_rows
+        self._buffers: Dict[Tuple, List[Dict]] = {}
+        self._writers: Dict[Tuple, object] = {}
+        self._schemas: Dict[Tuple, pa.Schema] = {}     # per partition, when not fixed
+        self._parts: Dict[Tuple, int] = {}
+        self.rows = 0
+        self.files: List[Path] = []
+
+    # -- partitions ---------------------------------------------------------
+    def _key(self, row: Dict) -> Tuple:
+        key = []
+        for p in self.partition_by:
+            if p == "date":
+                ts = row.get(self.time_field)
+                key.append(("date", ts.date().isoformat() if isinstance(ts, datetime) else "unknown"))
+            else:
+                mmsi = row.get("mmsi")
+                key.append(("mmsi_bucket", f"{int(mmsi) % EXPORT_MMSI_BUCKETS:02d}" if mmsi is not None else "unknown"))
+        return tuple(key)
+
+    def _path(self, key: Tuple, part: int = 0) -> Path:
+        if not key:
+            suffix = f"-{part}" if part else ""
+            return self.base.with_name(f"{self.base.stem}{suffix}.{FORMATS[self.fmt]}")
+        d = self.base.joinpath(*(f"{k}={v}" for k, v in key))
+        return d / f"part-{part}.{FORMATS[self.fmt]}"
+
+    def _writer(self, key: Tuple, schema: pa.Schema):
+        w = self._writers.get(key)
+        if w is None:
+            path = self._path(key, self._parts.get(key, 0))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if self.fmt == "parquet":
+                w = pq.ParquetWriter(path, schema, compression=self.compression or "none")
+            else:
+                w = ipc.new_file(str(path), schema, options=ipc.IpcWriteOptions(compression=self.compression))
+            self._writers[key] = w
+            self.files.append(path)
+        return w
+
+    # -- writing ------------------------------------------------------------
+    def _flush(self, key: Tuple) -> None:
+        rows = self._buffers.pop(key, None)
+        if not rows:
+            return
+        schema = self.schema
+        if schema is None:
+            current = self._schemas.get(key)
+            schema = pa.Table.from_pylist(rows).schema
+            if current is not None:
+                schema = pa.unify_schemas([current, schema], promote_options="permissive")
+                if not schema.equals(current) and key in self._writers:
+                    # the open file's schema can't change: continue in the next part
+                    self._writers.pop(key).close()
+                    self._parts[key] = self._parts.get(key, 0) + 1
+            self._schemas[key] = schema
+        batch = pa.RecordBatch.from_pylist(rows, schema=schema)
+        self._writer(key, schema).write_batch(batch)
+
+    def write_batch(self, batch: pa.RecordBatch, key: Tuple = ()) -> None:
+        """Append an already-built record batch (e.g. from numpy columns) to one partition."""
+        if self.schema is None:
+            self.schema = batch.schema
+        self._writer(key, self.schema).write_batch(batch)
+        self.rows += batch.num_rows
+
+    def add(self, row: Dict) -> None:
+        key = self._key(row)
+        buf = self._buffers.setdefault(key, [])
+        buf.append(row)
+        self.rows += 1
+        if len(buf) >= self.batch_rows:
+            self._flush(key)
+
+    def close_before(self, date_iso: str) -> None:
+        """Finish every partition of days before `date_iso` (input sorted by time)."""
+        for key in [k for k in (*self._buffers, *self._writers) if dict(k).get("date", "~") < date_iso]:
+            self._close(key)
+
+    def _close(self, key: Tuple) -> None:
+        self._flush(key)
+        w = self._writers.pop(key, None)
+        if w is not None:
+            w.close()
+
+    def close(self) -> List[Path]:
+        for key in list({*self._buffers, *self._writers}):
+            self._close(key)
+        return self.files
+
+    def partition_key(self, day: Optional[str] = None, bucket: Optional[int] = None) -> Tuple:
+        """Partition key for rows already known to share a day / mmsi bucket (see _key)."""
+        key = []
+        for p in self.partition_by:
+            if p == "date":
+                key.append(("date", day or "unknown"))
+            else:
+                key.append(("mmsi_bucket", f"{bucket:02d}" if bucket is not None else "unknown"))
+        return tuple(key)
+
+
+# -----------------------------------------------------------------------------
+# Sources
+# -----------------------------------------------------------------------------
+
+def export_cursor(docs: Iterable[Dict], exporter: BatchExporter, positions: bool = False) -> BatchExporter:
+    """Stream documents into `exporter`; closes finished days when partitioning by date."""
+    last_date = None
+    for doc in docs:
+        row = _position_row(doc) if positions else _clean_row(doc)
+        exporter.add(row)
+        if "date" in exporter.partition_by:
+            ts = row.get(exporter.time_field)
+            day = ts.date().isoformat() if isinstance(ts, datetime) else None
+            if day and day != last_date:
+                if last_date is not None:
+                    exporter.close_before(day)
+                last_date = day
+    exporter.close()
+    return exporter
+
+
+def _segment_batch(chunk: np.ndarray) -> pa.RecordBatch:
+    """Segment rows (history_segments.SEGMENT_DTYPE) as a POSITION_SCHEMA record batch."""
+    return pa.RecordBatch.from_arrays([
+        pa.array(chunk["mmsi"]),
+        pa.array(chunk["ts"]).cast(pa.timestamp("ms", tz="UTC")),
+        pa.array(chunk["lon"]),
+        pa.array(chunk["lat"]),
+        pa.array(chunk["sog"], from_pandas=True),          # NaN -> null
+        pa.array(chunk["cog"], from_pandas=True),
+        pa.nulls(len(chunk), pa.float32()),                # rot is not archived
+        pa.array(chunk["heading"], mask=chunk["heading"] < 0),
+        pa.array(chunk["nav_status"], mask=chunk["nav_status"] < 0),
+    ], schema=POSITION_SCHEMA)
+
+
+def export_segments(exporter: BatchExporter, since: Optional[datetime], until: Optional[datetime]) -> None:
+    """
+    vessel_position rows straight from the archived history segments. A segment holds one
+    day, so each day's partitions are written in full (split per mmsi bucket on the numpy
+    columns, never as Python rows) and closed before the next day is read.
+    """
+    from src.database.history_segments import archived_days, load_day
+
+    for day in archived_days():
+        if (since and day < since.date()) or (until and day >= until.date()):
+            continue
+        rows = load_day(day)
+        if "mmsi" in exporter.partition_by:
+            buckets = rows["mmsi"] % EXPORT_MMSI_BUCKETS
+            groups = [(int(b), np.flatnonzero(buckets == b)) for b in np.unique(buckets)]
+        else:
+            groups = [(None, None)]
+        for bucket, idx in groups:
+            key = exporter.partition_key(day.isoformat(), bucket)
+            n = len(rows) if idx is None else len(idx)
+            for i in range(0, n, exporter.batch_rows):
+                chunk = rows[i:i + exporter.batch_rows] if idx is None else rows[idx[i:i + exporter.batch_rows]]
+                exporter.write_batch(_segment_batch(chunk), key)
+        if "date" in exporter.partition_by:
+            exporter.close_before((day + timedelta(days=1)).isoformat())
+    exporter.close()
+
+
+def export_collection(db, collection: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      fmt: str = "parquet", partition_by: Sequence[str] = (), output_dir: Path = EXPORT_DIR,
+                      source: str = "mongo") -> List[Path]:
+    """
+    Export `collection` (optionally a [since, until) window on its time field) to Parquet or
+    Feather under output_dir. source="segments" reads vessel_position from the history archive.
+    """
+    time_field = TIME_FIELDS.get(collection)
+    positions = collection in POSITION_COLLECTIONS
+    base = output_dir / (collection if partition_by else generate_timestamped_filename(collection, FORMATS[fmt]))
+    exporter = BatchExporter(base, fmt, POSITION_SCHEMA if positions else None, partition_by, time_field)
+
+    if source == "segments":
+        if collection != "vessel_position":
+            raise ValueError("Only vessel_position is archived in history segments.")
+        export_segments(exporter, since, until)
+        files = exporter.files
+    else:
+        query = {}
+        if time_field and (since or until):
+            query[time_field] = {k: v for k, v in (("$gte", since), ("$lt", until)) if v}
+        cursor = db[collection].find(query, batch_size=exporter.batch_rows)
+        if "date" in partition_by:
+            cursor = cursor.sort(time_field, 1)
+        files = export_cursor(cursor, exporter, positions=positions).files
+
+    print(f"[export] {collection}: {exporter.rows} row(s) -> {len(files)} {fmt} file(s) under {output_dir}")
+    return files
+
+
+def save_records(records: Iterable[Dict], base_name: str, output_dir: Path = EXPORT_DIR,
+                 fmt: str = "parquet") -> Path:
+    """
+    Save a batch of documents (e.g. vessel_position or vessel_details rows, or raw AIS
+    messages) to one timestamped Parquet/Feather file, written in record batches.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    base = output_dir / generate_timestamped_filename(base_name, FORMATS[fmt])
+    positions = base_name in POSITION_COLLECTIONS
+    exporter = BatchExporter(base, fmt, POSITION_SCHEMA if positions else None)
+    export_cursor(records, exporter, positions=positions)
+    path = exporter.files[0] if exporter.files else base.with_suffix(f".{FORMATS[fmt]}")
+    print(f"Saved {fmt} with {exporter.rows} entries to {path}")
+    return path
+
+
+def _env_datetime(name: str) -> Optional[datetime]:
+    value = os.getenv(name)
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def main():
+    from src.database.mongo_connection import get_mongo_connection
+    since = _env_datetime("EXPORT_SINCE")
+    until = _env_datetime("EXPORT_UNTIL")
+    if since is None and os.getenv("EXPORT_DAYS"):
+        since = datetime.now(timezone.utc) - timedelta(days=int(os.getenv("EXPORT_DAYS")))
+    partition = [p.strip() for p in os.getenv("EXPORT_PARTITION", "").split(",") if p.strip()]
+    export_collection(
+        get_mongo_connection(),
+        os.getenv("EXPORT_COLLECTION", "vessel_position"),
+        since=since,
+        until=until,
+        fmt=os.getenv("EXPORT_FORMAT", "parquet"),
+        partition_by=partition,
+        source=os.getenv("EXPORT_SOURCE", "mongo"),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -273,3 +273,4 @@ LIVERPOOL_BBOX = {
 
 
 
+
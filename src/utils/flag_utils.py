@@ -1,21 +1,119 @@
-from src.database.mongo_connection import get_mongo_connection
+# src/utils/flag_utils.py
+"""
+MMSI -> ISO flag resolution from an in-process copy of the `mmsi_flags` MID table.
+
+The table (~300 rows) is held as a numpy array indexed by MID - MID_MIN, so a lookup is one
+array index and `resolve_flags` handles thousands of MMSIs in a single vectorised call
+instead of one find_one per vessel. It is reloaded at most every FLAG_MAP_REFRESH_SECONDS
+and only swapped in when the rows actually changed (or immediately after invalidate()).
+"""
+import os
+from threading import Lock
+from time import monotonic
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+FLAG_MAP_REFRESH_SECONDS = int(os.getenv("FLAG_MAP_REFRESH_SECONDS", 300))
+
+MID_MIN, MID_MAX = 200, 799          # MIDs of ship stations (first 3 digits of a 9-digit MMSI)
+MMSI_MIN, MMSI_MAX = 100_000_000, 999_999_999
+
+
+def _as_int(mmsi) -> int:
+    try:
+        return int(mmsi)
+    except (TypeError, ValueError):
+        return -1
+
+
+class FlagTable:
+    """MID -> ISO lookup array with lazy, change-aware reloads (sync and async)."""
+
+    def __init__(self):
+        self._iso = np.full(MID_MAX - MID_MIN + 1, None, dtype=object)
+        self._rows: Dict[int, str] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = Lock()
+
+    # -- loading ------------------------------------------------------------
+    def _stale(self) -> bool:
+        return self._loaded_at is None or monotonic() - self._loaded_at > FLAG_MAP_REFRESH_SECONDS
+
+    def _install(self, docs: Iterable[Dict]) -> None:
+        rows = {}
+        for d in docs:
+            mid, iso = d.get("MID"), d.get("ISO")
+            if mid is not None and iso and MID_MIN <= int(mid) <= MID_MAX:
+                rows[int(mid)] = str(iso).lower()
+        with self._lock:
+            if rows != self._rows:
+                iso_arr = np.full(MID_MAX - MID_MIN + 1, None, dtype=object)
+                for mid, iso in rows.items():
+                    iso_arr[mid - MID_MIN] = iso
+                self._iso, self._rows = iso_arr, rows  # swap; readers never see a half-built table
+            self._loaded_at = monotonic()
+
+    def ensure(self, db=None) -> "FlagTable":
+        """Reload from `db` (default: the sync connection) when the copy is stale."""
+        if self._stale():
+            if db is None:
+                from src.database.mongo_connection import get_mongo_connection
+                db = get_mongo_connection()
+            self._install(db["mmsi_flags"].find({}, {"_id": 0, "MID": 1, "ISO": 1}))
+        return self
+
+    async def aensure(self, async_db) -> "FlagTable":
+        """Async variant of ensure() for the API (Motor)."""
+        if self._stale():
+            docs = await async_db["mmsi_flags"].find({}, {"_id": 0, "MID": 1, "ISO": 1}).to_list(length=None)
+            self._install(docs)
+        return self
+
+    def invalidate(self) -> None:
+        """Force a reload on next use (e.g. after insert_flag_mapping)."""
+        self._loaded_at = None
+
+    # -- lookups ------------------------------------------------------------
+    def iso_for(self, mmsi) -> Optional[str]:
+        mmsi = _as_int(mmsi)
+        if not MMSI_MIN <= mmsi <= MMSI_MAX:
+            return None
+        mid = mmsi // 1_000_000
+        return self._iso[mid - MID_MIN] if MID_MIN <= mid <= MID_MAX else None
+
+    def resolve(self, mmsis: Iterable) -> List[Optional[str]]:
+        """Vectorised iso_for over many MMSIs (None where unknown / not a ship MMSI)."""
+        arr = np.asarray([_as_int(m) for m in mmsis], dtype=np.int64)
+        if arr.size == 0:
+            return []
+        mids = arr // 1_000_000
+        valid = (arr >= MMSI_MIN) & (arr <= MMSI_MAX) & (mids >= MID_MIN) & (mids <= MID_MAX)
+        out = np.full(arr.shape, None, dtype=object)
+        out[valid] = self._iso[mids[valid] - MID_MIN]
+        return out.tolist()
+
+
+flag_table = FlagTable()
+
 
 def get_flag_iso_from_mmsi(mmsi):
     """
-    Extract MID from MMSI and retrieve ISO flag code from MongoDB.
-    
+    Extract MID from MMSI and resolve its ISO flag code (in-process MID table).
+
     Args:
         mmsi (int or str): Maritime Mobile Service Identity
-    
+
     Returns:
         str: ISO code like 'gb' or None if not found
     """
     try:
-        mid = int(str(mmsi)[:3])  # Get first 3 digits as MID
-        db = get_mongo_connection()
-        flags = db["mmsi_flags"]
-        result = flags.find_one({"MID": mid})
-        return result["ISO"] if result else None
+        return flag_table.ensure().iso_for(mmsi)
     except Exception as e:
         print(f"Error resolving flag for MMSI {mmsi}: {e}")
         return None
+
+
+def resolve_flags(mmsis: Iterable, db=None) -> List[Optional[str]]:
+    """Batch version of get_flag_iso_from_mmsi (one vectorised lookup, no per-MMSI queries)."""
+    return flag_table.ensure(db).resolve(mmsis)
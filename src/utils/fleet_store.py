@@ -0,0 +1,262 @@
+# src/utils/fleet_store.py
+"""
+Compact columnar copy of the current fleet state, shared through a memory-mapped file.
+
+The AIS collector (the only writer) keeps one fixed-width row per vessel
+
+    mmsi, ts (epoch ms), lon, lat, sog, cog, rot, heading, nav_status
+
+in a numpy structured array backed by FLEET_STORE_PATH, with an MMSI -> row dict as its
+hash index. Other processes (API, visit processor) map the same file read-only and take a
+consistent copy of the live rows guarded by a sequence counter in the file header (the
+writer makes it odd while a row is being changed; readers retry if it moved). A full copy
+of ~10k vessels is a single memcpy, and filters such as "seen in the last N minutes" are
+vectorised over the `ts` column instead of a latest_positions query.
+
+latest_positions stays the durable source: the writer is warmed from it at startup and
+readers return None (callers then fall back to Mongo) when the file is missing, from an
+older layout, or has not been touched for FLEET_STORE_STALE_SECONDS (collector down).
+Set FLEET_STORE=false to disable it entirely.
+"""
+import os
+from datetime import datetime, timezone
+from threading import Lock
+from time import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+FLEET_STORE = os.getenv("FLEET_STORE", "true").lower() == "true"
+FLEET_STORE_PATH = os.getenv("FLEET_STORE_PATH", ".cache/fleet_state.bin")
+FLEET_STORE_CAPACITY = int(os.getenv("FLEET_STORE_CAPACITY", 65536))
+FLEET_STORE_MAX_AGE_HOURS = float(os.getenv("FLEET_STORE_MAX_AGE_HOURS", 120))   # /api/vessels/ window
+FLEET_STORE_STALE_SECONDS = float(os.getenv("FLEET_STORE_STALE_SECONDS", 120))
+FLEET_STORE_COMPACT_SECONDS = float(os.getenv("FLEET_STORE_COMPACT_SECONDS", 60))
+
+MAGIC = 0x464C454554535431          # "FLEETST1"
+VERSION = 1
+
+# header slots (uint64): magic, version, capacity, count, seq, updated_ms
+H_MAGIC, H_VERSION, H_CAPACITY, H_COUNT, H_SEQ, H_UPDATED = range(6)
+HEADER_SLOTS = 8
+HEADER_BYTES = HEADER_SLOTS * 8
+
+FLEET_DTYPE = np.dtype([
+    ("mmsi", "<i8"),
+    ("ts", "<i8"),            # epoch milliseconds (UTC)
+    ("lon", "<f8"),
+    ("lat", "<f8"),
+    ("sog", "<f4"),           # NaN = missing
+    ("cog", "<f4"),
+    ("rot", "<f4"),
+    ("heading", "<i2"),       # -1 = missing
+    ("nav_status", "<i2"),
+])
+
+READ_RETRIES = 5
+
+
+def _to_ms(ts) -> int:
+    if isinstance(ts, datetime):
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)   # Mongo hands back naive UTC
+        return int(ts.timestamp() * 1000)
+    return int(time() * 1000)
+
+
+def _num(value, missing):
+    return missing if value is None else value
+
+
+def _opt_float(x: float, ndigits: int = 1) -> Optional[float]:
+    return None if np.isnan(x) else round(float(x), ndigits)
+
+
+def _opt_int(x: int) -> Optional[int]:
+    return None if x < 0 else int(x)
+
+
+# -----------------------------------------------------------------------------
+# Writer (AIS collector)
+# -----------------------------------------------------------------------------
+
+class FleetStoreWriter:
+    def __init__(self, path: str = FLEET_STORE_PATH, capacity: int = FLEET_STORE_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self._index: Dict[int, int] = {}
+        self._header = None
+        self._rows = None
+        self._lock = Lock()
+
+    def open(self) -> None:
+        """Create a fresh store file and atomically replace any previous one."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        size = HEADER_BYTES + self.capacity * FLEET_DTYPE.itemsize
+        with open(tmp, "wb") as f:
+            f.truncate(size)
+        header = np.memmap(tmp, dtype="<u8", mode="r+", shape=(HEADER_SLOTS,))
+        rows = np.memmap(tmp, dtype=FLEET_DTYPE, mode="r+", offset=HEADER_BYTES, shape=(self.capacity,))
+        header[H_MAGIC], header[H_VERSION], header[H_CAPACITY] = MAGIC, VERSION, self.capacity
+        header[H_UPDATED] = _to_ms(None)
+        os.replace(tmp, self.path)      # readers holding the old file notice the new inode
+        self._header, self._rows, self._index = header, rows, {}
+
+    # -- seqlock ------------------------------------------------------------
+    def _begin(self) -> None:
+        self._header[H_SEQ] += 1         # odd: write in progress
+
+    def _end(self) -> None:
+        self._header[H_UPDATED] = _to_ms(None)
+        self._header[H_SEQ] += 1
+
+    # -- updates ------------------------------------------------------------
+    def _write_row(self, i: int, doc: Dict, lon: float, lat: float) -> None:
+        self._rows[i] = (
+            int(doc["mmsi"]),
+            _to_ms(doc.get("timestamp_utc")),
+            lon,
+            lat,
+            _num(doc.get("sog"), np.nan),
+            _num(doc.get("cog"), np.nan),
+            _num(doc.get("rot"), np.nan),
+            _num(doc.get("heading"), -1),
+            _num(doc.get("nav_status"), -1),
+        )
+
+    def upsert(self, doc: Dict) -> bool:
+        """Apply one position document (latest_positions shape); returns False if not stored."""
+        if self._rows is None or doc.get("mmsi") is None:
+            return False
+        coords = (doc.get("coordinates") or {}).get("coordinates") or [None, None]
+        if len(coords) != 2 or coords[0] is None or coords[1] is None:
+            return False
+        with self._lock:
+            mmsi = int(doc["mmsi"])
+            i = self._index.get(mmsi)
+            if i is None:
+                i = int(self._header[H_COUNT])
+                if i >= self.capacity:
+                    print(f"[fleet_store] full ({self.capacity} rows); dropping MMSI {mmsi} until compaction.")
+                    return False
+            self._begin()
+            try:
+                self._write_row(i, doc, float(coords[0]), float(coords[1]))
+                if mmsi not in self._index:
+                    self._index[mmsi] = i
+                    self._header[H_COUNT] = i + 1
+            except (TypeError, ValueError) as e:
+                print(f"[fleet_store] skipped malformed position for MMSI {mmsi}: {e}")
+                return False
+            finally:
+                self._end()
+        return True
+
+    def warm(self, db) -> int:
+        """(Re)create the store and load every latest_positions row inside the max age."""
+        self.open()
+        since = datetime.now(timezone.utc).timestamp() - FLEET_STORE_MAX_AGE_HOURS * 3600
+        projection = {"_id": 0, "mmsi": 1, "timestamp_utc": 1, "coordinates": 1,
+                      "sog": 1, "cog": 1, "rot": 1, "heading": 1, "nav_status": 1}
+        loaded = 0
+        cursor = db["latest_positions"].find(
+            {"timestamp_utc": {"$gte": datetime.fromtimestamp(since, timezone.utc)}}, projection
+        )
+        for doc in cursor:
+            loaded += self.upsert(doc)
+        print(f"[fleet_store] warmed {loaded} vessel(s) into {self.path}.")
+        return loaded
+
+    def compact(self, max_age_hours: float = FLEET_STORE_MAX_AGE_HOURS) -> int:
+        """Drop rows older than max_age_hours and pack the rest; returns rows removed."""
+        if self._rows is None:
+            return 0
+        cutoff = _to_ms(None) - int(max_age_hours * 3600 * 1000)
+        with self._lock:
+            count = int(self._header[H_COUNT])
+            live = np.asarray(self._rows[:count])
+            keep = live[live["ts"] >= cutoff]
+            removed = count - len(keep)
+            self._begin()
+            try:
+                if removed:
+                    self._rows[:len(keep)] = keep
+                    self._header[H_COUNT] = len(keep)
+                    self._index = {int(m): i for i, m in enumerate(keep["mmsi"])}
+            finally:
+                self._end()                  # also the heartbeat readers use for staleness
+        if removed:
+            print(f"[fleet_store] compacted: removed {removed} stale row(s), {len(keep)} left.")
+        return removed
+
+
+# -----------------------------------------------------------------------------
+# Reader (API / visit processor)
+# -----------------------------------------------------------------------------
+
+class FleetStoreReader:
+    def __init__(self, path: str = FLEET_STORE_PATH):
+        self.path = path
+        self._inode = None
+        self._header = None
+        self._rows = None
+
+    def _open(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._inode = self._header = self._rows = None
+            return False
+        if st.st_ino == self._inode and self._rows is not None:
+            return True
+        header = np.memmap(self.path, dtype="<u8", mode="r", shape=(HEADER_SLOTS,))
+        if int(header[H_MAGIC]) != MAGIC or int(header[H_VERSION]) != VERSION:
+            return False
+        capacity = int(header[H_CAPACITY])
+        self._rows = np.memmap(self.path, dtype=FLEET_DTYPE, mode="r", offset=HEADER_BYTES, shape=(capacity,))
+        self._header, self._inode = header, st.st_ino
+        return True
+
+    def snapshot(self) -> Optional[np.ndarray]:
+        """Consistent copy of the live rows, or None when the store is unavailable or stale."""
+        if not FLEET_STORE or not self._open():
+            return None
+        if _to_ms(None) - int(self._header[H_UPDATED]) > FLEET_STORE_STALE_SECONDS * 1000:
+            return None
+        for _ in range(READ_RETRIES):
+            seq = int(self._header[H_SEQ])
+            if seq % 2:
+                continue
+            rows = np.array(self._rows[:int(self._header[H_COUNT])])
+            if int(self._header[H_SEQ]) == seq:
+                return rows
+        return None
+
+    def recent_docs(self, since: datetime, limit: Optional[int] = None) -> Optional[List[Dict]]:
+        """
+        Vessels with a fix at or after `since`, shaped like latest_positions documents
+        (naive UTC timestamp_utc, GeoJSON coordinates). None means "ask Mongo instead".
+        """
+        rows = self.snapshot()
+        if rows is None:
+            return None
+        rows = rows[rows["ts"] >= _to_ms(since)]
+        if limit is not None:
+            rows = rows[:limit]
+        return [
+            {
+                "mmsi": int(r["mmsi"]),
+                "timestamp_utc": datetime.fromtimestamp(int(r["ts"]) / 1000, timezone.utc).replace(tzinfo=None),
+                "coordinates": {"type": "Point", "coordinates": [float(r["lon"]), float(r["lat"])]},
+                "sog": _opt_float(r["sog"]),
+                "cog": _opt_float(r["cog"]),
+                "rot": _opt_float(r["rot"]),
+                "heading": _opt_int(r["heading"]),
+                "nav_status": _opt_int(r["nav_status"]),
+            }
+            for r in rows
+        ]
+
+
+fleet_store = FleetStoreReader()
@@ -0,0 +1,95 @@
+# src/utils/llm_client.py
+"""
+Single entry point for chat completions.
+
+LLM_BACKEND=openai (default) talks to the OpenAI API; LLM_BACKEND=stub returns a
+deterministic canned reply built from the prompt, so the insight endpoints can be
+exercised locally / in tests without an API key or network access.
+
+achat_complete() is the one to use from async code (API handlers, the job worker):
+  - every call is bounded by LLM_TIMEOUT_SECONDS
+  - at most LLM_MAX_CONCURRENCY completions are in flight per process
+  - identical concurrent requests (same model/messages/options) share one completion
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").lower()
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 45))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+
+_client = None
+_async_client = None
+_semaphore = None                              # created lazily inside the running loop
+_inflight: Dict[str, "asyncio.Task"] = {}      # request key -> shared completion
+
+
+def _openai_client():
+    """Create the OpenAI client on first use (importing this module never needs a key)."""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
+
+def _async_openai_client():
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+        _async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _async_client
+
+
+def _stub_reply(model: str, messages: List[Dict[str, str]]) -> str:
+    prompt = "\n".join(m.get("content", "") for m in messages)
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+    first_line = next((ln.strip() for ln in prompt.splitlines() if ln.strip()), "")
+    return f"[stub {model} {digest}] {first_line[:160]}"
+
+
+def chat_complete(model: str, messages: List[Dict[str, str]], **kwargs) -> str:
+    """Blocking chat completion; returns the stripped assistant text. Raises on API errors."""
+    if LLM_BACKEND == "stub":
+        return _stub_reply(model, messages)
+    response = _openai_client().chat.completions.create(model=model, messages=messages, **kwargs)
+    return (response.choices[0].message.content or "").strip()
+
+
+async def _complete_limited(model: str, messages: List[Dict[str, str]], timeout: float, **kwargs) -> str:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    async with _semaphore:
+        if LLM_BACKEND == "stub":
+            return _stub_reply(model, messages)
+        response = await asyncio.wait_for(
+            _async_openai_client().chat.completions.create(model=model, messages=messages, **kwargs),
+            timeout=timeout,
+        )
+        return (response.choices[0].message.content or "").strip()
+
+
+async def achat_complete(model: str, messages: List[Dict[str, str]],
+                         timeout: float = LLM_TIMEOUT_SECONDS, **kwargs) -> str:
+    """
+    Non-blocking chat completion. Raises asyncio.TimeoutError after `timeout` seconds
+    (time spent waiting for a concurrency slot is not counted) and on API errors.
+    """
+    key = hashlib.sha256(
+        json.dumps({"model": model, "messages": messages, "kwargs": kwargs}, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_complete_limited(model, messages, timeout, **kwargs))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t: _inflight.pop(key, None))
+    # shield: one caller disconnecting must not cancel the completion for the others
+    return await asyncio.shield(task)
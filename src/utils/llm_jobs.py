@@ -0,0 +1,131 @@
+# src/utils/llm_jobs.py
+"""
+Background LLM summary jobs (API process).
+
+- register_summary_job(kind): decorator that registers `async handler(kind, params) -> str`
+  (the traffic-insights endpoints register theirs).
+- submit_summary_job(): queue a job (deduplicated on kind + params), see llm_job_queue.
+- run_summary_worker(): long-running task started with the API; claims queued jobs
+  (or jobs whose worker died), runs the handler and stores the result on the job.
+
+Clients poll GET /api/llm-jobs/{id} or follow GET /api/llm-jobs/{id}/events (SSE).
+"""
+import asyncio
+import os
+import socket
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from src.database.llm_job_queue import ACTIVE_STATUSES, COLL_LLM_JOBS, job_id_for, queued_job_update
+from src.database.mongo_connection import async_db
+from src.database.time_utils import now_utc
+
+LLM_JOB_POLL_SECONDS = float(os.getenv("LLM_JOB_POLL_SECONDS", 2))
+LLM_JOB_CONCURRENCY = int(os.getenv("LLM_JOB_CONCURRENCY", 2))
+LLM_JOB_TIMEOUT_SECONDS = float(os.getenv("LLM_JOB_TIMEOUT_SECONDS", 180))
+LLM_JOB_MAX_ATTEMPTS = int(os.getenv("LLM_JOB_MAX_ATTEMPTS", 3))
+# a running job not updated for this long is assumed orphaned (worker restarted) and re-claimed
+LLM_JOB_STALE_SECONDS = float(os.getenv("LLM_JOB_STALE_SECONDS", 600))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+Handler = Callable[[str, Dict[str, Any]], Awaitable[str]]
+SUMMARY_JOB_HANDLERS: Dict[str, Handler] = {}
+
+
+def register_summary_job(kind: str):
+    def decorator(func: Handler) -> Handler:
+        SUMMARY_JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def public_job(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "job_id": doc["_id"],
+        "kind": doc.get("kind"),
+        "params": doc.get("params") or {},
+        "status": doc.get("status"),
+        "result": doc.get("result"),
+        "error": doc.get("error"),
+        "attempts": doc.get("attempts", 0),
+        "updated_at": doc.get("updated_at"),
+    }
+
+
+async def submit_summary_job(kind: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Queue (or join) a job and return its current state."""
+    job_id = job_id_for(kind, params)
+    coll = async_db[COLL_LLM_JOBS]
+    try:
+        await coll.update_one(
+            {"_id": job_id, "status": {"$nin": ACTIVE_STATUSES}},
+            queued_job_update(kind, params),
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass  # already queued or running: the caller joins it
+    return public_job(await coll.find_one({"_id": job_id}))
+
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    doc = await async_db[COLL_LLM_JOBS].find_one({"_id": job_id})
+    return public_job(doc) if doc else None
+
+
+async def _claim_next() -> Optional[Dict[str, Any]]:
+    now = now_utc()
+    return await async_db[COLL_LLM_JOBS].find_one_and_update(
+        {"$or": [
+            {"status": "queued"},
+            {"status": "running", "updated_at": {"$lt": now - timedelta(seconds=LLM_JOB_STALE_SECONDS)}},
+        ]},
+        {"$set": {"status": "running", "worker": WORKER_ID, "updated_at": now}, "$inc": {"attempts": 1}},
+        sort=[("queued_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _run_job(job: Dict[str, Any]) -> None:
+    coll = async_db[COLL_LLM_JOBS]
+    mine = {"_id": job["_id"], "status": "running", "worker": WORKER_ID}
+    handler = SUMMARY_JOB_HANDLERS.get(job.get("kind"))
+    if handler is None:
+        await coll.update_one(mine, {"$set": {"status": "error", "error": f"Unknown job kind {job.get('kind')!r}",
+                                              "updated_at": now_utc()}})
+        return
+    try:
+        result = await asyncio.wait_for(handler(job["kind"], job.get("params") or {}), LLM_JOB_TIMEOUT_SECONDS)
+        await coll.update_one(mine, {"$set": {"status": "done", "result": result, "error": None,
+                                              "finished_at": now_utc(), "updated_at": now_utc()}})
+    except Exception as e:
+        retry = job.get("attempts", 1) < LLM_JOB_MAX_ATTEMPTS
+        await coll.update_one(mine, {"$set": {"status": "queued" if retry else "error",
+                                              "error": f"{type(e).__name__}: {e}", "updated_at": now_utc()}})
+        print(f"[llm_jobs] {job.get('kind')} {job.get('params')} failed (attempt {job.get('attempts')}): {e}")
+
+
+async def run_summary_worker() -> None:
+    """Claim and run jobs forever, at most LLM_JOB_CONCURRENCY at a time."""
+    slots = asyncio.Semaphore(LLM_JOB_CONCURRENCY)
+    running = set()
+    print(f"[llm_jobs] worker {WORKER_ID} started.")
+    while True:
+        await slots.acquire()
+        try:
+            job = await _claim_next()
+        except Exception as e:
+            print(f"[llm_jobs] claim failed: {e}")
+            job = None
+        if job is None:
+            slots.release()
+            await asyncio.sleep(LLM_JOB_POLL_SECONDS)
+            continue
+
+        task = asyncio.ensure_future(_run_job(job))
+        running.add(task)
+        task.add_done_callback(running.discard)
+        task.add_done_callback(lambda _t: slots.release())
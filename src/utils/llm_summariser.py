@@ -1,8 +1,11 @@
 from datetime import datetime, timedelta
 from typing import Dict
-from openai import OpenAI
 
-client = OpenAI()  
+from src.utils.llm_client import achat_complete, chat_complete
+
+SUMMARY_MODEL = "gpt-4o"
+
+
 def format_liverpool_prompt(insight_data: Dict) -> str:
     days = insight_data["days"]
     end_date = datetime.now().date()
@@ -46,18 +49,23 @@ Avoid external news or assumptions. Use structured, factual language with a conc
 
 def generate_uk_traffic_summary_llm(insight_data: Dict) -> str:
     prompt = format_uk_prompt(insight_data)
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3
-    )
-    return response.choices[0].message.content.strip()
+    return generate_summary_from_prompt(prompt)
 
 def generate_liverpool_traffic_summary_llm(insight_data: Dict) -> str:
     prompt = format_liverpool_prompt(insight_data)
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
+    return generate_summary_from_prompt(prompt)
+
+def generate_summary_from_prompt(prompt: str) -> str:
+    return chat_complete(
+        SUMMARY_MODEL,
+        [{"role": "user", "content": prompt}],
+        temperature=0.3
+    )
+
+async def agenerate_summary_from_prompt(prompt: str) -> str:
+    """Async variant used by the API and the summary job worker."""
+    return await achat_complete(
+        SUMMARY_MODEL,
+        [{"role": "user", "content": prompt}],
         temperature=0.3
     )
-    return response.choices[0].message.content.strip()
\ No newline at end of file
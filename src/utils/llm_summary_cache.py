@@ -0,0 +1,112 @@
+# src/utils/llm_summary_cache.py
+"""
+Memoised LLM summaries with stale-while-revalidate.
+
+Each summary is stored in `llm_summaries` under a fingerprint:
+    sha256(scope, model, rendered prompt, structured insight data)
+so the model is only called when the figures, the prompt template or the model change.
+`generate` is an async zero-argument callable (normally a partial over
+src.utils.llm_client.achat_complete), so waiting on the model never blocks the event loop.
+
+Lookup order for a request:
+  1. exact fingerprint in Mongo               -> return it
+  2. latest summary for the same scope         -> return it now, regenerate in the background
+  3. nothing stored yet for this scope         -> generate inline (first request only)
+
+`scope` identifies "the same panel", e.g. "traffic-insights:uk:7", so a stale summary is only
+ever shown in place of the one it will be replaced by. Storing a summary bumps the
+`llm_summaries` cache generation, so cached responses that embedded the stale text (routes
+with depends_on=(..., settings.COLL_LLM_SUMMARIES)) are rebuilt.
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from src.database import settings
+from src.database.cache_generations import abump_generation
+from src.database.mongo_connection import async_db
+from src.database.time_utils import now_utc
+
+_refreshing: Dict[str, "asyncio.Task"] = {}   # fingerprint -> background refresh
+_cold: Dict[str, "asyncio.Task"] = {}         # fingerprint -> inline first generation
+_background: Set["asyncio.Task"] = set()      # keep references so tasks are not GC'd
+
+
+def summary_fingerprint(scope: str, model: str, prompt: str, data: Optional[Dict[str, Any]] = None) -> str:
+    payload = json.dumps({"scope": scope, "model": model, "prompt": prompt, "data": data},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+Generate = Callable[[], Awaitable[str]]
+
+
+async def _generate_and_store(fingerprint: str, scope: str, model: str, generate: Generate) -> str:
+    text = await generate()
+    await async_db[settings.COLL_LLM_SUMMARIES].replace_one(
+        {"_id": fingerprint},
+        {"_id": fingerprint, "scope": scope, "model": model, "text": text, "created_at": now_utc()},
+        upsert=True,
+    )
+    await abump_generation(async_db, settings.COLL_LLM_SUMMARIES)
+    return text
+
+
+def _refresh_in_background(fingerprint: str, scope: str, model: str, generate: Generate) -> None:
+    if fingerprint in _refreshing:
+        return
+
+    async def refresh():
+        try:
+            await _generate_and_store(fingerprint, scope, model, generate)
+            print(f"[llm_summary_cache] refreshed {scope}")
+        except Exception as e:
+            print(f"[llm_summary_cache] background refresh failed for {scope}: {e}")
+        finally:
+            _refreshing.pop(fingerprint, None)
+
+    task = asyncio.ensure_future(refresh())
+    _refreshing[fingerprint] = task
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def cached_summary(scope: str, model: str, prompt: str, data: Optional[Dict[str, Any]],
+                         generate: Generate) -> str:
+    """
+    Return the summary for (scope, model, prompt, data). `generate` may raise; errors
+    propagate only when there is no stored summary to fall back on.
+    """
+    coll = async_db[settings.COLL_LLM_SUMMARIES]
+    fingerprint = summary_fingerprint(scope, model, prompt, data)
+
+    hit = await coll.find_one({"_id": fingerprint}, {"text": 1})
+    if hit:
+        return hit["text"]
+
+    stale = await coll.find_one({"scope": scope}, {"text": 1}, sort=[("created_at", -1)])
+    if stale:
+        _refresh_in_background(fingerprint, scope, model, generate)
+        return stale["text"]
+
+    # Cold start: share one inline generation between concurrent first requests
+    task = _cold.get(fingerprint)
+    if task is None:
+        task = asyncio.ensure_future(_generate_and_store(fingerprint, scope, model, generate))
+        _cold[fingerprint] = task
+        task.add_done_callback(lambda _t: _cold.pop(fingerprint, None))
+    return await asyncio.shield(task)
+
+
+async def refresh_summary(scope: str, model: str, prompt: str, data: Optional[Dict[str, Any]],
+                          generate: Generate) -> str:
+    """
+    Make sure the summary for exactly these inputs is stored (used by the job worker to
+    pre-generate after aggregation). Never serves a stale summary; raises on failure.
+    """
+    fingerprint = summary_fingerprint(scope, model, prompt, data)
+    hit = await async_db[settings.COLL_LLM_SUMMARIES].find_one({"_id": fingerprint}, {"text": 1})
+    if hit:
+        return hit["text"]
+    return await _generate_and_store(fingerprint, scope, model, generate)
@@ -0,0 +1,162 @@
+# src/utils/recent_calls.py
+"""
+In-memory index of each vessel's most recent completed port calls, for the vessel popup.
+
+- One bounded buffer per MMSI (newest RECENT_CALLS_PER_VESSEL calls, ordered by exit time).
+- Warmed at API startup with a single query over the last RECENT_CALLS_WARM_DAYS of
+  `port_calls`, then kept current from visit finalisation: a change stream on `port_calls`
+  (each finalised visit is a replace/insert there), falling back to polling recent `exit_ts`
+  values when the deployment has no change streams (standalone mongod).
+- A buffer is authoritative once it is full or has been loaded from Mongo in full; only
+  vessels whose older history is unknown fall back to a (batched) query, once.
+
+So a popup is a dict lookup and a few list operations instead of an aggregation per hover.
+Set RECENT_CALLS_INDEX=false to serve popups straight from Mongo.
+"""
+import asyncio
+import os
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+RECENT_CALLS_INDEX = os.getenv("RECENT_CALLS_INDEX", "true").lower() == "true"
+RECENT_CALLS_PER_VESSEL = int(os.getenv("RECENT_CALLS_PER_VESSEL", 18))   # popup limit (6) * 3 for dedupe
+RECENT_CALLS_WARM_DAYS = int(os.getenv("RECENT_CALLS_WARM_DAYS", 30))
+RECENT_CALLS_POLL_SECONDS = float(os.getenv("RECENT_CALLS_POLL_SECONDS", 5))
+RECENT_CALLS_RETRY_SECONDS = float(os.getenv("RECENT_CALLS_RETRY_SECONDS", 30))
+# exit_ts is the last in-port fix, which can be well before the visit is finalised
+RECENT_CALLS_POLL_LOOKBACK = timedelta(hours=float(os.getenv("RECENT_CALLS_POLL_LOOKBACK_HOURS", 6)))
+
+_PROJECTION = {"_id": 1, "mmsi": 1, "port_name": 1, "entry_ts": 1, "exit_ts": 1}
+
+# (exit_ts, entry_ts, call_id, port_name)
+Entry = Tuple[datetime, datetime, str, str]
+
+
+def _naive(ts) -> datetime:
+    if ts is None:
+        return datetime.min
+    return ts.replace(tzinfo=None) if ts.tzinfo else ts
+
+
+class RecentCallsIndex:
+    def __init__(self, per_vessel: int = RECENT_CALLS_PER_VESSEL):
+        self.per_vessel = per_vessel
+        self._calls: Dict[int, Deque[Entry]] = {}
+        self._complete: set = set()          # MMSIs whose buffer needs no Mongo fallback
+        self.ready = False
+
+    # -- feeding ------------------------------------------------------------
+    def add(self, call: Dict) -> None:
+        """Insert one port_calls document (idempotent per call _id)."""
+        mmsi, name = call.get("mmsi"), call.get("port_name")
+        if mmsi is None or not name:
+            return
+        entry = (_naive(call.get("exit_ts")), _naive(call.get("entry_ts")), str(call.get("_id")), name)
+        buf = self._calls.get(mmsi)
+        if buf is None:
+            buf = self._calls[mmsi] = deque(maxlen=self.per_vessel)
+        if any(e[2] == entry[2] for e in buf):
+            return
+        if not buf or entry[:2] >= buf[-1][:2]:
+            buf.append(entry)                 # the usual case: calls finalise in order
+        else:
+            ordered = sorted([*buf, entry])
+            buf.clear()
+            buf.extend(ordered[-self.per_vessel:])
+        if len(buf) == self.per_vessel:
+            self._complete.add(mmsi)
+
+    def _load_full(self, mmsi: int, calls: List[Dict]) -> None:
+        """
+        Fill a vessel's buffer with its newest calls straight from Mongo (authoritative).
+        Vessels without calls are not remembered, so arbitrary MMSIs can't grow the index;
+        their first call arrives through the feed like any other.
+        """
+        if not calls:
+            return
+        for c in sorted(calls, key=lambda c: (_naive(c.get("exit_ts")), _naive(c.get("entry_ts")))):
+            self.add(c)
+        self._complete.add(mmsi)
+
+    # -- reading ------------------------------------------------------------
+    def names_desc(self, mmsi: int) -> Optional[List[str]]:
+        """Port names newest first, or None when the index cannot answer for this vessel."""
+        if not self.ready or mmsi not in self._complete:
+            return None
+        return [e[3] for e in reversed(self._calls.get(mmsi, ()))]
+
+    async def names_desc_many(self, async_db, mmsis: Iterable[int]) -> Dict[int, List[str]]:
+        """names_desc for many vessels; unknown ones are loaded with ONE $in query."""
+        mmsis = list(dict.fromkeys(mmsis))
+        missing = [m for m in mmsis if self.names_desc(m) is None]
+        if missing:
+            pipeline = [
+                {"$match": {"mmsi": {"$in": missing}}},
+                {"$sort": {"exit_ts": -1, "entry_ts": -1}},
+                {"$group": {"_id": "$mmsi", "calls": {"$push": "$$ROOT"}}},
+                {"$project": {"calls": {"$slice": ["$calls", self.per_vessel]}}},
+            ]
+            found = {
+                r["_id"]: r["calls"]
+                async for r in async_db["port_calls"].aggregate(pipeline, allowDiskUse=True)
+            }
+            for m in missing:
+                self._load_full(m, found.get(m, []))
+        return {m: [e[3] for e in reversed(self._calls.get(m, ()))] for m in mmsis}
+
+    # -- lifecycle ----------------------------------------------------------
+    async def warm(self, async_db) -> None:
+        since = datetime.now(timezone.utc) - timedelta(days=RECENT_CALLS_WARM_DAYS)
+        count = 0
+        async for c in async_db["port_calls"].find({"exit_ts": {"$gte": since}}, _PROJECTION).sort("exit_ts", 1):
+            self.add(c)
+            count += 1
+        self.ready = True
+        print(f"[recent_calls] warmed with {count} call(s) for {len(self._calls)} vessel(s).")
+
+    async def _catch_up(self, async_db) -> None:
+        """Re-read recently exited calls (covers the gap between warm-up and following)."""
+        since = datetime.now(timezone.utc) - RECENT_CALLS_POLL_LOOKBACK
+        async for c in async_db["port_calls"].find({"exit_ts": {"$gte": since}}, _PROJECTION):
+            self.add(c)                       # re-seen calls are ignored by _id
+
+    async def _follow_change_stream(self, async_db) -> None:
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "replace"]}}}]
+        async with async_db["port_calls"].watch(pipeline) as stream:
+            await self._catch_up(async_db)
+            async for change in stream:
+                self.add(change["fullDocument"])
+
+    async def _follow_polling(self, async_db) -> None:
+        while True:
+            await self._catch_up(async_db)
+            await asyncio.sleep(RECENT_CALLS_POLL_SECONDS)
+
+    async def _run_once(self, async_db) -> None:
+        from pymongo.errors import OperationFailure
+        await self.warm(async_db)
+        try:
+            await self._follow_change_stream(async_db)
+        except OperationFailure as e:
+            print(f"[recent_calls] change streams unavailable ({e}); polling port_calls.exit_ts.")
+            await self._follow_polling(async_db)
+
+    async def run(self, async_db) -> None:
+        """
+        Background task: warm, then follow newly finalised calls forever. Any failure (e.g. a
+        dropped connection) takes the index out of service, so popups fall back to Mongo,
+        and it is warmed again after RECENT_CALLS_RETRY_SECONDS.
+        """
+        while True:
+            try:
+                await self._run_once(async_db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.ready = False
+                print(f"[recent_calls] index stopped ({e!r}); retrying in {RECENT_CALLS_RETRY_SECONDS:.0f}s.")
+                await asyncio.sleep(RECENT_CALLS_RETRY_SECONDS)
+
+
+recent_calls = RecentCallsIndex()
@@ -0,0 +1,282 @@
+# src/utils/response_cache.py
+"""
+TTL + LRU cache for the analytics endpoints.
+
+Usage:
+
+    @router.get("/buckets")
+    @cached_route("traffic_buckets", ttl=120, depends_on=("port_traffic",))
+    async def get_traffic_buckets(days: int = Query(7), ...):
+        ...
+
+- Keyed on the route namespace + its normalised keyword arguments (strings are stripped and,
+  for the names in `ci_params`, lower-cased, so ?port_name_contains=Liverpool and =liverpool
+  share one entry).
+- Concurrent identical requests share a single computation (single-flight).
+- Entries live in an in-process LRU; set RESPONSE_CACHE_BACKEND=disk or =redis to add a
+  second tier that survives restarts / is shared by several uvicorn workers
+  (redis needs `pip install redis`; any Redis-protocol server works).
+- Invalidation: the aggregators call bump_generation(db, "port_traffic" | "area_traffic")
+  (src/database/cache_generations.py) after writing new buckets. Every cache key embeds the current generation of the sources the route
+  depends on, so new data is picked up within GENERATION_CHECK_SECONDS even across processes.
+
+Cached values are the JSON-encoded payloads (dicts), not Response objects.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from time import monotonic, time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+
+from src.database.cache_generations import COLL_CACHE_GENERATIONS
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 512))
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()  # memory | disk | redis
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", ".cache/responses")
+RESPONSE_CACHE_DISK_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_DISK_MAX_ENTRIES", 5000))
+RESPONSE_CACHE_DISK_SWEEP_SECONDS = float(os.getenv("RESPONSE_CACHE_DISK_SWEEP_SECONDS", 300))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+GENERATION_CHECK_SECONDS = float(os.getenv("RESPONSE_CACHE_GENERATION_CHECK_SECONDS", 5))
+
+
+# -----------------------------------------------------------------------------
+# Invalidation: per-source generation counters in Mongo
+# -----------------------------------------------------------------------------
+
+_generation_state = {"values": {}, "checked_at": 0.0}
+
+
+async def _current_generations() -> Dict[str, int]:
+    """All source generations (re-read at most every GENERATION_CHECK_SECONDS)."""
+    if monotonic() - _generation_state["checked_at"] > GENERATION_CHECK_SECONDS:
+        from src.database.mongo_connection import async_db
+        try:
+            docs = await async_db[COLL_CACHE_GENERATIONS].find({}, {"gen": 1}).to_list(length=None)
+            _generation_state["values"] = {d["_id"]: d.get("gen", 0) for d in docs}
+        except Exception as e:
+            print(f"[response_cache] could not read generations: {e}")
+        _generation_state["checked_at"] = monotonic()
+    return _generation_state["values"]
+
+
+# -----------------------------------------------------------------------------
+# Storage tiers
+# -----------------------------------------------------------------------------
+
+class _MemoryLRU:
+    """OrderedDict LRU of key -> (expires_at, value)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str):
+        hit = self._data.get(key)
+        if hit is None:
+            return None
+        expires_at, value = hit
+        if expires_at < time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ttl: float):
+        self._data[key] = (time() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def clear(self, prefix: str = ""):
+        for k in [k for k in self._data if k.startswith(prefix)]:
+            del self._data[k]
+
+
+class _DiskBackend:
+    """
+    One JSON file per key; writes are atomic (tmp file + os.replace). Each file's mtime is
+    set to its expiry, so the periodic sweep (every RESPONSE_CACHE_DISK_SWEEP_SECONDS, from
+    set) drops expired entries and caps the directory at RESPONSE_CACHE_DISK_MAX_ENTRIES
+    using stat calls only.
+    """
+
+    def __init__(self, directory: str, max_entries: int = RESPONSE_CACHE_DISK_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._swept_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def _get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at", 0) >= time():
+            return entry["value"]
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    def _set(self, key: str, value, ttl: float):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        expires_at = time() + ttl
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": expires_at, "value": value}, f)
+        os.utime(tmp, (expires_at, expires_at))
+        os.replace(tmp, path)
+        if monotonic() - self._swept_at > RESPONSE_CACHE_DISK_SWEEP_SECONDS:
+            self._swept_at = monotonic()
+            self._sweep()
+
+    def _sweep(self):
+        now = time()
+        live = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    mtime = entry.stat().st_mtime
+                    if entry.name.endswith(".json"):
+                        if mtime < now:
+                            os.remove(entry.path)
+                        else:
+                            live.append((mtime, entry.path))
+                    elif entry.name.endswith(".tmp") and mtime < now - 3600:
+                        os.remove(entry.path)   # left behind by a crashed writer
+                except OSError:
+                    continue
+        # over the cap: drop the entries closest to expiry
+        live.sort()
+        for _, path in live[:max(0, len(live) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def get(self, key: str):
+        return await run_in_threadpool(self._get, key)
+
+    async def set(self, key: str, value, ttl: float):
+        await run_in_threadpool(self._set, key, value, ttl)
+
+
+class _RedisBackend:
+    """Shared tier on any Redis-protocol server (SETEX of the JSON payload)."""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # optional dependency
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str):
+        raw = await self._redis.get(f"respcache:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value, ttl: float):
+        await self._redis.setex(f"respcache:{key}", max(1, int(ttl)), json.dumps(value))
+
+
+def _make_shared_backend():
+    try:
+        if RESPONSE_CACHE_BACKEND == "disk":
+            return _DiskBackend(RESPONSE_CACHE_DIR)
+        if RESPONSE_CACHE_BACKEND == "redis":
+            return _RedisBackend(REDIS_URL)
+    except Exception as e:
+        print(f"[response_cache] {RESPONSE_CACHE_BACKEND} backend unavailable ({e}); using memory only.")
+    return None
+
+
+_memory = _MemoryLRU(RESPONSE_CACHE_MAX_ENTRIES)
+_shared = _make_shared_backend()
+_inflight: Dict[str, "asyncio.Future"] = {}
+
+
+def invalidate(namespace: Optional[str] = None) -> None:
+    """Drop this process's in-memory entries (all, or one route namespace)."""
+    _memory.clear(f"{namespace}|" if namespace else "")
+
+
+# -----------------------------------------------------------------------------
+# Decorator
+# -----------------------------------------------------------------------------
+
+def _normalise(kwargs: Dict[str, Any], ci_params: Iterable[str]) -> str:
+    norm = {}
+    for name, value in kwargs.items():
+        if isinstance(value, str):
+            value = value.strip()
+            if name in ci_params:
+                value = value.lower()
+            value = value or None
+        norm[name] = value
+    return json.dumps(norm, sort_keys=True, default=str)
+
+
+def cached_route(namespace: str, ttl: float, depends_on: Iterable[str] = (),
+                 ci_params: Iterable[str] = ()) -> Callable:
+    """
+    Cache an async endpoint's payload for `ttl` seconds. `depends_on` lists the source
+    collections whose generation (see bump_generation) is part of the key.
+    """
+    depends_on = tuple(depends_on)
+    ci_params = frozenset(ci_params)
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            generations = await _current_generations() if depends_on else {}
+            gens = ",".join(str(generations.get(s, 0)) for s in depends_on)
+            key = f"{namespace}|{gens}|{_normalise(kwargs, ci_params)}"
+
+            value = _memory.get(key)
+            if value is not None:
+                return value
+
+            task = _inflight.get(key)
+            if task is None:
+                async def compute():
+                    try:
+                        if _shared is not None:
+                            try:
+                                shared_value = await _shared.get(key)
+                            except Exception as e:
+                                print(f"[response_cache] shared get failed: {e}")
+                                shared_value = None
+                            if shared_value is not None:
+                                _memory.set(key, shared_value, ttl)
+                                return shared_value
+
+                        result = jsonable_encoder(await func(*args, **kwargs))
+                        _memory.set(key, result, ttl)
+                        if _shared is not None:
+                            try:
+                                await _shared.set(key, result, ttl)
+                            except Exception as e:
+                                print(f"[response_cache] shared set failed: {e}")
+                        return result
+                    finally:
+                        _inflight.pop(key, None)
+
+                # Run as its own task so a client disconnect does not cancel it for the others
+                task = asyncio.ensure_future(compute())
+                _inflight[key] = task
+
+            return await asyncio.shield(task)
+
+        return wrapper
+
+    return decorator
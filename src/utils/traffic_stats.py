@@ -1,7 +1,37 @@
 from datetime import datetime, timedelta
-from collections import Counter, defaultdict
-from typing import Dict, List, Optional
-from pymongo.collection import Collection
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from src.database.place_registry import resolve_places
+from src.database.traffic_rollups import ALL_NAME, COLL_TRAFFIC_ROLLUPS, cover_clauses, merge_rows, type_code_from_key
+from src.utils.vessel_types import DEFAULT_GROUP, type_group, type_label
+
+
+def traffic_breakdown(merged: Dict[str, Dict], name_key: str) -> List[Dict]:
+    """
+    Shape merged rollup rows (see src.database.traffic_rollups.read_rollups) into the
+    /traffic and /area-traffic rows: totals, unique MMSIs and type / type-group breakdowns,
+    busiest first.
+    """
+    rows = []
+    for m in merged.values():
+        ship_types: Dict[str, int] = {}
+        for key, cnt in m["by_type"].items():
+            label = type_label(type_code_from_key(key))
+            ship_types[label] = ship_types.get(label, 0) + int(cnt)
+        groups: Dict[str, int] = {}
+        for label, cnt in ship_types.items():
+            group = type_group(label, default="Other")
+            groups[group] = groups.get(group, 0) + cnt
+        rows.append({
+            name_key: m["name"],
+            "total_traffic": int(m["arrivals"]),
+            "unique_mmsi_count": int(m["unique_mmsi_count"]),
+            "ship_types": ship_types,
+            "ship_type_groups": groups,
+        })
+    rows.sort(key=lambda x: x["total_traffic"], reverse=True)
+    return rows
 
 
 def _date_range_list(start: datetime, end: datetime) -> List[str]:
@@ -20,144 +50,175 @@ def _six_hour_label(start_hour: int) -> str:
     return f"{start_hour:02d}–{(start_hour + 6) % 24:02d}"
 
 
-def compute_scoped_traffic_stats(
+def _bucket_keys(clauses: List[Dict]) -> set:
+    """{(grain, naive UTC bucket_start)} for a list of cover_clauses branches."""
+    return {(c["grain"], b.replace(tzinfo=None)) for c in clauses for b in c["bucket_start"]["$in"]}
+
+
+def _median(values: Iterable[int]) -> float:
+    counts = sorted(values)
+    if not counts:
+        return 0
+    mid = len(counts) // 2
+    return counts[mid] if len(counts) % 2 == 1 else 0.5 * (counts[mid - 1] + counts[mid])
+
+
+async def compute_traffic_stats(
     db,
     start: datetime,
     end: datetime,
-    scope: str = "uk",
-    port_regex: Optional[str] = None,
+    place_ids: Optional[Iterable[str]] = None,
+    top_n: int = 5,
 ) -> Dict:
     """
-    Compute stats for AI insights using the SAME sources as your public endpoints.
+    Every figure the insight / AI endpoints use, from ONE find on the `traffic_rollups` cube:
 
-    - Daily totals & weekday/weekend averages -> from `port_calls` (entry_ts)
-    - Busiest 6h slot                         -> from `port_traffic` (window_start, arrivals)
-    - Optional scoping by port_name regex     -> same semantics as /traffic endpoints
+    - the scope's daily series (6h rows up to the first midnight, then day rows): the
+      UK-wide total rows, or the rows of `place_ids`
+    - per-port rows at the coarsest covering grain, for the top-ports ranking
 
     Returns:
       {
-        area_label,
-        total_arrivals,
-        busiest_date, busiest_count,
-        busiest_slot_label, busiest_slot_count,
+        total_arrivals, per_day {date: n},
+        busiest_date, busiest_count, also_busy_days, least_busy_date,
+        slot_counts {"00–06": n, ...}, busiest_slot_label, busiest_slot_count,
         avg_weekday_per_day, avg_weekend_per_day,
-        spike_dates
+        spike_dates, day_z_scores {date: z}  (weekday-seasonal, see traffic_anomalies),
+        type_groups {group: n}, most_common_group,
+        top_ports [{name, arrivals}]  (within place_ids when given, else UK-wide)
       }
     """
+    scope_ids = list(place_ids) if place_ids is not None else [ALL_NAME]
+    ranked_filter = {"$in": scope_ids} if place_ids is not None else {"$ne": ALL_NAME}
+    series_clauses = cover_clauses(start, end, ("day",))
+    ranked_clauses = cover_clauses(start, end)
+
+    query = {
+        "kind": "port",
+        "$or": [{**c, "place_id": {"$in": scope_ids}} for c in series_clauses]
+             + [{**c, "place_id": ranked_filter} for c in ranked_clauses],
+    }
+    rows = await db[COLL_TRAFFIC_ROLLUPS].find(query, {"_id": 0, "mmsis": 0, "hll": 0}).to_list(length=None)
+
+    # A row may serve both purposes (e.g. a 6h edge bucket of a scoped port)
+    series_keys, ranked_keys = _bucket_keys(series_clauses), _bucket_keys(ranked_clauses)
+    per_day: Counter = Counter()
+    slot_counts: Counter = Counter()
+    type_groups: Counter = Counter()
+    day_z: Dict[str, float] = {}
+    spike_days: set = set()
+    ranked_rows = []
+    for r in rows:
+        key = (r["grain"], r["bucket_start"].replace(tzinfo=None))
+        if r["place_id"] in scope_ids and key in series_keys:
+            day = r["bucket_start"].date().isoformat()
+            per_day[day] += int(r.get("arrivals", 0))
+            anomaly = r.get("anomaly")
+            if anomaly:
+                # scored when the day closed; several scoped ports -> strongest signal wins
+                day_z[day] = max(day_z.get(day, float("-inf")), anomaly["z"])
+                if anomaly.get("spike"):
+                    spike_days.add(day)
+            for slot, cnt in (r.get("by_slot") or {}).items():
+                slot_counts[_six_hour_label(int(slot))] += int(cnt)
+            for group, cnt in (r.get("by_group") or {}).items():
+                type_groups[group] += int(cnt)
+        if r["place_id"] != ALL_NAME and key in ranked_keys:
+            ranked_rows.append(r)
 
-    # -----------------------------
-    # 1) Daily totals from port_calls
-    # -----------------------------
-    calls: Collection = db["port_calls"]
-
-    match_calls = {"entry_ts": {"$gte": start}}
-    # Your /traffic endpoints use "last N days" with lower bound only; mirror that.
-    # If you want to hard-cap to "now", uncomment:
-    # match_calls["entry_ts"]["$lt"] = end
-
-    if scope == "port" and port_regex:
-        match_calls["port_name"] = {"$regex": port_regex, "$options": "i"}
-
-    pipe_calls = [
-        {"$match": match_calls},
-        {
-            "$project": {
-                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$entry_ts"}},
-                "port_name": 1,
-            }
-        },
-        {"$group": {"_id": "$day", "count": {"$sum": 1}}},
-        {"$sort": {"_id": 1}},
-    ]
-
-    rows_calls = list(calls.aggregate(pipe_calls, allowDiskUse=True))
-    per_day = Counter({r["_id"]: int(r["count"]) for r in rows_calls})
     total_arrivals = sum(per_day.values())
 
-    if per_day:
-        busiest_date, busiest_count = max(per_day.items(), key=lambda kv: kv[1])
-    else:
-        busiest_date, busiest_count = "N/A", 0
-
-    # -----------------------------
-    # 2) Busiest 6h slot from port_traffic
-    # -----------------------------
-    traffic: Collection = db["port_traffic"]
-
-    match_traffic = {"window_start": {"$gte": start}}
-    # If you want upper bound:
-    # match_traffic["window_start"]["$lt"] = end
-
-    if scope == "port" and port_regex:
-        match_traffic["port_name"] = {"$regex": port_regex, "$options": "i"}
-
-    pipe_traffic = [
-        {"$match": match_traffic},
-        {
-            "$project": {
-                "h": {"$hour": "$window_start"},  # 0..23 UTC
-                "arrivals": {"$ifNull": ["$arrivals", 0]},
-            }
-        },
-        # `port_traffic` windows already represent 6-hour buckets starting at 0/6/12/18.
-        # We can just sum by the starting hour modulo 6.
-        {"$group": {"_id": {"slot_start": {"$multiply": [{"$floor": {"$divide": ["$h", 6]}}, 6]}}, 
-                    "arrivals": {"$sum": "$arrivals"}}},
-        {"$project": {"slot_start": "$_id.slot_start", "arrivals": 1, "_id": 0}},
-        {"$sort": {"arrivals": -1}},
-    ]
-
-    slot_rows = list(traffic.aggregate(pipe_traffic, allowDiskUse=True))
-    if slot_rows:
-        # Pick the max summed slot across all ports
-        best = max(slot_rows, key=lambda r: r["arrivals"])
-        busiest_slot_start = int(best["slot_start"])
-        busiest_slot_count = int(best["arrivals"])
-        busiest_slot_label = _six_hour_label(busiest_slot_start)
+    # Daily extremes
+    by_count = per_day.most_common()
+    busiest_date, busiest_count = by_count[0] if by_count else ("N/A", 0)
+    also_busy_days = [d for d, _ in by_count[1:3]]
+    least_busy_date = min(per_day.items(), key=lambda kv: kv[1])[0] if per_day else "N/A"
+
+    # Busiest 6h slot
+    if slot_counts:
+        busiest_slot_label, busiest_slot_count = slot_counts.most_common(1)[0]
     else:
         busiest_slot_label, busiest_slot_count = "00–06", 0
 
-    # -----------------------------
-    # 3) Weekday vs weekend averages (per day)
-    # -----------------------------
+    # Weekday vs weekend averages (per calendar day in the window, zero days included)
     date_list = _date_range_list(start, end)
     weekday_dates = [d for d in date_list if _weekday(d) < 5]
     weekend_dates = [d for d in date_list if _weekday(d) >= 5]
+    avg_weekday_per_day = round(sum(per_day.get(d, 0) for d in weekday_dates) / max(1, len(weekday_dates)), 2)
+    avg_weekend_per_day = round(sum(per_day.get(d, 0) for d in weekend_dates) / max(1, len(weekend_dates)), 2)
 
-    weekday_total = sum(per_day.get(d, 0) for d in weekday_dates)
-    weekend_total = sum(per_day.get(d, 0) for d in weekend_dates)
-
-    avg_weekday_per_day = round(weekday_total / max(1, len(weekday_dates)), 2)
-    avg_weekend_per_day = round(weekend_total / max(1, len(weekend_dates)), 2)
-
-    # -----------------------------
-    # 4) Spike detection (> 1.25 * median)
-    # -----------------------------
-    counts = sorted(per_day.values())
-    if counts:
-        mid = len(counts) // 2
-        median = counts[mid] if len(counts) % 2 == 1 else 0.5 * (counts[mid - 1] + counts[mid])
-        threshold = 1.25 * median if median else 0
-        spike_dates = [d for d, c in per_day.items() if c > threshold]
-    else:
-        spike_dates = []
+    # Spikes: robust weekday-seasonal flags precomputed on closed day rows; days not yet
+    # scored (today, or before the detector has run) fall back to > 1.25 * window median
+    median = _median(per_day.values())
+    threshold = 1.25 * median if median else 0
+    spike_dates = sorted(
+        d for d, c in per_day.items()
+        if d in spike_days or (d not in day_z and c > threshold)
+    )
+
+    # Vessel type groups
+    most_common_group = type_groups.most_common(1)[0][0] if type_groups else DEFAULT_GROUP
 
-    area_label = "United Kingdom" if scope == "uk" else "Selected port(s)"
+    # Top ports
+    ports = sorted(merge_rows(ranked_rows).values(), key=lambda m: m["arrivals"], reverse=True)
+    top_ports = [{"name": m["name"], "arrivals": int(m["arrivals"])} for m in ports[:int(top_n)] if m["arrivals"]]
 
     return {
-        "area_label": area_label,
         "total_arrivals": int(total_arrivals),
+        "per_day": dict(sorted(per_day.items())),
         "busiest_date": busiest_date,
         "busiest_count": int(busiest_count),
+        "also_busy_days": also_busy_days,
+        "least_busy_date": least_busy_date,
+        "slot_counts": dict(slot_counts),
         "busiest_slot_label": busiest_slot_label,
         "busiest_slot_count": int(busiest_slot_count),
         "avg_weekday_per_day": avg_weekday_per_day,
         "avg_weekend_per_day": avg_weekend_per_day,
         "spike_dates": spike_dates,
+        "day_z_scores": day_z,
+        "type_groups": dict(type_groups),
+        "most_common_group": most_common_group,
+        "top_ports": top_ports,
     }
 
 
-def compute_scoped_top_ports(
+async def _scope_place_ids(db, scope: str, port_regex: Optional[str]) -> Optional[List[str]]:
+    """Place ids for scope="port" + regex (resolved against the registry), None for UK-wide."""
+    places = await resolve_places(db, "port", port_regex) if scope == "port" else None
+    return places[0] if places else None
+
+
+async def compute_scoped_traffic_stats(
+    db,
+    start: datetime,
+    end: datetime,
+    scope: str = "uk",
+    port_regex: Optional[str] = None,
+) -> Dict:
+    """
+    Compute stats for AI insights (see compute_traffic_stats; same rollups as /traffic).
+
+    Returns:
+      {
+        area_label,
+        total_arrivals,
+        busiest_date, busiest_count,
+        busiest_slot_label, busiest_slot_count,
+        avg_weekday_per_day, avg_weekend_per_day,
+        spike_dates
+      }
+    """
+    stats = await compute_traffic_stats(db, start, end, await _scope_place_ids(db, scope, port_regex))
+    keys = ("total_arrivals", "busiest_date", "busiest_count", "busiest_slot_label", "busiest_slot_count",
+            "avg_weekday_per_day", "avg_weekend_per_day", "spike_dates")
+    return {
+        "area_label": "United Kingdom" if scope == "uk" else "Selected port(s)",
+        **{k: stats[k] for k in keys},
+    }
+
+
+async def compute_scoped_top_ports(
     db,
     start: datetime,
     end: datetime,
@@ -166,31 +227,10 @@ def compute_scoped_top_ports(
     top_n: int = 5,
 ) -> List[Dict]:
     """
-    Top N ports by arrivals using `port_calls` (entry_ts), mirroring /traffic endpoints.
+    Top N ports by arrivals (see compute_traffic_stats).
     For UK leaderboard cards, we intentionally compute **UK-wide** ranking (no regex),
     so Liverpool can be compared to national leaders. If you want scoped leaders,
-    flip the match to include regex when scope == "port".
+    pass `await _scope_place_ids(db, scope, port_regex)` as place_ids instead.
     """
-
-    calls: Collection = db["port_calls"]
-
-    # UK-wide ranking by default (to match your "Top 5 ports by traffic" section).
-    match_calls = {"entry_ts": {"$gte": start}}
-    # Optional strict end bound:
-    # match_calls["entry_ts"]["$lt"] = end
-
-    # If you prefer a scoped leaderboard, uncomment:
-    # if scope == "port" and port_regex:
-    #     match_calls["port_name"] = {"$regex": port_regex, "$options": "i"}
-
-    pipeline = [
-        {"$match": match_calls},
-        {"$group": {"_id": "$port_name", "arrivals": {"$sum": 1}}},
-        {"$project": {"_id": 0, "name": "$_id", "arrivals": 1}},
-        {"$match": {"name": {"$ne": None}}},
-        {"$sort": {"arrivals": -1}},
-        {"$limit": int(top_n)},
-    ]
-
-    rows = list(calls.aggregate(pipeline, allowDiskUse=True))
-    return [{"name": r["name"], "arrivals": int(r["arrivals"])} for r in rows if r.get("name")]
+    stats = await compute_traffic_stats(db, start, end, top_n=top_n)
+    return stats["top_ports"]
@@ -0,0 +1,156 @@
+# src/utils/trajectory.py
+"""
+Trajectory reduction helpers for vessel history responses.
+
+- douglas_peucker / visvalingam: line simplification over [lon, lat] points,
+  returning the indices of the points to keep (first and last are always kept)
+- time_bucket_pipeline: Mongo stages that keep one position per vessel per time bucket
+- to_linestring: one GeoJSON LineString plus parallel timestamp / speed arrays
+"""
+
+import heapq
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+Point = Sequence[float]
+
+# 5 decimal places of a degree is ~1 m, plenty for map rendering
+COORD_DECIMALS = 5
+
+SIMPLIFY_METHODS = ("dp", "vw")
+
+
+def point_of(doc: Dict) -> Optional[Tuple[float, float]]:
+    """(lon, lat) from a vessel_position document with a GeoJSON Point, or None."""
+    coords = (doc.get("coordinates") or {}).get("coordinates")
+    if not coords or len(coords) != 2 or coords[0] is None or coords[1] is None:
+        return None
+    return float(coords[0]), float(coords[1])
+
+
+def _perpendicular_distance(p: Point, a: Point, b: Point) -> float:
+    """Distance from p to segment a-b in planar lon/lat units."""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    if dx == 0 and dy == 0:
+        return ((p[0] - a[0]) ** 2 + (p[1] - a[1]) ** 2) ** 0.5
+    t = ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / (dx * dx + dy * dy)
+    t = max(0.0, min(1.0, t))
+    px, py = a[0] + t * dx, a[1] + t * dy
+    return ((p[0] - px) ** 2 + (p[1] - py) ** 2) ** 0.5
+
+
+def douglas_peucker(points: List[Point], tolerance: float) -> List[int]:
+    """
+    Douglas–Peucker simplification. `tolerance` is the max deviation in degrees.
+    Iterative (explicit stack) so very long tracks cannot hit the recursion limit.
+    """
+    n = len(points)
+    if n <= 2:
+        return list(range(n))
+
+    keep = [False] * n
+    keep[0] = keep[n - 1] = True
+    stack = [(0, n - 1)]
+
+    while stack:
+        start, end = stack.pop()
+        max_dist, index = 0.0, -1
+        for i in range(start + 1, end):
+            d = _perpendicular_distance(points[i], points[start], points[end])
+            if d > max_dist:
+                max_dist, index = d, i
+        if index != -1 and max_dist > tolerance:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return [i for i, k in enumerate(keep) if k]
+
+
+def _triangle_area(a: Point, b: Point, c: Point) -> float:
+    return abs((a[0] * (b[1] - c[1]) + b[0] * (c[1] - a[1]) + c[0] * (a[1] - b[1])) / 2.0)
+
+
+def visvalingam(points: List[Point], tolerance: float) -> List[int]:
+    """
+    Visvalingam–Whyatt simplification. Points whose effective triangle area is below
+    tolerance² (square degrees) are removed, smallest first, so `tolerance` is on the
+    same scale as the Douglas–Peucker distance.
+    """
+    n = len(points)
+    if n <= 2:
+        return list(range(n))
+
+    threshold = tolerance * tolerance
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    removed = [False] * n
+    areas = [float("inf")] * n
+    heap = []
+    for i in range(1, n - 1):
+        areas[i] = _triangle_area(points[i - 1], points[i], points[i + 1])
+        heap.append((areas[i], i))
+    heapq.heapify(heap)
+
+    last_area = 0.0
+    while heap:
+        area, i = heapq.heappop(heap)
+        if removed[i] or area != areas[i]:
+            continue  # stale heap entry
+        # Effective area never decreases, otherwise later removals would jump the queue
+        last_area = max(last_area, area)
+        if last_area >= threshold:
+            break
+        removed[i] = True
+        p, q = prev[i], nxt[i]
+        nxt[p], prev[q] = q, p
+        for j in (p, q):
+            if 0 < j < n - 1:
+                areas[j] = _triangle_area(points[prev[j]], points[j], points[nxt[j]])
+                heapq.heappush(heap, (areas[j], j))
+
+    return [i for i in range(n) if not removed[i]]
+
+
+def simplify_rows(rows: List[Dict], method: str, tolerance: float) -> List[Dict]:
+    """Apply `method` ("dp" or "vw") to vessel_position rows, dropping rows without coordinates."""
+    located = [(r, point_of(r)) for r in rows]
+    located = [(r, p) for r, p in located if p is not None]
+    points = [p for _, p in located]
+    simplify = douglas_peucker if method == "dp" else visvalingam
+    return [located[i][0] for i in simplify(points, tolerance)]
+
+
+def time_bucket_pipeline(bucket_seconds: int) -> List[Dict[str, Any]]:
+    """
+    Aggregation stages (after a $match + ascending $sort on timestamp_utc) that keep the
+    first position in every `bucket_seconds` window, so Mongo ships one row per bucket.
+    """
+    bucket_ms = int(bucket_seconds) * 1000
+    return [
+        {"$group": {
+            "_id": {"$floor": {"$divide": [{"$toLong": "$timestamp_utc"}, bucket_ms]}},
+            "doc": {"$first": "$$ROOT"},
+        }},
+        {"$sort": {"_id": 1}},
+        {"$replaceRoot": {"newRoot": "$doc"}},
+    ]
+
+
+def to_linestring(rows: Iterable[Dict]) -> Dict[str, Any]:
+    """
+    Collapse rows into a GeoJSON LineString plus parallel arrays:
+      {"geometry": {...}, "timestamps": [...], "sog": [...]}
+    """
+    coords, timestamps, speeds = [], [], []
+    for r in rows:
+        p = point_of(r)
+        if p is None:
+            continue
+        coords.append([round(p[0], COORD_DECIMALS), round(p[1], COORD_DECIMALS)])
+        timestamps.append(r.get("timestamp_utc"))
+        speeds.append(r.get("sog"))
+    return {
+        "geometry": {"type": "LineString", "coordinates": coords},
+        "timestamps": timestamps,
+        "sog": speeds,
+    }
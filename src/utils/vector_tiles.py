@@ -0,0 +1,136 @@
+# src/utils/vector_tiles.py
+"""
+Helpers for serving port_areas as Mapbox Vector Tiles (MVT).
+
+- Slippy-map tile math (z/x/y -> lon/lat and Web Mercator bounds)
+- Zoom bands used to precompute simplified geometries on each port_areas doc
+- MVT encoding of a list of GeoJSON features clipped to one tile
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import mapbox_vector_tile
+from shapely.geometry import box, mapping, shape
+from shapely.ops import transform
+
+EARTH_RADIUS_M = 6378137.0
+ORIGIN_SHIFT = math.pi * EARTH_RADIUS_M  # 20037508.34...
+MAX_LAT = 85.0511287798
+
+TILE_EXTENT = 4096          # MVT integer grid per tile
+TILE_BUFFER_PX = 64         # clip buffer (in tile pixels at 4096 extent) to avoid seams
+LAYER_NAME = "port_areas"
+
+# Zoom bands for precomputed simplified geometries, stored as `simplified.z{band}`.
+# A tile at zoom z uses the smallest band >= z; above the last band the raw geometry is used.
+SIMPLIFY_ZOOMS = (4, 7, 10, 13)
+MAX_ZOOM = 22
+
+
+def tolerance_for_zoom(z: int) -> float:
+    """Half a screen pixel (256px tiles) at zoom z, in degrees of longitude."""
+    return 360.0 / (256 * (2 ** z)) / 2.0
+
+
+def band_for_zoom(z: int) -> Optional[int]:
+    """Return the precomputed simplification band for zoom z, or None for full detail."""
+    for band in SIMPLIFY_ZOOMS:
+        if z <= band:
+            return band
+    return None
+
+
+def tile_bounds_lonlat(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) of a slippy-map tile."""
+    n = 2 ** z
+
+    def lat(yy: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * yy / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def tile_bounds_mercator(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(min_x, min_y, max_x, max_y) of a slippy-map tile in EPSG:3857 metres."""
+    size = 2 * ORIGIN_SHIFT / (2 ** z)
+    min_x = -ORIGIN_SHIFT + x * size
+    max_y = ORIGIN_SHIFT - y * size
+    return min_x, max_y - size, min_x + size, max_y
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _to_mercator(lon, lat, z=None):
+    """Shapely transform callback: lon/lat degrees -> EPSG:3857 metres."""
+    def one(lo, la):
+        la = max(-MAX_LAT, min(MAX_LAT, la))
+        mx = EARTH_RADIUS_M * math.radians(lo)
+        my = EARTH_RADIUS_M * math.log(math.tan(math.pi / 4 + math.radians(la) / 2))
+        return mx, my
+
+    if isinstance(lon, (int, float)):
+        return one(lon, lat)
+    xs, ys = zip(*(one(lo, la) for lo, la in zip(lon, lat)))
+    return list(xs), list(ys)
+
+
+def simplify_geometry(geometry: Dict, z: int) -> Optional[Dict]:
+    """Simplify a GeoJSON geometry for zoom z (topology preserving). Returns GeoJSON or None."""
+    try:
+        geom = shape(geometry).simplify(tolerance_for_zoom(z), preserve_topology=True)
+    except Exception:
+        return None
+    if geom.is_empty:
+        return None
+    return mapping(geom)
+
+
+def centroid_of(geometry: Dict) -> List[float]:
+    """[lon, lat] centroid of a GeoJSON geometry, or [0, 0] if it cannot be parsed."""
+    try:
+        cent = shape(geometry).centroid
+        return [cent.x, cent.y]
+    except Exception:
+        return [0, 0]
+
+
+def _tile_properties(props: Dict) -> Dict:
+    """Keep only scalar properties (MVT cannot encode nested values); flatten the centroid."""
+    out = {}
+    for k, v in (props or {}).items():
+        if isinstance(v, (str, int, float, bool)):
+            out[k] = v
+    centroid = (props or {}).get("centroid")
+    if isinstance(centroid, (list, tuple)) and len(centroid) == 2:
+        out["centroid_lon"], out["centroid_lat"] = float(centroid[0]), float(centroid[1])
+    return out
+
+
+def encode_tile(features: Iterable[Dict], z: int, x: int, y: int) -> bytes:
+    """
+    Clip GeoJSON features (lon/lat) to tile z/x/y and encode them as one MVT layer.
+
+    Each feature is {"geometry": <GeoJSON>, "properties": {...}}; the geometry should
+    already be the simplified band for this zoom.
+    """
+    merc_bounds = tile_bounds_mercator(z, x, y)
+    pad = (merc_bounds[2] - merc_bounds[0]) * TILE_BUFFER_PX / TILE_EXTENT
+    clip_box = box(merc_bounds[0] - pad, merc_bounds[1] - pad, merc_bounds[2] + pad, merc_bounds[3] + pad)
+
+    encoded = []
+    for feat in features:
+        try:
+            geom = transform(_to_mercator, shape(feat["geometry"])).intersection(clip_box)
+        except Exception:
+            continue
+        if geom.is_empty:
+            continue
+        encoded.append({"geometry": geom, "properties": _tile_properties(feat.get("properties"))})
+
+    return mapbox_vector_tile.encode(
+        [{"name": LAYER_NAME, "features": encoded}],
+        default_options={"quantize_bounds": merc_bounds, "extents": TILE_EXTENT},
+    )
@@ -0,0 +1,34 @@
+# src/utils/vessel_types.py
+"""
+AIS ship type code -> label -> UI group helpers shared by the API and the batch jobs.
+"""
+
+from typing import Optional
+
+from src.utils.constants import SHIP_TYPE_MAP, VESSEL_TYPE_GROUPS
+
+DEFAULT_GROUP = "Other / Unknown"
+
+# label -> group, built once instead of scanning VESSEL_TYPE_GROUPS per vessel
+# (first group wins, matching the old linear scans)
+_GROUP_BY_LABEL = {}
+for _group, _labels in VESSEL_TYPE_GROUPS.items():
+    for _label in _labels:
+        _GROUP_BY_LABEL.setdefault(_label, _group)
+
+
+def type_label(code) -> str:
+    """Human label for an AIS ship type code ('Unknown' when missing)."""
+    if code is None:
+        return "Unknown"
+    return SHIP_TYPE_MAP.get(code, f"Type {code}")
+
+
+def type_group(label: Optional[str], default: str = DEFAULT_GROUP) -> str:
+    """UI group for a ship type label (see VESSEL_TYPE_GROUPS)."""
+    return _GROUP_BY_LABEL.get(label, default)
+
+
+def type_group_for_code(code, default: str = DEFAULT_GROUP) -> str:
+    """Shortcut: AIS ship type code straight to its UI group."""
+    return type_group(type_label(code), default)